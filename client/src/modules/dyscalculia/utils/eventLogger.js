@@ -1,5 +1,137 @@
 const API_BASE = '/api/dyscalculia';
 
+// Events are buffered per session and sent in batches
+const FLUSH_INTERVAL_MS = 1000;
+const MAX_BUFFERED_EVENTS = 25;
+// Failed uploads back off exponentially, up to this long between tries
+const MAX_RETRY_INTERVAL_MS = 60000;
+
+const pendingEvents = new Map();
+const flushTimers = new Map();
+const activeFlushes = new Map();
+const failedUploads = new Map();
+
+const newIdempotencyKey = () =>
+  globalThis.crypto?.randomUUID?.() ??
+  `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+const scheduleFlush = (sessionId, delay = FLUSH_INTERVAL_MS) => {
+  if (flushTimers.has(sessionId)) return;
+  flushTimers.set(
+    sessionId,
+    setTimeout(() => flushEvents(sessionId), delay)
+  );
+};
+
+const retryDelay = (sessionId) => {
+  const failures = (failedUploads.get(sessionId) ?? 0) + 1;
+  failedUploads.set(sessionId, failures);
+  const ceiling = Math.min(MAX_RETRY_INTERVAL_MS, FLUSH_INTERVAL_MS * 2 ** (failures - 1));
+  // Jitter, so clients recovering from the same outage do not retry in step
+  return ceiling / 2 + Math.random() * (ceiling / 2);
+};
+
+const queueEvent = (sessionId, type, data) => {
+  if (!sessionId) {
+    console.error('Session ID is missing for event:', type, data);
+    return;
+  }
+
+  const queue = pendingEvents.get(sessionId) ?? [];
+  queue.push({ type, data, idempotency_key: newIdempotencyKey() });
+  pendingEvents.set(sessionId, queue);
+
+  // While backing off, a full buffer waits for the scheduled retry
+  if (queue.length >= MAX_BUFFERED_EVENTS && !failedUploads.has(sessionId)) {
+    flushEvents(sessionId);
+  } else {
+    scheduleFlush(sessionId);
+  }
+};
+
+const requeue = (sessionId, events) => {
+  // In front of newer events; idempotency keys make the resend safe
+  pendingEvents.set(sessionId, [...events, ...(pendingEvents.get(sessionId) ?? [])]);
+};
+
+const retryLater = (sessionId, batch, reason) => {
+  requeue(sessionId, batch);
+  // Replaces any sooner flush scheduled by events logged meanwhile
+  clearTimeout(flushTimers.get(sessionId));
+  flushTimers.delete(sessionId);
+  const delay = retryDelay(sessionId);
+  scheduleFlush(sessionId, delay);
+  console.debug(`Event batch upload failed, retrying in ${Math.round(delay)}ms:`, reason);
+};
+
+const sendBatch = async (sessionId, batch) => {
+  let response;
+  try {
+    response = await fetch(`${API_BASE}/sessions/${sessionId}/events:batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(batch)
+    });
+  } catch (error) {
+    retryLater(sessionId, batch, error);
+    return;
+  }
+
+  // Client errors other than timeouts/rate limits will not succeed on retry
+  const retryable = response.status === 408 || response.status === 429 || response.status >= 500;
+  if (!response.ok && retryable) {
+    retryLater(sessionId, batch, `status ${response.status}`);
+    return;
+  }
+  failedUploads.delete(sessionId);
+  if (response.ok) return;
+
+  // A 422 names the first invalid entry: drop it and resend the rest
+  const detail = await response.json().then((body) => body.detail, () => null);
+  const index = detail?.index;
+  if (response.status === 422 && Number.isInteger(index) && index >= 0 && index < batch.length) {
+    console.warn('Dropping invalid event rejected by the server:', batch[index], detail.errors);
+    const rest = [...batch.slice(0, index), ...batch.slice(index + 1)];
+    if (rest.length) await sendBatch(sessionId, rest);
+    return;
+  }
+  console.error(`Dropping ${batch.length} events rejected with status ${response.status}:`, batch, detail);
+};
+
+/**
+ * Send all buffered events for a session.
+ * Flushes for the same session run one after another so batches stay in order.
+ */
+export const flushEvents = async (sessionId) => {
+  clearTimeout(flushTimers.get(sessionId));
+  flushTimers.delete(sessionId);
+
+  const previous = activeFlushes.get(sessionId) ?? Promise.resolve();
+  const flush = previous.then(() => {
+    const batch = pendingEvents.get(sessionId) ?? [];
+    pendingEvents.delete(sessionId);
+    return batch.length ? sendBatch(sessionId, batch) : undefined;
+  });
+
+  activeFlushes.set(sessionId, flush);
+  await flush;
+  if (activeFlushes.get(sessionId) === flush) {
+    activeFlushes.delete(sessionId);
+  }
+};
+
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', () => {
+    for (const [sessionId, batch] of pendingEvents) {
+      if (!batch.length) continue;
+      navigator.sendBeacon?.(
+        `${API_BASE}/sessions/${sessionId}/events:batch`,
+        new Blob([JSON.stringify(batch)], { type: 'application/json' })
+      );
+    }
+  });
+}
+
 // Helper functions for task logging
 export const logTaskStart = (taskData) => {
   console.debug('Task started:', taskData);
@@ -16,53 +148,20 @@ export const logEvent = (eventData) => {
   // Generic event logging - could extend to log different event types
 };
 
-export const logTaskAttempt = async (attemptData) => {
-  try {
-    const { sessionId, ...attemptWithoutSession } = attemptData;
-    console.log('logTaskAttempt - sessionId:', sessionId, 'attemptData:', attemptData);
-    
-    if (!sessionId) {
-      console.error('Session ID is missing in attemptData:', attemptData);
-      return;
-    }
-    
-    const url = `${API_BASE}/sessions/${sessionId}/attempts`;
-    console.log('Posting to URL:', url);
-    
-    await fetch(url, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(attemptWithoutSession)
-    });
-  } catch (error) {
-    console.debug('Task attempt logging failed:', error);
-  }
+export const logTaskAttempt = (attemptData) => {
+  const { sessionId, ...attemptWithoutSession } = attemptData;
+  console.log('logTaskAttempt - sessionId:', sessionId, 'attemptData:', attemptData);
+  queueEvent(sessionId, 'attempt', attemptWithoutSession);
 };
 
-export const logExposure = async (exposureData) => {
-  try {
-    const { sessionId, ...exposureWithoutSession } = exposureData;
-    await fetch(`${API_BASE}/sessions/${sessionId}/exposures`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(exposureWithoutSession)
-    });
-  } catch (error) {
-    console.debug('Exposure logging failed:', error);
-  }
+export const logExposure = (exposureData) => {
+  const { sessionId, ...exposureWithoutSession } = exposureData;
+  queueEvent(sessionId, 'exposure', exposureWithoutSession);
 };
 
-export const logStressIndicator = async (stressData) => {
-  try {
-    const { sessionId, ...stressWithoutSession } = stressData;
-    await fetch(`${API_BASE}/sessions/${sessionId}/stress-indicators`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(stressWithoutSession)
-    });
-  } catch (error) {
-    console.debug('Stress indicator logging failed:', error);
-  }
+export const logStressIndicator = (stressData) => {
+  const { sessionId, ...stressWithoutSession } = stressData;
+  queueEvent(sessionId, 'stress_indicator', stressWithoutSession);
 };
 
 export const logPhaseChange = (phaseData) => {
@@ -77,6 +176,7 @@ export const logSessionEnd = (sessionData) => {
 
 export const getSessionData = async (sessionId) => {
   try {
+    await flushEvents(sessionId);
     const response = await fetch(`${API_BASE}/sessions/${sessionId}`);
     if (response.ok) {
       return await response.json();
@@ -89,6 +189,7 @@ export const getSessionData = async (sessionId) => {
 
 export const analyzeSession = async (sessionId) => {
   try {
+    await flushEvents(sessionId);
     const response = await fetch(`${API_BASE}/sessions/${sessionId}/analyze`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' }
@@ -104,6 +205,7 @@ export const analyzeSession = async (sessionId) => {
 
 export const generateExplanation = async (sessionId) => {
   try {
+    await flushEvents(sessionId);
     const response = await fetch(`${API_BASE}/sessions/${sessionId}/explanation`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' }
@@ -119,6 +221,7 @@ export const generateExplanation = async (sessionId) => {
 
 export const getSessionScore = async (sessionId) => {
   try {
+    await flushEvents(sessionId);
     const response = await fetch(`${API_BASE}/sessions/${sessionId}/score`);
     if (response.ok) {
       return await response.json();
@@ -135,6 +238,7 @@ export const getSessionScore = async (sessionId) => {
  */
 export const getAIAnalysis = async (sessionId) => {
   try {
+    await flushEvents(sessionId);
     const response = await fetch(`${API_BASE}/ai-analysis`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -157,6 +261,7 @@ export const getAIAnalysis = async (sessionId) => {
  */
 export const getFlashDuration = async (sessionId, difficulty) => {
   try {
+    await flushEvents(sessionId);
     const response = await fetch(`${API_BASE}/flash-duration`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
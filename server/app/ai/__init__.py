@@ -0,0 +1,61 @@
+from .breaker import CircuitBreaker, CircuitOpenError
+from .config import AIServiceConfig
+from .fake import FakeProvider, FakeProviderError
+from .hedge import hedge_delay, hedged
+from .latency import LatencyHistogram
+from .quota import (
+    BATCH,
+    INTERACTIVE,
+    QuotaExceededError,
+    QuotaScheduler,
+    TokenBucket,
+    get_quota_scheduler,
+    request_priority,
+)
+from .registry import GEMINI, GROQ, AIRegistry, ProviderStatus, get_registry
+from .resilience import (
+    adaptive_timeout,
+    call_provider,
+    is_provider_failure,
+    is_rate_limited,
+    is_retryable,
+    retry_after,
+    stream_provider,
+)
+from .result_cache import ContentDigest, ResultCache, content_key, get_result_cache
+from .singleflight import SingleFlight
+
+__all__ = [
+    "AIServiceConfig",
+    "FakeProvider",
+    "FakeProviderError",
+    "LatencyHistogram",
+    "hedge_delay",
+    "hedged",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "adaptive_timeout",
+    "call_provider",
+    "is_provider_failure",
+    "is_rate_limited",
+    "is_retryable",
+    "retry_after",
+    "stream_provider",
+    "BATCH",
+    "INTERACTIVE",
+    "QuotaExceededError",
+    "QuotaScheduler",
+    "TokenBucket",
+    "get_quota_scheduler",
+    "request_priority",
+    "AIRegistry",
+    "GEMINI",
+    "GROQ",
+    "ProviderStatus",
+    "get_registry",
+    "ContentDigest",
+    "ResultCache",
+    "content_key",
+    "get_result_cache",
+    "SingleFlight",
+]
@@ -0,0 +1,125 @@
+import os
+import re
+
+
+def _env_name(value: str) -> str:
+    """gemini-2.5-flash -> GEMINI_2_5_FLASH"""
+    return re.sub(r"[^A-Za-z0-9]+", "_", value).strip("_").upper()
+
+
+class AIServiceConfig:
+    """Configuration for AI services - reads from environment dynamically"""
+
+    @staticmethod
+    def get_groq_endpoint():
+        return os.getenv(
+            "GROQ_ENDPOINT", "https://api.groq.com/openai/v1/chat/completions"
+        )
+
+    @staticmethod
+    def get_groq_api_key():
+        return os.getenv("GROQ_API_KEY")
+
+    @staticmethod
+    def get_groq_model():
+        return os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+
+    @staticmethod
+    def get_gemini_api_key():
+        # genai.Client() also accepted GOOGLE_API_KEY before the registry
+        return os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+
+    @staticmethod
+    def get_api_timeout():
+        return 5.0
+
+    @staticmethod
+    def get_prompt_token_budget():
+        return int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "1500"))
+
+    @staticmethod
+    def get_model_refresh_interval():
+        return float(os.getenv("AI_MODEL_REFRESH_INTERVAL", "3600"))
+
+    @staticmethod
+    def get_warmup_timeout():
+        return float(os.getenv("AI_WARMUP_TIMEOUT", "5"))
+
+    @staticmethod
+    def get_hedge_enabled():
+        return os.getenv("AI_HEDGE_ENABLED", "1") != "0"
+
+    @staticmethod
+    def get_hedge_percentile():
+        return float(os.getenv("AI_HEDGE_PERCENTILE", "95"))
+
+    @staticmethod
+    def get_hedge_default_delay():
+        # Used until a provider has enough latency samples
+        return float(os.getenv("AI_HEDGE_DEFAULT_DELAY", "2.0"))
+
+    @staticmethod
+    def get_hedge_min_delay():
+        return float(os.getenv("AI_HEDGE_MIN_DELAY", "0.25"))
+
+    @staticmethod
+    def get_hedge_min_samples():
+        return int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+
+    @staticmethod
+    def get_timeout_max():
+        return float(os.getenv("AI_TIMEOUT_MAX", "60"))
+
+    @staticmethod
+    def get_timeout_min():
+        return float(os.getenv("AI_TIMEOUT_MIN", "1.0"))
+
+    @staticmethod
+    def get_timeout_multiplier():
+        return float(os.getenv("AI_TIMEOUT_MULTIPLIER", "2.0"))
+
+    @staticmethod
+    def get_timeout_min_samples():
+        return int(os.getenv("AI_TIMEOUT_MIN_SAMPLES", "20"))
+
+    @staticmethod
+    def get_breaker_failure_threshold():
+        return int(os.getenv("AI_BREAKER_FAILURES", "5"))
+
+    @staticmethod
+    def get_breaker_reset_timeout():
+        return float(os.getenv("AI_BREAKER_RESET", "30"))
+
+    @staticmethod
+    def get_quota_rpm(provider: str, model: str) -> float:
+        # AI_QUOTA_RPM_GEMINI_GEMINI_2_5_FLASH overrides AI_QUOTA_RPM_GEMINI;
+        # 0 disables the limit
+        default = {"gemini": "60", "groq": "30"}.get(provider, "0")
+        return float(
+            os.getenv(f"AI_QUOTA_RPM_{_env_name(provider)}_{_env_name(model)}")
+            or os.getenv(f"AI_QUOTA_RPM_{_env_name(provider)}", default)
+        )
+
+    @staticmethod
+    def get_quota_burst(provider: str, model: str) -> float:
+        # Defaults to ten seconds' worth of requests
+        burst = os.getenv(
+            f"AI_QUOTA_BURST_{_env_name(provider)}_{_env_name(model)}"
+        ) or os.getenv(f"AI_QUOTA_BURST_{_env_name(provider)}")
+        if burst:
+            return float(burst)
+        return AIServiceConfig.get_quota_rpm(provider, model) / 6
+
+    @staticmethod
+    def get_quota_workers():
+        # Server processes sharing the provider quota; each one enforces
+        # its share, since the buckets live in process memory
+        return int(os.getenv("AI_QUOTA_WORKERS") or os.getenv("WEB_CONCURRENCY", "1"))
+
+    @staticmethod
+    def get_quota_max_wait():
+        return float(os.getenv("AI_QUOTA_MAX_WAIT", "30"))
+
+    @staticmethod
+    def get_quota_rate_limit_backoff():
+        return float(os.getenv("AI_QUOTA_BACKOFF", "10"))
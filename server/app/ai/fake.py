@@ -0,0 +1,59 @@
+"""
+In-process stand-in for a rate-limited provider, for tests and development.
+
+FakeProvider enforces a request quota the way Gemini and Groq do: it
+accepts `limit` requests per rolling `window` seconds and answers anything
+beyond that with a 429. Calls made through call_provider exercise the real
+quota scheduler, circuit breaker and timeouts without a network.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List
+
+
+class FakeProviderError(Exception):
+    """Error carrying an HTTP status in `code`, like google-genai's APIError."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeProvider:
+    def __init__(
+        self,
+        limit: int,
+        window: float = 60.0,
+        latency: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.clock = clock
+        self._sent: Deque[float] = deque()
+        # (module, samples) of every accepted request, in arrival order
+        self.requests: List[tuple] = []
+        self.metrics: Dict[str, int] = {"accepted": 0, "rate_limited": 0}
+
+    def _admit(self, samples: int) -> bool:
+        now = self.clock()
+        while self._sent and self._sent[0] <= now - self.window:
+            self._sent.popleft()
+        # A grouped request counts once per sample against the quota
+        if len(self._sent) + samples > self.limit:
+            return False
+        self._sent.extend([now] * samples)
+        return True
+
+    async def generate(self, module: str, samples: int = 1) -> Dict[str, Any]:
+        if not self._admit(samples):
+            self.metrics["rate_limited"] += 1
+            raise FakeProviderError(429, "Resource has been exhausted")
+        self.metrics["accepted"] += 1
+        self.requests.append((module, samples))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return {"module": module, "samples": samples}
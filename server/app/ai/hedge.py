@@ -0,0 +1,60 @@
+"""
+Hedged provider calls: start a backup request when the primary is slower
+than usual, keep whichever valid result arrives first and cancel the other.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Optional, Set, TypeVar
+
+from .config import AIServiceConfig
+from .registry import get_registry
+
+T = TypeVar("T")
+
+
+def hedge_delay(provider: str) -> float:
+    """
+    How long to wait on `provider` before starting the backup: its observed
+    latency at the configured percentile, once there are enough samples.
+    """
+    histogram = get_registry().latency(provider)
+    delay: Optional[float] = None
+    if histogram.count >= AIServiceConfig.get_hedge_min_samples():
+        delay = histogram.percentile(AIServiceConfig.get_hedge_percentile())
+    if delay is None:
+        delay = AIServiceConfig.get_hedge_default_delay()
+    return max(AIServiceConfig.get_hedge_min_delay(), delay)
+
+
+async def hedged(
+    primary: Callable[[], Awaitable[T]],
+    backup: Callable[[], Awaitable[T]],
+    delay: float,
+) -> T:
+    """
+    Start `primary`; if it has not succeeded after `delay` seconds (or fails
+    sooner), start `backup` too. Returns the first successful result, cancels
+    the loser, and raises the last error if both fail.
+    """
+    primary_task = asyncio.ensure_future(primary())
+    pending: Set[asyncio.Future] = {primary_task}
+    backup_started = False
+    error: Optional[BaseException] = None
+
+    try:
+        while pending:
+            timeout = None if backup_started else delay
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if not backup_started:
+                backup_started = True
+                pending.add(asyncio.ensure_future(backup()))
+        raise error if error else Exception("Hedged call produced no result")
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,61 @@
+import bisect
+import math
+import threading
+from typing import Dict, List, Optional
+
+# Bucket upper bounds in seconds: 10ms to ~2min, each ~15% wider than the last
+BUCKET_BOUNDS: List[float] = [
+    0.01 * 1.15**i for i in range(int(math.log(12000) / math.log(1.15)) + 1)
+]
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram for one provider.
+    Counts are halved once they pass max_count, so percentiles follow
+    recent behaviour rather than the whole process lifetime.
+    """
+
+    def __init__(self, max_count: int = 1000):
+        self.max_count = max_count
+        self.counts = [0.0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0.0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        bucket = bisect.bisect_left(BUCKET_BOUNDS, seconds)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += 1
+            if self.count > self.max_count:
+                self.counts = [count / 2 for count in self.counts]
+                self.count /= 2
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile, in seconds."""
+        with self._lock:
+            if not self.count:
+                return None
+            target = self.count * q / 100
+            seen = 0.0
+            for bucket, count in enumerate(self.counts):
+                seen += count
+                if seen >= target and count:
+                    break
+        if bucket >= len(BUCKET_BOUNDS):
+            return BUCKET_BOUNDS[-1]
+        return BUCKET_BOUNDS[bucket]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "samples": self.total,
+            "p50_ms": self._ms(self.percentile(50)),
+            "p95_ms": self._ms(self.percentile(95)),
+            "p99_ms": self._ms(self.percentile(99)),
+        }
+
+    @staticmethod
+    def _ms(seconds: Optional[float]) -> Optional[float]:
+        return round(seconds * 1000, 1) if seconds is not None else None
@@ -0,0 +1,267 @@
+"""
+Shared request quota for the AI providers.
+
+Every provider call takes a token from the bucket for its provider and
+model before it is sent, so one busy module cannot burn the quota the
+others rely on. When a bucket is empty, callers wait in two priority
+lanes - interactive requests are always served before batch jobs - and
+within a lane the waiting modules take turns, one token each. A grouped
+request takes one token per sample it carries.
+
+Buckets live in process memory, so each server process enforces only its
+share of the provider quota: the configured rate and burst are divided by
+AI_QUOTA_WORKERS (default WEB_CONCURRENCY, else 1).
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from .config import AIServiceConfig
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Served in this order
+LANES = (INTERACTIVE, BATCH)
+
+# Priority of the provider calls made by the current task; the job queue
+# switches it to BATCH while running batch jobs
+request_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "request_priority", default=INTERACTIVE
+)
+
+
+class QuotaExceededError(TimeoutError):
+    """Raised when a call waited longer than AI_QUOTA_MAX_WAIT for a token."""
+
+    def __init__(self, provider: str, model: str, waited: float):
+        super().__init__(
+            f"{provider}/{model} quota exhausted, gave up after waiting {waited:.1f}s"
+        )
+        self.provider = provider
+        self.model = model
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def try_take(self, count: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= count:
+            self.tokens -= count
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def drain(self, seconds: float) -> None:
+        """Hand out nothing for `seconds`, e.g. after the provider sent a 429."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class ModelQuota:
+    """Token bucket of one provider/model and the calls waiting on it."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float]):
+        self.bucket = TokenBucket(rate, capacity, clock)
+        # lane -> module -> waiting calls, modules in round-robin order
+        self.waiting: Dict[str, Dict[str, Deque[asyncio.Future]]] = {
+            lane: {} for lane in LANES
+        }
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.metrics: Dict[str, Any] = {
+            "granted": 0,
+            "throttled": 0,
+            "rejected": 0,
+            "rate_limited": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def has_waiters(self) -> bool:
+        return any(self.waiting[lane] for lane in LANES)
+
+    def next_waiter(self) -> Optional[asyncio.Future]:
+        for lane in LANES:
+            modules = self.waiting[lane]
+            while modules:
+                module, waiters = next(iter(modules.items()))
+                waiter = waiters.popleft()
+                # Move the module to the back so the others get a turn
+                del modules[module]
+                if waiters:
+                    modules[module] = waiters
+                if not waiter.done():
+                    return waiter
+        return None
+
+    def depth(self) -> Dict[str, Dict[str, int]]:
+        return {
+            lane: {
+                module: sum(not waiter.done() for waiter in waiters)
+                for module, waiters in self.waiting[lane].items()
+            }
+            for lane in LANES
+        }
+
+
+class QuotaScheduler:
+    """
+    Token buckets per provider and model, shared by every router of this
+    process. Rates come from AIServiceConfig.get_quota_rpm, split evenly
+    between the `workers` processes; a rate of 0 disables the limit for
+    that provider or model.
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[Callable[[str, str], float]] = None,
+        burst: Optional[Callable[[str, str], float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        workers: Optional[Callable[[], int]] = None,
+    ):
+        self.rpm = rpm or AIServiceConfig.get_quota_rpm
+        self.burst = burst or AIServiceConfig.get_quota_burst
+        self.clock = clock
+        self.workers = workers or AIServiceConfig.get_quota_workers
+        self.quotas: Dict[Tuple[str, str], Optional[ModelQuota]] = {}
+
+    def _quota(self, provider: str, model: str) -> Optional[ModelQuota]:
+        key = (provider, model)
+        if key not in self.quotas:
+            workers = max(1, self.workers())
+            rpm = self.rpm(provider, model) / workers
+            burst = max(1.0, self.burst(provider, model) / workers)
+            self.quotas[key] = (
+                ModelQuota(rpm / 60, burst, self.clock) if rpm > 0 else None
+            )
+        return self.quotas[key]
+
+    async def acquire(
+        self,
+        provider: str,
+        model: str = "default",
+        module: str = "default",
+        priority: Optional[str] = None,
+        max_wait: Optional[float] = None,
+        cost: int = 1,
+    ) -> None:
+        """
+        Wait for `cost` tokens for one call to `provider`/`model`; a grouped
+        request costs one token per sample.
+        """
+        quota = self._quota(provider, model)
+        if quota is None:
+            return
+        cost = max(1, cost)
+        if not quota.has_waiters() and quota.bucket.try_take(cost):
+            quota.metrics["granted"] += cost
+            return
+
+        priority = priority or request_priority.get()
+        lane = priority if priority in LANES else BATCH
+        quota.metrics["throttled"] += 1
+        max_wait = (
+            max_wait if max_wait is not None else AIServiceConfig.get_quota_max_wait()
+        )
+        start_time = self.clock()
+        try:
+            # One token per turn, so a large group cannot starve the other
+            # modules while it waits
+            for _ in range(cost):
+                remaining = max(0.0, max_wait - (self.clock() - start_time))
+                await self._wait_turn(quota, lane, module, remaining)
+        except asyncio.TimeoutError:
+            quota.metrics["rejected"] += 1
+            raise QuotaExceededError(provider, model, self.clock() - start_time)
+        finally:
+            quota.metrics["wait_seconds"] += self.clock() - start_time
+
+    async def _wait_turn(
+        self, quota: ModelQuota, lane: str, module: str, timeout: float
+    ) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        quota.waiting[lane].setdefault(module, deque()).append(waiter)
+        self._schedule(quota)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        finally:
+            # Timed out or cancelled: stop holding a place in the lane
+            waiters = quota.waiting[lane].get(module)
+            if waiters is not None and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del quota.waiting[lane][module]
+
+    def rate_limited(self, provider: str, model: str = "default") -> None:
+        """The provider answered 429: stop granting tokens for a while."""
+        quota = self._quota(provider, model)
+        if quota is None:
+            return
+        quota.metrics["rate_limited"] += 1
+        quota.bucket.drain(AIServiceConfig.get_quota_rate_limit_backoff())
+        self._schedule(quota)
+
+    def _schedule(self, quota: ModelQuota) -> None:
+        if quota.timer is not None or not quota.has_waiters():
+            return
+        quota.timer = asyncio.get_running_loop().call_later(
+            quota.bucket.wait_time(), self._dispatch, quota
+        )
+
+    def _dispatch(self, quota: ModelQuota) -> None:
+        quota.timer = None
+        while quota.has_waiters() and quota.bucket.try_take():
+            waiter = quota.next_waiter()
+            if waiter is None:
+                # Only abandoned waiters were left; give the token back
+                quota.bucket.tokens += 1
+                break
+            waiter.set_result(None)
+            quota.metrics["granted"] += 1
+        self._schedule(quota)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            f"{provider}/{model}": {
+                "rpm": quota.bucket.rate * 60,
+                "burst": quota.bucket.capacity,
+                "tokens": round(quota.bucket.tokens, 2),
+                "queue_depth": quota.depth(),
+                **quota.metrics,
+            }
+            for (provider, model), quota in self.quotas.items()
+            if quota is not None
+        }
+
+
+_quota_scheduler = QuotaScheduler()
+
+
+def get_quota_scheduler() -> QuotaScheduler:
+    return _quota_scheduler
@@ -0,0 +1,183 @@
+"""
+Shared AI provider clients.
+
+The app lifespan starts one registry: a single Gemini client and the pooled
+HTTP client used for Groq. Routers fetch their clients here instead of
+building their own, and startup warms each provider so the first user
+request does not pay for connection setup.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from google import genai
+from pydantic import BaseModel
+
+from ..http_client import close_http_client, get_http_client
+from .breaker import CircuitBreaker
+from .config import AIServiceConfig
+from .latency import LatencyHistogram
+
+GEMINI = "gemini"
+GROQ = "groq"
+
+
+class ProviderStatus(BaseModel):
+    name: str
+    configured: bool
+    healthy: Optional[bool] = None  # None until the provider has been checked
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+    checked_at: Optional[float] = None
+
+
+class AIRegistry:
+    """Owns the provider clients and their health status."""
+
+    def __init__(self):
+        self._gemini: Optional[genai.Client] = None
+        self.status: Dict[str, ProviderStatus] = {}
+        self.latencies: Dict[str, LatencyHistogram] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Gemini models supporting generateContent, refreshed in the background
+        self.gemini_models: List[str] = []
+        self.gemini_models_refreshed_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def gemini(self) -> genai.Client:
+        """The shared Gemini client; use `.aio` for async calls."""
+        if self._gemini is None:
+            api_key = AIServiceConfig.get_gemini_api_key()
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY not found in environment variables")
+            self._gemini = genai.Client(api_key=api_key)
+        return self._gemini
+
+    def http(self) -> httpx.AsyncClient:
+        """The shared pooled HTTP client, used for Groq."""
+        return get_http_client()
+
+    def latency(self, provider: str) -> LatencyHistogram:
+        """Latency histogram of successful calls to a provider."""
+        return self.latencies.setdefault(provider, LatencyHistogram())
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        """Circuit breaker guarding calls to a provider."""
+        if provider not in self.breakers:
+            self.breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=AIServiceConfig.get_breaker_failure_threshold(),
+                reset_timeout=AIServiceConfig.get_breaker_reset_timeout(),
+            )
+        return self.breakers[provider]
+
+    def gemini_configured(self) -> bool:
+        return bool(AIServiceConfig.get_gemini_api_key())
+
+    def groq_configured(self) -> bool:
+        return bool(AIServiceConfig.get_groq_api_key())
+
+    async def _check(self, name: str, configured: bool, probe) -> None:
+        status = ProviderStatus(name=name, configured=configured)
+        if configured:
+            start_time = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    probe(), timeout=AIServiceConfig.get_warmup_timeout()
+                )
+                status.healthy = True
+            except Exception as e:
+                status.healthy = False
+                status.error = f"{type(e).__name__}: {str(e)}"
+            status.latency_ms = (time.perf_counter() - start_time) * 1000
+            status.checked_at = time.time()
+        self.status[name] = status
+
+    async def refresh_gemini_models(self) -> List[str]:
+        """Re-list the Gemini models that support generateContent."""
+        available = []
+        async for model in await self.gemini().aio.models.list():
+            name = getattr(model, "name", None)
+            if not name:
+                continue
+            supported = getattr(model, "supported_actions", None)
+            if supported and "generateContent" not in supported:
+                continue
+            available.append(name)
+
+        self.gemini_models = available
+        self.gemini_models_refreshed_at = time.time()
+        return available
+
+    async def _refresh_gemini_models_forever(self) -> None:
+        while True:
+            await asyncio.sleep(AIServiceConfig.get_model_refresh_interval())
+            try:
+                await self.refresh_gemini_models()
+            except Exception as e:
+                print(f"Gemini model refresh failed: {str(e)}")
+
+    async def _probe_gemini(self) -> None:
+        # Listing models authenticates, leaves a warm connection in the pool
+        # and fills the model cache
+        await self.refresh_gemini_models()
+
+    async def _probe_groq(self) -> None:
+        parts = urlsplit(AIServiceConfig.get_groq_endpoint())
+        await self.http().head(f"{parts.scheme}://{parts.netloc}/")
+
+    async def check_health(self) -> Dict[str, ProviderStatus]:
+        """Probe every configured provider concurrently."""
+        await asyncio.gather(
+            self._check(GEMINI, self.gemini_configured(), self._probe_gemini),
+            self._check(GROQ, self.groq_configured(), self._probe_groq),
+        )
+        for status in self.status.values():
+            if status.healthy is False:
+                print(f"AI provider {status.name} unavailable: {status.error}")
+        return self.status
+
+    async def start(self) -> None:
+        self.http()
+        if self.gemini_configured():
+            self.gemini()
+        await self.check_health()
+        if self.gemini_configured():
+            self._refresh_task = asyncio.create_task(
+                self._refresh_gemini_models_forever()
+            )
+
+    async def close(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._gemini is not None:
+            await self._gemini.aio.aclose()
+            self._gemini.close()
+            self._gemini = None
+        await close_http_client()
+
+    def health(self) -> Dict[str, Dict]:
+        statuses = {
+            GEMINI: ProviderStatus(name=GEMINI, configured=self.gemini_configured()),
+            GROQ: ProviderStatus(name=GROQ, configured=self.groq_configured()),
+        }
+        statuses.update(self.status)
+        return {
+            name: {
+                **status.model_dump(),
+                "latency": self.latency(name).summary(),
+                "circuit": self.breaker(name).snapshot(),
+            }
+            for name, status in statuses.items()
+        }
+
+
+_registry = AIRegistry()
+
+
+def get_registry() -> AIRegistry:
+    return _registry
@@ -0,0 +1,208 @@
+"""
+Per-provider circuit breakers and adaptive timeouts.
+
+Every provider call goes through call_provider: it fails fast with
+CircuitOpenError while the provider's breaker is open, bounds the call by a
+timeout derived from the provider's observed p99 latency, and feeds the
+outcome back into the breaker and the latency histogram. Only errors that
+say the provider is unhealthy (transport errors, timeouts, 429 and 5xx)
+count against the breaker; a response that fails to parse or validate does
+not. Before it is sent,
+the call waits for a token from the provider/model quota. stream_provider
+does the same for streamed responses.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from .breaker import CircuitBreaker, CircuitOpenError
+from .config import AIServiceConfig
+from .quota import get_quota_scheduler
+from .registry import get_registry
+
+T = TypeVar("T")
+
+
+def adaptive_timeout(provider: str, ceiling: Optional[float] = None) -> float:
+    """
+    Observed p99 latency times AI_TIMEOUT_MULTIPLIER, clamped to
+    [AI_TIMEOUT_MIN, ceiling]. Until there are enough samples the ceiling
+    itself is used.
+    """
+    ceiling = ceiling or AIServiceConfig.get_timeout_max()
+    histogram = get_registry().latency(provider)
+    if histogram.count < AIServiceConfig.get_timeout_min_samples():
+        return ceiling
+
+    p99 = histogram.percentile(99)
+    timeout = p99 * AIServiceConfig.get_timeout_multiplier()
+    return max(AIServiceConfig.get_timeout_min(), min(ceiling, timeout))
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    # google-genai errors carry `code`; httpx errors carry the response
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _causes(error: Optional[BaseException]):
+    while error is not None:
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """
+    True for an HTTP 429 from the google-genai client or httpx, including
+    one wrapped in another exception.
+    """
+    return any(_status_code(cause) == 429 for cause in _causes(error))
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    True when the error says the provider is unhealthy: a transport error,
+    a timeout, or a 429 or 5xx response, including one wrapped in another
+    exception. Other 4xx responses and errors raised while handling an
+    answer, such as a parse or validation error, are not.
+    """
+    for cause in _causes(error):
+        if isinstance(cause, (httpx.TransportError, TimeoutError, ConnectionError)):
+            return True
+        status = _status_code(cause)
+        if status is not None:
+            return status == 429 or status >= 500
+    return False
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    True when the same call may succeed later: the circuit was open or the
+    provider failed, including either wrapped in another exception.
+    """
+    return is_provider_failure(error) or any(
+        isinstance(cause, CircuitOpenError) for cause in _causes(error)
+    )
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds the error asks the caller to wait before retrying, such as the
+    time left on an open circuit, including from a wrapped exception.
+    """
+    for cause in _causes(error):
+        retry_in = getattr(cause, "retry_in", None)
+        if retry_in:
+            return retry_in
+    return None
+
+
+def _record_error(
+    breaker: CircuitBreaker, provider: str, model: str, error: Exception
+) -> None:
+    if not is_provider_failure(error):
+        # The provider answered; the request or its handling was at fault
+        breaker.record_success()
+        return
+    breaker.record_failure()
+    if is_rate_limited(error):
+        get_quota_scheduler().rate_limited(provider, model)
+
+
+async def _acquire_quota(
+    breaker: CircuitBreaker, provider: str, model: str, module: str, cost: int = 1
+) -> None:
+    try:
+        await get_quota_scheduler().acquire(provider, model, module, cost=cost)
+    except BaseException:
+        # Never reached the provider; release a half-open probe slot
+        breaker.record_cancelled()
+        raise
+
+
+async def call_provider(
+    provider: str,
+    call: Callable[[], Awaitable[T]],
+    timeout_ceiling: Optional[float] = None,
+    model: str = "default",
+    module: str = "default",
+    cost: int = 1,
+) -> T:
+    """
+    Run one provider call behind its circuit breaker, quota and adaptive
+    timeout. `model` picks the quota bucket; `module` is the router making
+    the call, used to share a throttled bucket fairly. `cost` is the number
+    of samples a grouped call carries, each charged against the quota.
+    """
+    registry = get_registry()
+    breaker = registry.breaker(provider)
+    breaker.before_call()
+    await _acquire_quota(breaker, provider, model, module, cost)
+
+    timeout = adaptive_timeout(provider, timeout_ceiling)
+    start_time = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(call(), timeout=timeout)
+    except asyncio.CancelledError:
+        breaker.record_cancelled()
+        raise
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        raise TimeoutError(f"{provider} call timed out after {timeout:.1f}s")
+    except Exception as e:
+        _record_error(breaker, provider, model, e)
+        raise
+
+    registry.latency(provider).record(time.perf_counter() - start_time)
+    breaker.record_success()
+    return result
+
+
+async def stream_provider(
+    provider: str,
+    open_stream: Callable[[], Awaitable[AsyncIterator[T]]],
+    timeout_ceiling: Optional[float] = None,
+    model: str = "default",
+    module: str = "default",
+) -> AsyncIterator[T]:
+    """
+    call_provider for streamed responses. The adaptive timeout bounds the
+    wait for each chunk rather than the whole stream; the full duration is
+    recorded as the call's latency once the stream completes.
+    """
+    registry = get_registry()
+    breaker = registry.breaker(provider)
+    breaker.before_call()
+    await _acquire_quota(breaker, provider, model, module)
+
+    timeout = adaptive_timeout(provider, timeout_ceiling)
+    start_time = time.perf_counter()
+    try:
+        stream = await asyncio.wait_for(open_stream(), timeout=timeout)
+        chunks = stream.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        # Client went away mid-stream; says nothing about the provider
+        breaker.record_cancelled()
+        raise
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        raise TimeoutError(f"{provider} stream stalled for {timeout:.1f}s")
+    except Exception as e:
+        _record_error(breaker, provider, model, e)
+        raise
+
+    registry.latency(provider).record(time.perf_counter() - start_time)
+    breaker.record_success()
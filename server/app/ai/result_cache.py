@@ -0,0 +1,380 @@
+"""
+Content-addressed cache for LLM results.
+
+Keys hash everything that determines a model's answer: the model name,
+system instruction, generation config and the input bytes or prompt. A hit
+returns the stored result without a provider round-trip. Results live in an
+in-memory LRU and, when AI_CACHE_DIR is set, in JSON files on disk so they
+survive restarts and are shared between workers. Writes sweep the disk tier
+now and then, deleting expired files and the oldest ones past
+AI_CACHE_MAX_DISK_BYTES.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from ..cache import TTLCache
+from .singleflight import SingleFlight
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class ResultCacheConfig:
+    """Result cache settings - reads from environment dynamically"""
+
+    @staticmethod
+    def enabled() -> bool:
+        return os.getenv("AI_CACHE_ENABLED", "1") != "0"
+
+    @staticmethod
+    def get_max_size() -> int:
+        return int(os.getenv("AI_CACHE_SIZE", "256"))
+
+    @staticmethod
+    def get_ttl() -> float:
+        return float(os.getenv("AI_CACHE_TTL", str(24 * 3600)))
+
+    @staticmethod
+    def get_dir() -> Optional[str]:
+        return os.getenv("AI_CACHE_DIR") or None
+
+    @staticmethod
+    def get_max_disk_bytes() -> int:
+        """Cap on the disk tier; 0 for no cap."""
+        return int(os.getenv("AI_CACHE_MAX_DISK_BYTES", str(256 * 1024 * 1024)))
+
+    @staticmethod
+    def get_sweep_interval() -> float:
+        return float(os.getenv("AI_CACHE_SWEEP_INTERVAL", "600"))
+
+
+class ContentDigest(NamedTuple):
+    """
+    Digest standing in for bytes in a content_key, for results that arrive
+    after the bytes themselves were dropped (e.g. offline batches).
+    """
+
+    sha256: str
+
+    @classmethod
+    def of(cls, data: bytes) -> "ContentDigest":
+        return cls(hashlib.sha256(data).hexdigest())
+
+
+def _canonical(value: Any) -> Any:
+    """Reduce a key part to plain JSON; bytes are replaced by their digest."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    if isinstance(value, ContentDigest):
+        return {"sha256": value.sha256}
+    if isinstance(value, BaseModel):
+        return _canonical(value.model_dump(exclude_none=True))
+    if isinstance(value, type) and issubclass(value, BaseModel):
+        return _canonical(value.model_json_schema())
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def content_key(namespace: str, **parts: Any) -> str:
+    """
+    Stable key for one model call, e.g.
+    content_key("dysgraphia", model=..., system_instruction=..., config=..., image=b"...")
+    """
+    payload = json.dumps(
+        {"namespace": namespace, "parts": _canonical(parts)},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory, optional disk) TTL cache of JSON-serialisable results."""
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: float = 24 * 3600,
+        directory: Optional[str] = None,
+        max_disk_bytes: int = 0,
+        sweep_interval: float = 600,
+    ):
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self.memory: TTLCache[Any] = TTLCache(max_size=max_size, ttl=ttl)
+        self.flights = SingleFlight()
+        self._metrics_lock = threading.Lock()
+        self.metrics: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "disk_errors": 0,
+            "disk_evictions": 0,
+        }
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _count(self, metric: str) -> None:
+        with self._metrics_lock:
+            self.metrics[metric] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self._count("disk_errors")
+            return None
+
+        if entry.get("expires_at") and entry["expires_at"] < time.time():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return entry.get("value")
+
+    def _write_disk(self, key: str, value: Any, ttl: float) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(
+                    {"expires_at": time.time() + ttl if ttl else 0, "value": value}, f
+                )
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            self._count("disk_errors")
+            print(f"AI result cache write failed: {str(e)}")
+        self._maybe_sweep()
+
+    def _maybe_sweep(self) -> None:
+        # At most one sweep per interval, run by whichever write is due
+        if time.time() < self._next_sweep or not self._sweep_lock.acquire(False):
+            return
+        try:
+            self._next_sweep = time.time() + self.sweep_interval
+            self.sweep()
+        finally:
+            self._sweep_lock.release()
+
+    def _expired(self, path: str, now: float) -> bool:
+        try:
+            with open(path) as f:
+                expires_at = json.load(f).get("expires_at")
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            # Unreadable entries would only ever count as errors
+            return True
+        return bool(expires_at) and expires_at < now
+
+    def sweep(self) -> int:
+        """
+        Delete expired disk entries, then the least recently written ones
+        until the disk tier fits in max_disk_bytes. Returns how many
+        entries were deleted.
+        """
+        if not self.directory:
+            return 0
+        now = time.time()
+        entries = []
+        deleted = 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                    if entry.name.endswith(".tmp"):
+                        # Left behind by a writer that died mid-write
+                        if stat.st_mtime < now - 3600:
+                            os.remove(entry.path)
+                        continue
+                    if self._expired(entry.path, now):
+                        os.remove(entry.path)
+                        deleted += 1
+                        continue
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if self.max_disk_bytes and total > self.max_disk_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                deleted += 1
+                self._count("disk_evictions")
+        if deleted:
+            print(f"AI result cache sweep deleted {deleted} disk entries")
+        return deleted
+
+    def _from_memory(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+        return value
+
+    def _from_disk(self, key: str, value: Optional[Any]) -> Optional[Any]:
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("disk_hits")
+        self.memory.set(key, value)
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._from_memory(key)
+        if value is not None:
+            return value
+        return self._from_disk(key, self._read_disk(key) if self.directory else None)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl=ttl)
+        if self.directory:
+            self._write_disk(key, value, ttl)
+        self._count("stores")
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get for async callers; the disk read runs in a worker thread."""
+        value = self._from_memory(key)
+        if value is not None:
+            return value
+        if not self.directory:
+            return self._from_disk(key, None)
+        return self._from_disk(key, await asyncio.to_thread(self._read_disk, key))
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """set for async callers; the disk write runs in a worker thread."""
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl=ttl)
+        if self.directory:
+            await asyncio.to_thread(self._write_disk, key, value, ttl)
+        self._count("stores")
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Optional[Any]]],
+        ttl: Optional[float] = None,
+    ) -> Optional[Any]:
+        """
+        Return the cached value, or compute and cache it. None is never
+        cached. Concurrent misses on one key share a single computation.
+        """
+        value = await self.aget(key)
+        if value is not None:
+            return value
+
+        async def compute_and_store() -> Optional[Any]:
+            value = await compute()
+            if value is not None:
+                await self.aset(key, value, ttl)
+            return value
+
+        return await self.flights.do(key, compute_and_store)
+
+    async def get_or_compute_model(
+        self,
+        key: str,
+        model_type: Type[M],
+        compute: Callable[[], Awaitable[Optional[M]]],
+        ttl: Optional[float] = None,
+    ) -> Optional[M]:
+        """get_or_compute for pydantic results, stored as plain JSON."""
+        cached = await self.aget(key)
+        if cached is not None:
+            return model_type.model_validate(cached)
+
+        async def compute_and_store() -> Optional[M]:
+            result = await compute()
+            if result is not None:
+                await self.aset(key, result.model_dump(mode="json"), ttl)
+            return result
+
+        return await self.flights.do(key, compute_and_store)
+
+    def clear(self) -> None:
+        self.memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        lookups = metrics["memory_hits"] + metrics["disk_hits"] + metrics["misses"]
+        hits = metrics["memory_hits"] + metrics["disk_hits"]
+        return {
+            **metrics,
+            "hit_rate": hits / lookups if lookups else 0,
+            "memory_entries": len(self.memory),
+            "disk_enabled": bool(self.directory),
+            "coalesced": self.flights.coalesced,
+            "in_flight": len(self.flights),
+        }
+
+
+class _DisabledCache(ResultCache):
+    """Pass-through used when AI_CACHE_ENABLED=0."""
+
+    def get(self, key: str) -> Optional[Any]:
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        pass
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        pass
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            cache_type = ResultCache if ResultCacheConfig.enabled() else _DisabledCache
+            _result_cache = cache_type(
+                max_size=ResultCacheConfig.get_max_size(),
+                ttl=ResultCacheConfig.get_ttl(),
+                directory=ResultCacheConfig.get_dir(),
+                max_disk_bytes=ResultCacheConfig.get_max_disk_bytes(),
+                sweep_interval=ResultCacheConfig.get_sweep_interval(),
+            )
+        return _result_cache
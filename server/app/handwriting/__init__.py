@@ -0,0 +1,57 @@
+from .batch import (
+    BatchConfig,
+    add_batch_routes,
+    get_offline_batches,
+    read_samples,
+    stream_batch,
+)
+from .document import DocumentConfig, add_document_routes, analyze_document
+from .features import HandwritingFeatures, extract_features
+from .normalize import NormalizeConfig, normalize_image, normalize_stats, prepare_image
+from .prescreen import (
+    HandwritingConfig,
+    features_prompt,
+    is_clearly_low_risk,
+    prescreen_stats,
+    record_outcome,
+    screen,
+)
+from .predictor import HandwritingPredictor, PendingSample, weighted_mean
+from .quality import (
+    QualityConfig,
+    QualityReport,
+    assess_quality,
+    check_quality,
+    rejection,
+)
+
+__all__ = [
+    "BatchConfig",
+    "add_batch_routes",
+    "get_offline_batches",
+    "read_samples",
+    "stream_batch",
+    "DocumentConfig",
+    "add_document_routes",
+    "analyze_document",
+    "HandwritingFeatures",
+    "extract_features",
+    "HandwritingConfig",
+    "features_prompt",
+    "is_clearly_low_risk",
+    "prescreen_stats",
+    "record_outcome",
+    "screen",
+    "NormalizeConfig",
+    "normalize_image",
+    "normalize_stats",
+    "prepare_image",
+    "HandwritingPredictor",
+    "PendingSample",
+    "weighted_mean",
+    "QualityConfig",
+    "QualityReport",
+    "assess_quality",
+    "check_quality",
+    "rejection",
+]
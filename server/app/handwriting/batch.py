@@ -0,0 +1,562 @@
+"""
+Batch screening of many handwriting samples, e.g. a whole classroom.
+
+Online batches are fanned out under a concurrency cap, optionally several
+samples per Gemini request, and each result is streamed back as one NDJSON
+line as soon as it is ready. Offline batches go through the provider's
+batch API, which is cheaper but may take hours; the client polls for the
+results. Offline batches are kept in SQLite, so a poll can reach any
+worker process. HANDWRITING_BATCH_BACKEND=local swaps the batch API for an
+in-process stand-in, for tests and development without an API key.
+"""
+
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Set
+
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from google.genai import types
+
+from ..ai import GEMINI, ContentDigest, call_provider, is_retryable
+from ..uploads import UploadConfig, UploadTooLargeError, read_upload
+from .batch_store import BatchStore
+from .predictor import MODEL, HandwritingPredictor, PendingSample
+from .quality import QualityReport, assess_quality, rejection
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+
+ONLINE = "online"
+OFFLINE = "offline"
+
+# Provider batch states after which nothing more will happen
+BATCH_DONE_STATES = (
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+)
+
+
+class BatchConfig:
+    """Configuration for batch screening - reads from environment dynamically"""
+
+    @staticmethod
+    def get_max_images():
+        return int(os.getenv("HANDWRITING_BATCH_MAX_IMAGES", "100"))
+
+    @staticmethod
+    def get_concurrency():
+        return int(os.getenv("HANDWRITING_BATCH_CONCURRENCY", "4"))
+
+    @staticmethod
+    def get_max_group_size():
+        return int(os.getenv("HANDWRITING_BATCH_MAX_GROUP", "8"))
+
+    @staticmethod
+    def get_max_total_bytes():
+        # Across every file in one batch upload, zips counted uncompressed
+        return int(os.getenv("HANDWRITING_BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+
+    @staticmethod
+    def get_offline_backend():
+        # gemini: the provider's batch API; local: in-process stand-in
+        return os.getenv("HANDWRITING_BATCH_BACKEND", "gemini").lower()
+
+    @staticmethod
+    def get_result_ttl():
+        return float(os.getenv("HANDWRITING_BATCH_TTL", str(48 * 3600)))
+
+    @staticmethod
+    def get_db_path():
+        return os.getenv("HANDWRITING_BATCH_DB_PATH", "data/batches.sqlite3")
+
+
+class Sample(NamedTuple):
+    filename: str
+    content: bytes
+
+
+def _is_image(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _unzip(content: bytes, max_bytes: int) -> List[Sample]:
+    samples = []
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            # Skip folders and the resource forks macOS adds to zips
+            if (
+                info.is_dir()
+                or "__MACOSX" in name
+                or os.path.basename(name).startswith(".")
+            ):
+                continue
+            if not _is_image(name):
+                continue
+            # Checked before extracting, so a zip bomb is never inflated
+            limit = min(max_bytes, UploadConfig.get_max_bytes())
+            if info.file_size > limit:
+                raise UploadTooLargeError(name, limit)
+            samples.append(Sample(name, archive.read(info)))
+            max_bytes -= info.file_size
+    return samples
+
+
+async def read_samples(files: List[UploadFile]) -> List[Sample]:
+    """Images from a multipart upload; zip archives are expanded in place."""
+    samples: List[Sample] = []
+    remaining = BatchConfig.get_max_total_bytes()
+    try:
+        for file in files:
+            filename = file.filename or f"sample-{len(samples) + 1}"
+            if filename.lower().endswith(".zip") or file.content_type in (
+                "application/zip",
+                "application/x-zip-compressed",
+            ):
+                content = await read_upload(file, remaining)
+                try:
+                    unzipped = await asyncio.to_thread(_unzip, content, remaining)
+                except zipfile.BadZipFile:
+                    raise HTTPException(
+                        status_code=400, detail=f"{filename} is not a valid zip archive"
+                    )
+                samples.extend(unzipped)
+                remaining -= sum(len(sample.content) for sample in unzipped)
+            else:
+                content = await read_upload(
+                    file, min(remaining, UploadConfig.get_max_bytes())
+                )
+                if content:
+                    samples.append(Sample(filename, content))
+                remaining -= len(content)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if not samples:
+        raise HTTPException(status_code=400, detail="No images found in the upload")
+    if len(samples) > BatchConfig.get_max_images():
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images ({len(samples)}); the limit is {BatchConfig.get_max_images()}",
+        )
+    return samples
+
+
+def sample_line(index: int, sample: Sample, result: Any) -> Dict[str, Any]:
+    if result is None:
+        return {
+            "index": index,
+            "filename": sample.filename,
+            "status": "failure",
+            "result": None,
+        }
+    return {
+        "index": index,
+        "filename": sample.filename,
+        "status": "success",
+        "result": result.model_dump(mode="json"),
+    }
+
+
+def rejected_line(index: int, sample: Sample, report: QualityReport) -> Dict[str, Any]:
+    return {
+        "index": index,
+        "filename": sample.filename,
+        "status": "rejected",
+        "result": None,
+        **rejection(report),
+    }
+
+
+async def gate_samples(samples: List[Sample]) -> Dict[int, QualityReport]:
+    """Quality reports of the samples that failed the quality gate, by index."""
+    reports = await asyncio.gather(
+        *(assess_quality(sample.content) for sample in samples)
+    )
+    return {
+        index: report
+        for index, report in enumerate(reports)
+        if report is not None and not report.passed
+    }
+
+
+async def stream_batch(
+    predictor: HandwritingPredictor,
+    samples: List[Sample],
+    group_size: int = 1,
+    gate: bool = True,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Per-sample result lines in the order they finish, then a summary line.
+    Samples failing the quality gate are reported first, without being
+    sent to Gemini. With group_size > 1, consecutive samples share one
+    Gemini request.
+    """
+    start_time = time.time()
+    rejected = await gate_samples(samples) if gate else {}
+    for index, report in rejected.items():
+        yield rejected_line(index, samples[index], report)
+
+    semaphore = asyncio.Semaphore(BatchConfig.get_concurrency())
+    accepted = [index for index in range(len(samples)) if index not in rejected]
+    groups = [accepted[i : i + group_size] for i in range(0, len(accepted), group_size)]
+
+    async def run(group: List[int]) -> List[Dict[str, Any]]:
+        async with semaphore:
+            if len(group) == 1:
+                results = [
+                    await predictor.predict_bytes_safely(samples[group[0]].content)
+                ]
+            else:
+                results = await predictor.predict_many(
+                    [samples[index].content for index in group]
+                )
+        return [
+            sample_line(index, samples[index], result)
+            for index, result in zip(group, results)
+        ]
+
+    tasks = [asyncio.create_task(run(group)) for group in groups]
+    succeeded = 0
+    try:
+        for finished in asyncio.as_completed(tasks):
+            for line in await finished:
+                succeeded += line["status"] == "success"
+                yield line
+    finally:
+        # The client went away: stop the work it no longer wants
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "status": "finished",
+        "total": len(samples),
+        "succeeded": succeeded,
+        "rejected": len(rejected),
+        "failed": len(accepted) - succeeded,
+        "elapsed_seconds": round(time.time() - start_time, 2),
+    }
+
+
+async def _ndjson(lines: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    async for line in lines:
+        yield json.dumps(line, separators=(",", ":")) + "\n"
+
+
+def ndjson_response(lines: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Stream one JSON document per line, without proxy buffering."""
+    return StreamingResponse(
+        _ndjson(lines),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def _as_json(result: Any) -> Any:
+    return result.model_dump(mode="json") if hasattr(result, "model_dump") else result
+
+
+class GeminiBatchBackend:
+    """Submits the samples that need Gemini to the provider's batch API."""
+
+    NAME = "gemini"
+
+    async def submit(
+        self, predictor: HandwritingPredictor, batch_id: str, samples: List[Sample]
+    ) -> Optional[Dict[str, Any]]:
+        """JSON state to poll with; the image bytes are not part of it."""
+        results, pending = await predictor.triage(
+            [sample.content for sample in samples]
+        )
+        job = None
+        if pending:
+            requests = await asyncio.gather(
+                *(predictor.batch_request(sample) for sample in pending)
+            )
+            job = await call_provider(
+                GEMINI,
+                lambda: predictor.client.batches.create(
+                    model=MODEL,
+                    src=requests,
+                    config=types.CreateBatchJobConfig(
+                        display_name=f"{predictor.NAMESPACE}-{batch_id}"
+                    ),
+                ),
+                model=MODEL,
+                module=predictor.NAMESPACE,
+                cost=len(pending),
+            )
+            print(f"Submitted {len(pending)} samples as provider batch {job.name}")
+        return {
+            "results": [_as_json(result) for result in results],
+            # The digest stands in for the image in the result's cache keys
+            "pending": [
+                {
+                    "index": sample.index,
+                    "digest": ContentDigest.of(sample.image_bytes).sha256,
+                    "notes": sample.notes,
+                    "key": sample.key,
+                }
+                for sample in pending
+            ],
+            "provider_batch": job.name if job else None,
+        }
+
+    async def poll(
+        self, predictor: HandwritingPredictor, state: Dict[str, Any]
+    ) -> Optional[List[Any]]:
+        """Finished results in sample order, or None while still running."""
+        results = state["results"]
+        if state["provider_batch"] is None:
+            return results
+
+        try:
+            job = await call_provider(
+                GEMINI,
+                lambda: predictor.client.batches.get(name=state["provider_batch"]),
+                model=MODEL,
+                module=predictor.NAMESPACE,
+            )
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            # The provider is unavailable; report the batch as still running
+            print(f"Polling batch {state['provider_batch']} failed: {str(e)}")
+            return None
+        if job.state not in BATCH_DONE_STATES:
+            return None
+
+        responses = (job.dest.inlined_responses if job.dest else None) or []
+        for index, pending in enumerate(state["pending"]):
+            entry = responses[index] if index < len(responses) else None
+            if entry is None or entry.error or entry.response is None:
+                continue
+            result = predictor.parse(entry.response.text)
+            if result is not None:
+                sample = PendingSample(
+                    pending["index"],
+                    ContentDigest(pending["digest"]),
+                    pending["notes"],
+                    pending["key"],
+                )
+                results[sample.index] = _as_json(result)
+                await predictor.cache_result(sample, result)
+        return results
+
+
+class LocalBatchBackend:
+    """
+    In-process stand-in for the batch API, for tests and development. The
+    batch runs in the background of the worker that accepted it, which
+    stores the results when it is done; there is nothing to poll.
+    """
+
+    NAME = "local"
+
+    def __init__(self):
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(
+        self, predictor: HandwritingPredictor, batch_id: str, samples: List[Sample]
+    ) -> Optional[Dict[str, Any]]:
+        task = asyncio.create_task(self._run(predictor, batch_id, samples))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return None
+
+    async def _run(
+        self, predictor: HandwritingPredictor, batch_id: str, samples: List[Sample]
+    ) -> None:
+        group_size = BatchConfig.get_max_group_size()
+        # Samples were already through the quality gate when submitted
+        results = await _collect(
+            stream_batch(predictor, samples, group_size, gate=False), len(samples)
+        )
+        await get_offline_batches().complete(batch_id, results)
+
+    async def poll(
+        self, predictor: HandwritingPredictor, state: Dict[str, Any]
+    ) -> Optional[List[Any]]:
+        return None
+
+
+async def _collect(lines: AsyncIterator[Dict[str, Any]], total: int) -> List[Any]:
+    results: List[Any] = [None] * total
+    async for line in lines:
+        if line.get("status") == "success":
+            results[line["index"]] = line["result"]
+    return results
+
+
+_backends = {
+    GeminiBatchBackend.NAME: GeminiBatchBackend(),
+    LocalBatchBackend.NAME: LocalBatchBackend(),
+}
+
+
+def get_batch_backend(name: Optional[str] = None):
+    name = name or BatchConfig.get_offline_backend()
+    return _backends.get(name, _backends[GeminiBatchBackend.NAME])
+
+
+class OfflineBatches:
+    """
+    Offline batches in flight, polled by id until their results are in.
+    State lives in a BatchStore shared by every worker process.
+    """
+
+    def __init__(self):
+        self.predictors: Dict[str, HandwritingPredictor] = {}
+        self._store: Optional[BatchStore] = None
+        self._store_lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def register(self, predictor: HandwritingPredictor) -> None:
+        """Make a predictor's batches pollable from this process."""
+        self.predictors[predictor.NAMESPACE] = predictor
+
+    def store(self) -> BatchStore:
+        # Opened on first use, so importing the app creates no files
+        with self._store_lock:
+            if self._store is None:
+                self._store = BatchStore(BatchConfig.get_db_path())
+            return self._store
+
+    async def _call(self, method: str, *args: Any) -> Any:
+        return await asyncio.to_thread(lambda: getattr(self.store(), method)(*args))
+
+    async def submit(
+        self, predictor: HandwritingPredictor, samples: List[Sample]
+    ) -> Dict[str, Any]:
+        await self._purge()
+        batch_id = str(uuid.uuid4())
+        rejected = await gate_samples(samples)
+        accepted = [index for index in range(len(samples)) if index not in rejected]
+
+        backend = get_batch_backend()
+        await self._call(
+            "insert",
+            batch_id,
+            predictor.NAMESPACE,
+            backend.NAME,
+            [sample.filename for sample in samples],
+            accepted,
+            {
+                index: rejected_line(index, samples[index], report)
+                for index, report in rejected.items()
+            },
+        )
+        try:
+            state = await backend.submit(
+                predictor, batch_id, [samples[index] for index in accepted]
+            )
+        except BaseException:
+            await self._call("delete", batch_id)
+            raise
+        if state is not None:
+            await self._call("set_state", batch_id, state)
+        return describe(await self._call("get", batch_id))
+
+    async def complete(self, batch_id: str, results: List[Any]) -> None:
+        """Store results given in the order the samples were submitted."""
+        batch = await self._call("get", batch_id)
+        if batch is None:
+            return
+        # Back from the submitted samples to positions in the upload
+        await self._call(
+            "complete",
+            batch_id,
+            {
+                index: _as_json(result)
+                for index, result in zip(batch["accepted"], results)
+            },
+        )
+
+    async def poll(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = await self._call("get", batch_id)
+        if batch is None:
+            return None
+        predictor = self.predictors.get(batch["namespace"])
+        if batch["results"] is None and batch["state"] is not None and predictor:
+            backend = get_batch_backend(batch["backend"])
+            results = await backend.poll(predictor, batch["state"])
+            if results is not None:
+                await self.complete(batch_id, results)
+                batch = await self._call("get", batch_id)
+        return describe(batch)
+
+    async def _purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        await self._call("purge", now - BatchConfig.get_result_ttl())
+
+
+def describe(batch: Dict[str, Any]) -> Dict[str, Any]:
+    """Poll response for a stored batch."""
+    results = batch["results"]
+    description = {
+        "batch_id": batch["batch_id"],
+        "status": "running" if results is None else "completed",
+        "total": len(batch["filenames"]),
+        "rejected": len(batch["rejected"]),
+        "created_at": batch["created_at"],
+    }
+    if results is not None:
+        description["results"] = [
+            batch["rejected"].get(index)
+            or {
+                "index": index,
+                "filename": filename,
+                "status": "failure" if results.get(index) is None else "success",
+                "result": results.get(index),
+            }
+            for index, filename in enumerate(batch["filenames"])
+        ]
+    return description
+
+
+_offline_batches = OfflineBatches()
+
+
+def get_offline_batches() -> OfflineBatches:
+    return _offline_batches
+
+
+def add_batch_routes(router: APIRouter, predictor: HandwritingPredictor) -> None:
+    """Register POST /analyze/batch and GET /analyze/batch/{batch_id}."""
+    get_offline_batches().register(predictor)
+
+    @router.post("/analyze/batch")
+    async def analyze_batch(
+        files: List[UploadFile] = File(...),
+        mode: str = Query(ONLINE, pattern=f"^({ONLINE}|{OFFLINE})$"),
+        group_size: int = Query(1, ge=1),
+    ):
+        samples = await read_samples(files)
+        if mode == OFFLINE:
+            batch = await get_offline_batches().submit(predictor, samples)
+            return JSONResponse(status_code=202, content=batch)
+
+        group_size = min(group_size, BatchConfig.get_max_group_size())
+        return ndjson_response(stream_batch(predictor, samples, group_size))
+
+    @router.get("/analyze/batch/{batch_id}")
+    async def get_batch(batch_id: str):
+        batch = await get_offline_batches().poll(batch_id)
+        if batch is None:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return batch
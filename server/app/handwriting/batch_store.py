@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+COLUMNS = (
+    "batch_id",
+    "namespace",
+    "backend",
+    "state",
+    "filenames",
+    "accepted",
+    "rejected",
+    "results",
+    "created_at",
+)
+
+# Columns stored as JSON
+JSON_COLUMNS = ("state", "filenames", "accepted", "rejected", "results")
+
+
+class BatchStore:
+    """
+    SQLite-backed table of offline batches, so any worker process can
+    answer a poll and batches survive a restart.
+
+    Only what a poll needs is kept: the provider batch name, digests and
+    notes of the samples sent to it, and the results. Image bytes are
+    never stored; the provider has them once the batch is submitted.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS offline_batches (
+        batch_id TEXT PRIMARY KEY,
+        namespace TEXT NOT NULL,
+        backend TEXT NOT NULL,
+        state TEXT,
+        filenames TEXT NOT NULL,
+        accepted TEXT NOT NULL,
+        rejected TEXT NOT NULL,
+        results TEXT,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_offline_batches_created
+        ON offline_batches (created_at);
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _row(row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        batch = dict(zip(COLUMNS, row))
+        for name in JSON_COLUMNS:
+            if batch[name] is not None:
+                batch[name] = json.loads(batch[name])
+        # JSON object keys are strings; positions in the upload are ints
+        batch["rejected"] = {
+            int(index): line for index, line in batch["rejected"].items()
+        }
+        if batch["results"] is not None:
+            batch["results"] = {
+                int(index): result for index, result in batch["results"].items()
+            }
+        return batch
+
+    def insert(
+        self,
+        batch_id: str,
+        namespace: str,
+        backend: str,
+        filenames: list,
+        accepted: list,
+        rejected: Dict[int, Any],
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO offline_batches (batch_id, namespace, backend, "
+                "filenames, accepted, rejected, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    batch_id,
+                    namespace,
+                    backend,
+                    json.dumps(filenames),
+                    json.dumps(accepted),
+                    json.dumps(rejected),
+                    time.time(),
+                ),
+            )
+
+    def get(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM offline_batches WHERE batch_id = ?",
+                (batch_id,),
+            ).fetchone()
+        return self._row(row)
+
+    def set_state(self, batch_id: str, state: Dict[str, Any]) -> None:
+        """Backend state of a submitted batch, unless it already finished."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE offline_batches SET state = ? "
+                "WHERE batch_id = ? AND results IS NULL",
+                (json.dumps(state), batch_id),
+            )
+
+    def complete(self, batch_id: str, results: Dict[int, Any]) -> None:
+        """Store the results; the backend state is no longer needed."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE offline_batches SET results = ?, state = NULL "
+                "WHERE batch_id = ?",
+                (json.dumps(results), batch_id),
+            )
+
+    def delete(self, batch_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM offline_batches WHERE batch_id = ?", (batch_id,)
+            )
+
+    def purge(self, before: float) -> int:
+        """Delete batches created before `before`; returns the count."""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM offline_batches WHERE created_at < ?", (before,)
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
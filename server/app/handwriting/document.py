@@ -0,0 +1,299 @@
+"""
+Multi-page and large handwriting scans.
+
+A document - a multi-page TIFF or PDF, several page images, or one tall
+scan - is split into tiles of a few text lines each, found from the
+horizontal ink profile. The tiles are analysed concurrently under
+HANDWRITING_TILE_CONCURRENCY, so wall-clock time follows the slowest tile
+rather than the page count, and no page has to be shrunk until the writing
+is illegible. Each predictor then merges the tile results into one,
+weighted by how much writing each tile holds.
+
+PDFs need the optional pypdfium2 package.
+"""
+
+import asyncio
+import importlib.util
+import io
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from PIL import Image, ImageOps, ImageSequence
+
+from ..uploads import UploadConfig, UploadTooLargeError, read_upload
+from .batch import BatchConfig
+from .features import MAX_SIDE, find_runs, ink_mask
+from .predictor import HandwritingPredictor
+from .quality import QualityConfig, QualityReport, check_grayscale, rejection
+
+
+class DocumentConfig:
+    """Configuration for tiled analysis - reads from environment dynamically"""
+
+    @staticmethod
+    def get_max_pages():
+        return int(os.getenv("HANDWRITING_MAX_PAGES", "20"))
+
+    @staticmethod
+    def get_lines_per_tile():
+        return int(os.getenv("HANDWRITING_TILE_LINES", "6"))
+
+    @staticmethod
+    def get_tile_concurrency():
+        return int(os.getenv("HANDWRITING_TILE_CONCURRENCY", "8"))
+
+    @staticmethod
+    def get_pdf_dpi():
+        return int(os.getenv("HANDWRITING_PDF_DPI", "150"))
+
+    @staticmethod
+    def pdf_supported() -> bool:
+        return importlib.util.find_spec("pypdfium2") is not None
+
+
+class Tile(NamedTuple):
+    page: int
+    box: Tuple[int, int, int, int]  # left, top, right, bottom in the page
+    content: bytes
+    weight: float  # share of the document's writing in this tile
+
+
+def _is_pdf(content: bytes) -> bool:
+    return content[:5] == b"%PDF-"
+
+
+def _pdf_pages(content: bytes, max_pages: int) -> List[Image.Image]:
+    import pypdfium2
+
+    document = pypdfium2.PdfDocument(content)
+    scale = DocumentConfig.get_pdf_dpi() / 72
+    try:
+        return [
+            document[index].render(scale=scale).to_pil()
+            # One past the limit, so tile_document can report the excess
+            for index in range(min(len(document), max_pages + 1))
+        ]
+    finally:
+        document.close()
+
+
+def load_pages(content: bytes, max_pages: Optional[int] = None) -> List[Image.Image]:
+    """
+    Upright grayscale pages of an image, multi-frame TIFF or PDF; at most
+    one more than `max_pages`, which defaults to HANDWRITING_MAX_PAGES.
+    """
+    if max_pages is None:
+        max_pages = DocumentConfig.get_max_pages()
+    if _is_pdf(content):
+        if not DocumentConfig.pdf_supported():
+            raise ValueError(
+                "PDF uploads need the pypdfium2 package; upload page images instead"
+            )
+        pages = _pdf_pages(content, max_pages)
+    else:
+        image = Image.open(io.BytesIO(content))
+        pages = [
+            ImageOps.exif_transpose(frame.copy())
+            for _, frame in zip(range(max_pages + 1), ImageSequence.Iterator(image))
+        ]
+    return [page.convert("L") for page in pages]
+
+
+def split_page(
+    page: Image.Image, small: np.ndarray, lines_per_tile: int
+) -> List[Tuple[Tuple[int, int, int, int], float]]:
+    """
+    (box, ink) of each tile of a page: runs of `lines_per_tile` text lines,
+    cut halfway through the gaps between them. `small` is the page scaled
+    down to at most MAX_SIDE. A page with no more lines than that is one
+    tile.
+    """
+    ink = ink_mask(small)
+
+    row_profile = ink.sum(axis=1)
+    lines = find_runs(
+        row_profile > max(1, 0.02 * row_profile.max()), max_gap=2, min_length=4
+    )
+    if len(lines) <= lines_per_tile:
+        return [((0, 0, page.width, page.height), float(row_profile.sum()))]
+
+    groups = [
+        lines[i : i + lines_per_tile] for i in range(0, len(lines), lines_per_tile)
+    ]
+    # Cut between groups, halfway through the gap
+    cuts = [0]
+    for previous, following in zip(groups, groups[1:]):
+        cuts.append((previous[-1][1] + following[0][0]) // 2)
+    cuts.append(small.shape[0])
+
+    scale = page.height / small.shape[0]
+    return [
+        (
+            (0, int(top * scale), page.width, int(bottom * scale)),
+            float(row_profile[top:bottom].sum()),
+        )
+        for top, bottom in zip(cuts, cuts[1:])
+    ]
+
+
+def _encode(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def tile_document(
+    files: List[bytes],
+) -> Tuple[int, List[Tile], Dict[int, QualityReport]]:
+    """
+    Page count, tiles of every usable page in reading order, and the
+    quality reports of the pages that failed the quality gate.
+    """
+    max_pages = DocumentConfig.get_max_pages()
+    pages = []
+    # A single-page file is kept as uploaded when it is not split, so it
+    # shares cache entries with the single-image /analyze endpoints
+    originals: Dict[int, bytes] = {}
+    for content in files:
+        try:
+            file_pages = load_pages(content, max_pages - len(pages))
+        except Image.DecompressionBombError:
+            raise ValueError("A page has too many pixels to process")
+        if len(file_pages) == 1:
+            originals[len(pages)] = content
+        pages.extend(file_pages)
+        # Stop decoding as soon as the document is known to be too long
+        if len(pages) > max_pages:
+            raise ValueError(f"Too many pages; the limit is {max_pages}")
+    if not pages:
+        raise ValueError("The document has no pages")
+
+    lines_per_tile = DocumentConfig.get_lines_per_tile()
+    rejected: Dict[int, QualityReport] = {}
+    boxes = []
+    for number, page in enumerate(pages):
+        small = page.copy()
+        small.thumbnail((MAX_SIDE, MAX_SIDE))
+        small = np.asarray(small)
+        if QualityConfig.gate_enabled():
+            report = check_grayscale(small, page.width, page.height)
+            if not report.passed:
+                rejected[number] = report
+                continue
+        page_tiles = split_page(page, small, lines_per_tile)
+        for box, ink in page_tiles:
+            whole = len(page_tiles) == 1 and number in originals
+            content = originals[number] if whole else _encode(page.crop(box))
+            boxes.append((number, box, content, ink))
+
+    total_ink = sum(ink for _, _, _, ink in boxes) or 1.0
+    tiles = [
+        Tile(number, box, content, ink / total_ink)
+        for number, box, content, ink in boxes
+    ]
+    return len(pages), tiles, rejected
+
+
+async def analyze_document(
+    predictor: HandwritingPredictor, files: List[bytes]
+) -> Dict[str, Any]:
+    """
+    One result for a whole document, from its tiles analysed concurrently.
+    Pages failing the quality gate, e.g. a blank back page, are left out.
+    """
+    start_time = time.time()
+    pages, tiles, rejected = await asyncio.to_thread(tile_document, files)
+    if not tiles:
+        # Nothing could be read; explain why with the first page's report
+        return {"status": "rejected", **rejection(rejected[min(rejected)])}
+
+    semaphore = asyncio.Semaphore(DocumentConfig.get_tile_concurrency())
+
+    async def run(tile: Tile):
+        async with semaphore:
+            return await predictor.predict_bytes_safely(tile.content)
+
+    results = await asyncio.gather(*(run(tile) for tile in tiles))
+    analysed = [(tile, result) for tile, result in zip(tiles, results) if result]
+    print(
+        f"Analysed {len(analysed)}/{len(tiles)} tiles of {pages} pages "
+        f"in {time.time() - start_time:.2f}s"
+    )
+    if not analysed:
+        return {
+            "status": "failure",
+            "pages": pages,
+            "tiles": len(tiles),
+            "result": None,
+        }
+
+    if len(analysed) == 1:
+        result = analysed[0][1]
+    else:
+        result = predictor.aggregate(
+            [result for _, result in analysed],
+            [tile.weight for tile, _ in analysed],
+        )
+    return {
+        "status": "completed",
+        "pages": pages,
+        "tiles": len(tiles),
+        "result": result.model_dump(mode="json"),
+        "tile_results": [
+            {
+                "page": tile.page,
+                "box": list(tile.box),
+                "weight": round(tile.weight, 4),
+                "status": "success" if result is not None else "failure",
+            }
+            for tile, result in zip(tiles, results)
+        ],
+        "rejected_pages": [
+            {"page": number, **rejection(report)} for number, report in rejected.items()
+        ],
+        "elapsed_seconds": round(time.time() - start_time, 2),
+    }
+
+
+def add_document_routes(router: APIRouter, predictor: HandwritingPredictor) -> None:
+    """Register POST /analyze/document."""
+
+    @router.post("/analyze/document")
+    async def analyze_document_upload(files: List[UploadFile] = File(...)):
+        """
+        One analysis of a multi-page document: a multi-page TIFF or PDF,
+        several page images in order, or a single large scan.
+        """
+        remaining = BatchConfig.get_max_total_bytes()
+        contents = []
+        try:
+            for file in files:
+                content = await read_upload(
+                    file, min(remaining, UploadConfig.get_max_bytes())
+                )
+                remaining -= len(content)
+                if content:
+                    contents.append(content)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        if not contents:
+            raise HTTPException(status_code=400, detail="Empty file received")
+
+        try:
+            document = await analyze_document(predictor, contents)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except Image.UnidentifiedImageError:
+            raise HTTPException(
+                status_code=415, detail="Upload images, a multi-page TIFF or a PDF"
+            )
+
+        if document["status"] == "rejected":
+            return JSONResponse(status_code=422, content=document)
+        if document["status"] == "failure":
+            return JSONResponse(status_code=500, content=document)
+        return document
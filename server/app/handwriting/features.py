@@ -0,0 +1,217 @@
+"""
+Local handwriting measurements with Pillow and NumPy.
+
+The page is binarised with Otsu's threshold, text lines are found from the
+horizontal projection profile, and each line is split into ink segments
+(letters, or whole words in joined writing) from its vertical projection.
+Three rubric factors are then measured on those segments:
+
+- baseline instability: how far segment bottoms stray from each line's
+  fitted baseline, relative to letter height
+- spacing inconsistency: spread of the word-sized gaps within lines
+- size inconsistency: spread of x-height segment heights
+
+Each factor is reported both raw and as a 0-1 score. A factor the sample
+does not allow measuring, such as word spacing in a single word, has no
+raw value and scores 0.0; check `fully_measured` before trusting a low
+score.
+"""
+
+import io
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+from pydantic import BaseModel
+
+# Longest side the page is scaled down to before measuring
+MAX_SIDE = 1024
+
+# Raw values that map to a score of 1.0
+BASELINE_SCALE = 0.35  # robust baseline deviation, in letter heights
+SPACING_SCALE = 0.8  # coefficient of variation of word gaps
+SIZE_SCALE = 0.4  # coefficient of variation of x-height letters
+
+# Fewer segments than this and the factors are not meaningful
+MIN_SEGMENTS = 8
+
+Run = Tuple[int, int]
+
+
+class HandwritingFeatures(BaseModel):
+    width: int
+    height: int
+    ink_ratio: float
+    lines: int
+    segments: int
+    baseline_deviation: Optional[float] = None
+    spacing_variation: Optional[float] = None
+    size_variation: Optional[float] = None
+    baseline_instability: float = 0.0
+    spacing_inconsistency: float = 0.0
+    size_inconsistency: float = 0.0
+    measurable: bool = False
+    elapsed_ms: float = 0.0
+
+    @property
+    def fully_measured(self) -> bool:
+        """True when all three factors were measured, not just scored."""
+        return self.measurable and None not in (
+            self.baseline_deviation,
+            self.spacing_variation,
+            self.size_variation,
+        )
+
+
+def load_grayscale(image_bytes: bytes, max_side: int = MAX_SIDE) -> np.ndarray:
+    """Decode, apply EXIF rotation, and scale down to at most `max_side`."""
+    image = Image.open(io.BytesIO(image_bytes))
+    # JPEGs decode straight to a reduced size, much faster for phone photos
+    image.draft("L", (max_side, max_side))
+    image = ImageOps.exif_transpose(image).convert("L")
+    image.thumbnail((max_side, max_side))
+    return np.asarray(image)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = total - weight_dark
+    mean_dark = np.cumsum(histogram * levels)
+    overall = mean_dark[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (overall * weight_dark / total - mean_dark) ** 2 / (
+            weight_dark * weight_light
+        )
+    if np.isnan(between).all():
+        # A single grey level: nothing to separate
+        return 128
+    return int(np.nanargmax(between))
+
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Writing pixels, whether the page is light or dark."""
+    ink = gray <= otsu_threshold(gray)
+    # Otsu picks the minority class as ink only on light paper
+    if ink.mean() > 0.5:
+        ink = ~ink
+    return ink
+
+
+def find_runs(mask: np.ndarray, max_gap: int = 0, min_length: int = 1) -> List[Run]:
+    """[start, end) runs of True, merging runs separated by <= max_gap."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = edges[0::2], edges[1::2]
+
+    runs: List[Run] = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if runs and start - runs[-1][1] <= max_gap:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+    return [(start, end) for start, end in runs if end - start >= min_length]
+
+
+def score(value: Optional[float], scale: float) -> float:
+    # Unmeasured is not the same as consistent; callers check the raw value
+    if value is None:
+        return 0.0
+    return float(min(1.0, max(0.0, value / scale)))
+
+
+def line_segments(band: np.ndarray, top: int) -> List[Tuple[int, int, int, int]]:
+    """(left, right, top, bottom) of each ink segment in one text line."""
+    segments = []
+    for left, right in find_runs(band.any(axis=0), max_gap=1):
+        rows = np.flatnonzero(band[:, left:right].any(axis=1))
+        segments.append((left, right, top + int(rows[0]), top + int(rows[-1]) + 1))
+    return segments
+
+
+def extract_features(image_bytes: bytes) -> HandwritingFeatures:
+    start_time = time.perf_counter()
+
+    gray = load_grayscale(image_bytes)
+    ink = ink_mask(gray)
+    height, width = ink.shape
+
+    row_profile = ink.sum(axis=1)
+    line_runs = find_runs(
+        row_profile > max(1, 0.02 * row_profile.max()),
+        max_gap=2,
+        min_length=4,
+    )
+
+    lines = []
+    for top, bottom in line_runs:
+        segments = line_segments(ink[top:bottom], top)
+        if segments:
+            lines.append(segments)
+
+    heights = np.array(
+        [seg[3] - seg[2] for segments in lines for seg in segments], dtype=np.float64
+    )
+    median_height = float(np.median(heights)) if heights.size else 0.0
+
+    # Drop specks: dots, noise, stray marks
+    lines = [
+        [seg for seg in segments if seg[3] - seg[2] >= 0.3 * median_height]
+        for segments in lines
+    ]
+    lines = [segments for segments in lines if segments]
+    segment_count = sum(len(segments) for segments in lines)
+
+    features = HandwritingFeatures(
+        width=width,
+        height=height,
+        ink_ratio=float(ink.mean()),
+        lines=len(lines),
+        segments=segment_count,
+    )
+
+    if segment_count >= MIN_SEGMENTS:
+        heights = np.array(
+            [seg[3] - seg[2] for segments in lines for seg in segments],
+            dtype=np.float64,
+        )
+        letter_height = float(np.median(heights))
+
+        residuals = []
+        gaps = []
+        for segments in lines:
+            centres = np.array([(seg[0] + seg[1]) / 2 for seg in segments])
+            bottoms = np.array([seg[3] for seg in segments], dtype=np.float64)
+            if len(segments) >= 3:
+                slope, intercept = np.polyfit(centres, bottoms, 1)
+                residuals.extend(bottoms - (slope * centres + intercept))
+            gaps.extend(
+                segments[i + 1][0] - segments[i][1] for i in range(len(segments) - 1)
+            )
+
+        if residuals:
+            residuals = np.array(residuals)
+            # Median absolute deviation, so descenders do not dominate
+            mad = np.median(np.abs(residuals - np.median(residuals))) * 1.4826
+            features.baseline_deviation = float(mad / letter_height)
+
+        # Gaps under half a letter height are between letters of one word
+        gaps = np.array(gaps, dtype=np.float64)
+        word_gaps = gaps[gaps >= 0.5 * letter_height]
+        if word_gaps.size >= 3:
+            features.spacing_variation = float(word_gaps.std() / word_gaps.mean())
+
+        # Letters up to the median height are mostly x-height letters, so
+        # ascenders and descenders do not count as inconsistency
+        short = heights[heights <= letter_height]
+        features.size_variation = float(short.std() / short.mean())
+        features.measurable = True
+
+    features.baseline_instability = score(features.baseline_deviation, BASELINE_SCALE)
+    features.spacing_inconsistency = score(features.spacing_variation, SPACING_SCALE)
+    features.size_inconsistency = score(features.size_variation, SIZE_SCALE)
+    features.elapsed_ms = (time.perf_counter() - start_time) * 1000
+    return features
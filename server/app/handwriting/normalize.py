@@ -0,0 +1,189 @@
+"""
+Normalisation of handwriting images before they are sent to Gemini.
+
+Phone photos arrive at 12+ megapixels, most of it paper and all of it in
+colour. Each image is rotated upright from its EXIF orientation, cropped
+to the writing, converted to grayscale, scaled down to
+HANDWRITING_MAX_EDGE on its long side and re-encoded as JPEG. Upload
+bandwidth, provider latency and token cost then no longer grow with the
+camera's resolution.
+"""
+
+import asyncio
+import io
+import os
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+from ..ai.latency import LatencyHistogram
+from .features import find_runs
+
+
+class NormalizeConfig:
+    """Configuration for image normalisation - reads from environment dynamically"""
+
+    @staticmethod
+    def normalize_enabled():
+        return os.getenv("HANDWRITING_NORMALIZE", "1") != "0"
+
+    @staticmethod
+    def get_max_edge():
+        return int(os.getenv("HANDWRITING_MAX_EDGE", "1600"))
+
+    @staticmethod
+    def get_jpeg_quality():
+        return int(os.getenv("HANDWRITING_JPEG_QUALITY", "85"))
+
+    @staticmethod
+    def get_crop_margin():
+        # Paper kept around the writing, as a fraction of the page size
+        return float(os.getenv("HANDWRITING_CROP_MARGIN", "0.03"))
+
+
+class NormalizedImage(NamedTuple):
+    content: bytes
+    mime_type: str
+    original_bytes: int
+    elapsed_ms: float
+
+
+Box = Tuple[int, int, int, int]
+
+# Side of the copy the writing is located on
+DETECT_SIDE = 800
+
+ORIENTATION_TAG = 0x0112
+
+
+def _ink_extent(profile: np.ndarray, max_gap: int) -> Optional[Tuple[int, int]]:
+    """Span of the runs holding the ink, ignoring runs with only stray marks."""
+    runs = find_runs(profile > 0, max_gap=max_gap)
+    total = profile.sum()
+    runs = [
+        (start, end) for start, end in runs if profile[start:end].sum() >= 0.02 * total
+    ]
+    if not runs:
+        return None
+    return runs[0][0], runs[-1][1]
+
+
+def ink_bounding_box(image: Image.Image, margin: float) -> Box:
+    """(left, top, right, bottom) of the writing in a grayscale image, padded by `margin`."""
+    small = image.copy()
+    small.thumbnail((DETECT_SIDE, DETECT_SIDE))
+    gray = np.asarray(small, dtype=np.float64)
+
+    # Ink is much darker than the paper around it. Comparing with the local
+    # background rather than one global threshold keeps the desk, shadows
+    # and uneven lighting in a photo from being taken for writing
+    background = np.asarray(
+        small.filter(ImageFilter.BoxBlur(max(small.size) // 40)), dtype=np.float64
+    )
+    ink = gray < 0.75 * background
+    height, width = ink.shape
+
+    rows = _ink_extent(ink.sum(axis=1), max_gap=height // 50)
+    columns = _ink_extent(ink.sum(axis=0), max_gap=width // 50)
+    if rows is None or columns is None:
+        return 0, 0, image.width, image.height
+
+    scale_x, scale_y = image.width / width, image.height / height
+    pad_x, pad_y = margin * image.width, margin * image.height
+    return (
+        max(0, int(columns[0] * scale_x - pad_x)),
+        max(0, int(rows[0] * scale_y - pad_y)),
+        min(image.width, int(columns[1] * scale_x + pad_x)),
+        min(image.height, int(rows[1] * scale_y + pad_y)),
+    )
+
+
+def normalize_image(image_bytes: bytes) -> NormalizedImage:
+    start_time = time.perf_counter()
+    max_edge = NormalizeConfig.get_max_edge()
+
+    image = Image.open(io.BytesIO(image_bytes))
+    original_format = image.format
+    upright = image.getexif().get(ORIENTATION_TAG, 1) == 1
+    fits = max(image.size) <= max_edge
+    # JPEGs decode straight to a reduced size; keep up to twice the target
+    # so the writing still has enough resolution once the paper is cropped
+    image.draft("L", (2 * max_edge, 2 * max_edge))
+    image = ImageOps.exif_transpose(image).convert("L")
+
+    box = ink_bounding_box(image, NormalizeConfig.get_crop_margin())
+    cropped = box != (0, 0, image.width, image.height)
+    image = image.crop(box)
+    image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(
+        buffer, "JPEG", quality=NormalizeConfig.get_jpeg_quality(), optimize=True
+    )
+    content, mime_type = buffer.getvalue(), "image/jpeg"
+    if upright and fits and not cropped and len(content) >= len(image_bytes):
+        # Small, clean scans can compress better as they are. An image that
+        # was cropped or shrunk is sent as normalised whatever its size
+        content, mime_type = image_bytes, Image.MIME.get(original_format, mime_type)
+
+    return NormalizedImage(
+        content=content,
+        mime_type=mime_type,
+        original_bytes=len(image_bytes),
+        elapsed_ms=(time.perf_counter() - start_time) * 1000,
+    )
+
+
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, int] = {"images": 0, "bytes_in": 0, "bytes_out": 0, "failed": 0}
+_latency = LatencyHistogram()
+
+
+def _record(normalized: NormalizedImage) -> None:
+    with _metrics_lock:
+        _metrics["images"] += 1
+        _metrics["bytes_in"] += normalized.original_bytes
+        _metrics["bytes_out"] += len(normalized.content)
+    _latency.record(normalized.elapsed_ms / 1000)
+
+
+async def prepare_image(image_bytes: bytes) -> Tuple[bytes, str]:
+    """
+    Image bytes and MIME type to send to Gemini. Falls back to the upload
+    as-is if normalisation is disabled or fails.
+    """
+    if not NormalizeConfig.normalize_enabled():
+        return image_bytes, _mime_type(image_bytes)
+    try:
+        normalized = await asyncio.to_thread(normalize_image, image_bytes)
+    except Exception as e:
+        print(f"Image normalisation failed: {type(e).__name__}: {str(e)}")
+        with _metrics_lock:
+            _metrics["failed"] += 1
+        return image_bytes, _mime_type(image_bytes)
+
+    _record(normalized)
+    print(
+        f"Normalised image {normalized.original_bytes / 1024:.0f}KB -> "
+        f"{len(normalized.content) / 1024:.0f}KB in {normalized.elapsed_ms:.0f}ms"
+    )
+    return normalized.content, normalized.mime_type
+
+
+def _mime_type(image_bytes: bytes) -> str:
+    try:
+        image_format = Image.open(io.BytesIO(image_bytes)).format
+    except Exception:
+        image_format = None
+    return Image.MIME.get(image_format, "image/jpeg")
+
+
+def normalize_stats() -> Dict[str, Any]:
+    with _metrics_lock:
+        stats: Dict[str, Any] = dict(_metrics)
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    stats["latency"] = _latency.summary()
+    return stats
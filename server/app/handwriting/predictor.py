@@ -0,0 +1,269 @@
+"""
+Shared flow of the Gemini handwriting predictors.
+
+Each sample goes through the local pre-screen, then the result cache, then
+Gemini behind the provider quota and circuit breaker. Several samples can
+be sent to Gemini in one grouped request, or prepared for the provider's
+batch API. Subclasses supply the rubric: the generation config, the result
+type and, where the local measurements cover the rubric, the answer given
+for samples the pre-screen clears.
+"""
+
+import asyncio
+import time
+from typing import Generic, List, NamedTuple, Optional, Tuple, Type, TypeVar, Union
+
+from google.genai import types
+from pydantic import BaseModel, TypeAdapter
+
+from ..ai import (
+    GEMINI,
+    ContentDigest,
+    call_provider,
+    content_key,
+    get_registry,
+    get_result_cache,
+)
+from .features import HandwritingFeatures
+from .normalize import prepare_image
+from .prescreen import features_prompt, is_clearly_low_risk, record_outcome, screen
+
+R = TypeVar("R", bound=BaseModel)
+
+MODEL = "gemini-2.5-flash"
+
+
+class PendingSample(NamedTuple):
+    """A sample the pre-screen and the cache could not answer."""
+
+    index: int
+    # A ContentDigest once the batch API has the image
+    image_bytes: Union[bytes, ContentDigest]
+    notes: str
+    key: str
+
+
+def weighted_mean(values: List[float], weights: List[float]) -> float:
+    total = sum(weights)
+    if not total:
+        return sum(values) / len(values)
+    return sum(value * weight for value, weight in zip(values, weights)) / total
+
+
+class HandwritingPredictor(Generic[R]):
+    # Cache namespace and quota module name
+    NAMESPACE = "handwriting"
+    RESULT_TYPE: Type[R]
+
+    @property
+    def client(self):
+        # Shared client from the app-wide registry; raises if no API key
+        return get_registry().gemini().aio
+
+    def generate_config(
+        self, response_schema: Optional[type] = None
+    ) -> types.GenerateContentConfig:
+        """Config for one sample, or for a group when given list[RESULT_TYPE]."""
+        raise NotImplementedError
+
+    def local_result(self, features: HandwritingFeatures) -> Optional[R]:
+        """
+        Answer for a sample the pre-screen found clearly low-risk, or None
+        when the rubric scores something the local screen cannot measure.
+        """
+        return None
+
+    def screened_result(self, features: HandwritingFeatures) -> Optional[R]:
+        """The local answer when the pre-screen clears the sample, else None."""
+        local = self.local_result(features) if is_clearly_low_risk(features) else None
+        record_outcome(local is not None)
+        return local
+
+    def aggregate(self, results: List[R], weights: List[float]) -> R:
+        """One result for a document from the results of its tiles."""
+        raise NotImplementedError
+
+    def cache_key(self, image_bytes: bytes, notes: str) -> str:
+        return content_key(
+            self.NAMESPACE,
+            model=MODEL,
+            config=self.generate_config(),
+            image=image_bytes,
+            notes=notes,
+        )
+
+    async def predict(self, image_path: str) -> Optional[R]:
+        try:
+            with open(image_path, "rb") as f:
+                image_bytes = f.read()
+            return await self.predict_bytes(image_bytes)
+        except Exception as e:
+            print(f"Prediction error: {type(e).__name__}: {str(e)}")
+            return None
+
+    async def predict_bytes(self, image_bytes: bytes) -> Optional[R]:
+        # Clearly consistent writing is answered without calling Gemini
+        features = await screen(image_bytes)
+        local = self.screened_result(features)
+        if local is not None:
+            print(f"Answered by local pre-screen in {features.elapsed_ms:.0f}ms")
+            return local
+        return await self._escalate(image_bytes, features_prompt(features))
+
+    async def predict_bytes_safely(self, image_bytes: bytes) -> Optional[R]:
+        try:
+            return await self.predict_bytes(image_bytes)
+        except Exception as e:
+            print(f"Prediction error: {type(e).__name__}: {str(e)}")
+            return None
+
+    async def _escalate(self, image_bytes: bytes, notes: str) -> Optional[R]:
+        return await get_result_cache().get_or_compute_model(
+            self.cache_key(image_bytes, notes),
+            self.RESULT_TYPE,
+            lambda: call_provider(
+                GEMINI,
+                lambda: self._generate(image_bytes, notes),
+                model=MODEL,
+                module=self.NAMESPACE,
+            ),
+        )
+
+    async def triage(
+        self, images: List[bytes]
+    ) -> Tuple[List[Optional[R]], List[PendingSample]]:
+        """
+        Results the pre-screen and the cache can give for each sample, and
+        the samples that still need Gemini.
+        """
+        results: List[Optional[R]] = [None] * len(images)
+        pending: List[PendingSample] = []
+
+        features = await asyncio.gather(*(screen(image) for image in images))
+        for index, (image_bytes, sample) in enumerate(zip(images, features)):
+            local = self.screened_result(sample)
+            if local is not None:
+                results[index] = local
+                continue
+            notes = features_prompt(sample)
+            cached = await self.cached_result(image_bytes, notes)
+            if cached is not None:
+                results[index] = cached
+            else:
+                key = self.cache_key(image_bytes, notes)
+                pending.append(PendingSample(index, image_bytes, notes, key))
+        return results, pending
+
+    async def predict_many(self, images: List[bytes]) -> List[Optional[R]]:
+        """
+        Results for several samples, in order. Samples not answered by the
+        pre-screen or the cache go to Gemini together in one request; a
+        sample that fails comes back as None.
+        """
+        results, pending = await self.triage(images)
+
+        if len(pending) == 1:
+            grouped = [await self._escalate_safely(pending[0])]
+        elif pending:
+            try:
+                grouped = await call_provider(
+                    GEMINI,
+                    lambda: self._generate_group(pending),
+                    model=MODEL,
+                    module=self.NAMESPACE,
+                    cost=len(pending),
+                )
+                for sample, result in zip(pending, grouped):
+                    await self.cache_result(sample, result)
+            except Exception as e:
+                # One unreadable answer should not sink the group; retry singly
+                print(f"Grouped request failed, retrying singly: {str(e)}")
+                grouped = await asyncio.gather(
+                    *(self._escalate_safely(sample) for sample in pending)
+                )
+        else:
+            grouped = []
+
+        for sample, result in zip(pending, grouped):
+            results[sample.index] = result
+        return results
+
+    async def _escalate_safely(self, sample: PendingSample) -> Optional[R]:
+        try:
+            return await self._escalate(sample.image_bytes, sample.notes)
+        except Exception as e:
+            print(f"Prediction error: {type(e).__name__}: {str(e)}")
+            return None
+
+    async def cached_result(self, image_bytes: bytes, notes: str) -> Optional[R]:
+        cached = await get_result_cache().aget(self.cache_key(image_bytes, notes))
+        if cached is None:
+            return None
+        return self.RESULT_TYPE.model_validate(cached)
+
+    async def cache_result(self, sample: PendingSample, result: R) -> None:
+        # Stored under the single-sample key, so later requests hit it either way
+        await get_result_cache().aset(sample.key, result.model_dump(mode="json"))
+
+    async def contents(self, image_bytes: bytes, notes: str) -> list:
+        # Normalised image, with the local measurements as supporting evidence
+        data, mime_type = await prepare_image(image_bytes)
+        return [types.Part.from_bytes(data=data, mime_type=mime_type), notes]
+
+    def parse(self, text: Optional[str]) -> Optional[R]:
+        if not text:
+            print("Error: Empty response from Gemini API")
+            return None
+        try:
+            return self.RESULT_TYPE.model_validate_json(text)
+        except Exception as parse_error:
+            print(f"JSON parse error: {parse_error}")
+            print(f"Response text: {text}")
+            return None
+
+    async def _generate(self, image_bytes: bytes, notes: str) -> Optional[R]:
+        start_time = time.time()
+        response = await self.client.models.generate_content(
+            model=MODEL,
+            contents=await self.contents(image_bytes, notes),
+            config=self.generate_config(),
+        )
+        print(f"Response received in {time.time() - start_time:.2f}s")
+        return self.parse(response.text if response else None)
+
+    async def _generate_group(self, samples: List[PendingSample]) -> List[R]:
+        start_time = time.time()
+        contents = [
+            f"There are {len(samples)} separate handwriting samples below. Assess "
+            "each one independently and return a JSON array with exactly one "
+            "result per sample, in the order given."
+        ]
+        parts = await asyncio.gather(
+            *(self.contents(sample.image_bytes, sample.notes) for sample in samples)
+        )
+        for number, sample_parts in enumerate(parts, start=1):
+            contents += [f"Sample {number}:", *sample_parts]
+
+        response = await self.client.models.generate_content(
+            model=MODEL,
+            contents=contents,
+            config=self.generate_config(list[self.RESULT_TYPE]),
+        )
+        print(
+            f"Grouped response for {len(samples)} samples in {time.time() - start_time:.2f}s"
+        )
+
+        results = TypeAdapter(list[self.RESULT_TYPE]).validate_json(response.text)
+        if len(results) != len(samples):
+            raise ValueError(
+                f"Expected {len(samples)} results in grouped response, got {len(results)}"
+            )
+        return results
+
+    async def batch_request(self, sample: PendingSample) -> types.InlinedRequest:
+        """One sample as an inline request for the provider's batch API."""
+        return types.InlinedRequest(
+            model=MODEL,
+            contents=await self.contents(sample.image_bytes, sample.notes),
+            config=self.generate_config(),
+        )
@@ -0,0 +1,99 @@
+"""
+Local pre-screen in front of the Gemini handwriting predictors.
+
+A sample is answered locally only when all three factors could be measured
+and every one scores below HANDWRITING_LOW_RISK, and only by a rubric those
+factors cover: dysgraphia. Dyslexia also scores letter reversals and stroke
+corrections, which are not measured here, so it always goes to Gemini with
+the measurements attached to the request.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Dict, Optional
+
+from .features import HandwritingFeatures, extract_features
+
+
+class HandwritingConfig:
+    """Configuration for the local pre-screen - reads from environment dynamically"""
+
+    @staticmethod
+    def prescreen_enabled():
+        return os.getenv("HANDWRITING_PRESCREEN", "1") != "0"
+
+    @staticmethod
+    def get_low_risk_threshold():
+        return float(os.getenv("HANDWRITING_LOW_RISK", "0.25"))
+
+
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, int] = {"screened": 0, "answered_locally": 0, "escalated": 0}
+
+
+def _count(metric: str) -> None:
+    with _metrics_lock:
+        _metrics[metric] += 1
+
+
+def record_outcome(answered_locally: bool) -> None:
+    """Count a screened sample as answered locally or sent to Gemini."""
+    _count("answered_locally" if answered_locally else "escalated")
+
+
+async def screen(image_bytes: bytes) -> HandwritingFeatures:
+    """Measure a sample off the event loop."""
+    try:
+        features = await asyncio.to_thread(extract_features, image_bytes)
+    except Exception as e:
+        # Never block the Gemini path; an unmeasurable sample is escalated
+        print(f"Local handwriting screen failed: {type(e).__name__}: {str(e)}")
+        features = HandwritingFeatures(
+            width=0, height=0, ink_ratio=0.0, lines=0, segments=0
+        )
+    _count("screened")
+    return features
+
+
+def is_clearly_low_risk(features: HandwritingFeatures) -> bool:
+    """True when the measured factors are all clearly consistent."""
+    if not HandwritingConfig.prescreen_enabled():
+        return False
+    worst = max(
+        features.baseline_instability,
+        features.spacing_inconsistency,
+        features.size_inconsistency,
+    )
+    # A factor that could not be measured is unknown, not consistent
+    return (
+        features.fully_measured and worst < HandwritingConfig.get_low_risk_threshold()
+    )
+
+
+def _factor(raw: Optional[float], value: float) -> str:
+    # An unmeasured factor is reported as such, never as a consistent 0
+    if raw is None:
+        return "unavailable (too little writing to measure)"
+    return f"{value:.2f}"
+
+
+def features_prompt(features: HandwritingFeatures) -> str:
+    """Measurements passed to Gemini alongside an escalated image."""
+    if not features.measurable:
+        return (
+            "Local measurements: too little separable writing to measure "
+            f"({features.lines} lines, {features.segments} segments). "
+            "Judge from the image alone."
+        )
+    return f"""Local measurements of this sample (0 = consistent, 1 = strongly inconsistent):
+- Baseline instability: {_factor(features.baseline_deviation, features.baseline_instability)}
+- Spacing inconsistency: {_factor(features.spacing_variation, features.spacing_inconsistency)}
+- Letter size inconsistency: {_factor(features.size_variation, features.size_inconsistency)}
+Found {features.lines} text lines and {features.segments} letter or word segments.
+Use these as supporting evidence; the image remains the primary source."""
+
+
+def prescreen_stats() -> Dict[str, int]:
+    with _metrics_lock:
+        return dict(_metrics)
@@ -0,0 +1,232 @@
+"""
+Image-quality gate in front of the handwriting analyses.
+
+Photos that are too small, too dark, blank or out of focus cannot be
+assessed, and sending them to Gemini only costs a round trip and quota.
+This check runs locally and rejects them with an actionable message.
+
+Light writing on a dark page is assessed as its negative, taking the ink
+to be the minority class as the feature extraction does.
+
+Sharpness is the variance of the Laplacian around the writing, divided by
+the squared contrast between ink and paper, so it does not depend on
+lighting or on how much of the page is written on.
+"""
+
+import asyncio
+import io
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+from pydantic import BaseModel
+
+from .features import load_grayscale, otsu_threshold
+
+
+class QualityConfig:
+    """Thresholds for the quality gate - reads from environment dynamically"""
+
+    @staticmethod
+    def gate_enabled():
+        return os.getenv("HANDWRITING_QUALITY_GATE", "1") != "0"
+
+    @staticmethod
+    def get_min_side():
+        return int(os.getenv("HANDWRITING_MIN_SIDE", "200"))
+
+    @staticmethod
+    def get_min_sharpness():
+        return float(os.getenv("HANDWRITING_MIN_SHARPNESS", "0.015"))
+
+    @staticmethod
+    def get_min_brightness():
+        return float(os.getenv("HANDWRITING_MIN_BRIGHTNESS", "60"))
+
+    @staticmethod
+    def get_min_contrast():
+        return float(os.getenv("HANDWRITING_MIN_CONTRAST", "20"))
+
+    @staticmethod
+    def get_ink_coverage_range():
+        return (
+            float(os.getenv("HANDWRITING_MIN_INK", "0.002")),
+            float(os.getenv("HANDWRITING_MAX_INK", "0.35")),
+        )
+
+
+class QualityProblem(BaseModel):
+    code: str
+    message: str
+
+
+class QualityReport(BaseModel):
+    width: int = 0
+    height: int = 0
+    brightness: float = 0.0  # paper level, 0-255
+    contrast: float = 0.0  # paper minus ink level
+    ink_coverage: float = 0.0
+    sharpness: float = 0.0
+    problems: List[QualityProblem] = []
+    elapsed_ms: float = 0.0
+
+    @property
+    def passed(self) -> bool:
+        return not self.problems
+
+    def message(self) -> str:
+        return " ".join(problem.message for problem in self.problems)
+
+
+def _percentile(histogram: np.ndarray, q: float) -> float:
+    return float(np.searchsorted(np.cumsum(histogram), histogram.sum() * q / 100))
+
+
+def _laplacian(gray: np.ndarray) -> np.ndarray:
+    return (
+        gray[:-2, 1:-1]
+        + gray[2:, 1:-1]
+        + gray[1:-1, :-2]
+        + gray[1:-1, 2:]
+        - 4 * gray[1:-1, 1:-1]
+    )
+
+
+def _near(mask: np.ndarray) -> np.ndarray:
+    """`mask` grown by one pixel in each direction."""
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    return grown
+
+
+def check_quality(image_bytes: bytes) -> QualityReport:
+    start_time = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            width, height = image.size
+        gray = load_grayscale(image_bytes)
+    except Exception:
+        return QualityReport(
+            problems=[
+                QualityProblem(
+                    code="unreadable",
+                    message="The file could not be read as an image. Upload a JPEG or PNG photo.",
+                )
+            ],
+            elapsed_ms=(time.perf_counter() - start_time) * 1000,
+        )
+    return check_grayscale(gray, width, height, start_time)
+
+
+def check_grayscale(
+    gray: np.ndarray,
+    width: int,
+    height: int,
+    start_time: Optional[float] = None,
+) -> QualityReport:
+    """
+    Quality of an already decoded page; `gray` may be scaled down, `width`
+    and `height` are the page's full size.
+    """
+    start_time = start_time or time.perf_counter()
+    report = QualityReport(width=width, height=height)
+    problems = report.problems
+
+    min_side = QualityConfig.get_min_side()
+    # On the longer side: a cropped line of writing is a short, wide strip
+    if max(report.width, report.height) < min_side:
+        problems.append(
+            QualityProblem(
+                code="too_small",
+                message=(
+                    f"The image is only {report.width}x{report.height} pixels. "
+                    f"Upload a photo at least {min_side} pixels across."
+                ),
+            )
+        )
+
+    if (gray <= otsu_threshold(gray)).mean() > 0.5:
+        gray = 255 - gray
+
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    report.brightness = _percentile(histogram, 90)
+    report.contrast = report.brightness - _percentile(histogram, 0.5)
+    ink = gray < report.brightness - report.contrast / 2
+    report.ink_coverage = float(ink.mean())
+
+    if report.brightness < QualityConfig.get_min_brightness():
+        problems.append(
+            QualityProblem(
+                code="too_dark",
+                message="The photo is too dark. Retake it in better light or with the flash on.",
+            )
+        )
+
+    min_ink, max_ink = QualityConfig.get_ink_coverage_range()
+    if (
+        report.contrast < QualityConfig.get_min_contrast()
+        or report.ink_coverage < min_ink
+    ):
+        problems.append(
+            QualityProblem(
+                code="no_writing",
+                message=(
+                    "No clear writing was found. Check the page is not blank, faint "
+                    "or washed out by glare, and that the writing fills most of the photo."
+                ),
+            )
+        )
+    elif report.ink_coverage > max_ink:
+        problems.append(
+            QualityProblem(
+                code="too_much_dark_area",
+                message=(
+                    "Most of the image is dark. Crop the photo to the page and avoid "
+                    "shadows across the writing."
+                ),
+            )
+        )
+    else:
+        laplacian = _laplacian(gray.astype(np.float32))
+        around_ink = _near(_near(ink))[1:-1, 1:-1]
+        report.sharpness = float(laplacian[around_ink].var() / report.contrast**2)
+        if report.sharpness < QualityConfig.get_min_sharpness():
+            problems.append(
+                QualityProblem(
+                    code="blurry",
+                    message=(
+                        "The photo is blurry. Hold the camera steady, let it focus on "
+                        "the writing and retake it."
+                    ),
+                )
+            )
+
+    report.elapsed_ms = (time.perf_counter() - start_time) * 1000
+    return report
+
+
+async def assess_quality(image_bytes: bytes) -> Optional[QualityReport]:
+    """Quality report for an upload, or None when the gate is turned off."""
+    if not QualityConfig.gate_enabled():
+        return None
+    report = await asyncio.to_thread(check_quality, image_bytes)
+    if not report.passed:
+        print(
+            f"Quality gate rejected upload in {report.elapsed_ms:.0f}ms: "
+            f"{', '.join(problem.code for problem in report.problems)}"
+        )
+    return report
+
+
+def rejection(report: QualityReport) -> Dict[str, Any]:
+    """Body of the 422 returned for an upload that failed the gate."""
+    return {
+        "error": report.message(),
+        "problems": [problem.model_dump() for problem in report.problems],
+        "quality": report.model_dump(exclude={"problems"}),
+    }
@@ -0,0 +1,73 @@
+"""
+Shared outbound HTTP client.
+
+One pooled httpx.AsyncClient is opened with the AI registry in the FastAPI
+lifespan and reused by every external API call, so connections to providers
+stay alive between requests instead of paying a TCP+TLS handshake each time.
+"""
+
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+
+
+class HTTPClientConfig:
+    """Connection-pool settings - reads from environment dynamically"""
+
+    @staticmethod
+    def get_max_connections() -> int:
+        return int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+
+    @staticmethod
+    def get_max_keepalive_connections() -> int:
+        return int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+    @staticmethod
+    def get_keepalive_expiry() -> float:
+        return float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+    @staticmethod
+    def get_timeout() -> float:
+        return float(os.getenv("HTTP_TIMEOUT", "10"))
+
+    @staticmethod
+    def http2_enabled() -> bool:
+        # HTTP/2 needs the optional h2 package (httpx[http2])
+        if os.getenv("HTTP_HTTP2", "1") == "0":
+            return False
+        return importlib.util.find_spec("h2") is not None
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTPClientConfig.http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=HTTPClientConfig.get_max_connections(),
+            max_keepalive_connections=HTTPClientConfig.get_max_keepalive_connections(),
+            keepalive_expiry=HTTPClientConfig.get_keepalive_expiry(),
+        ),
+        timeout=HTTPClientConfig.get_timeout(),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    The shared client. Created on first use when the app lifespan has not
+    run, e.g. in scripts.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,25 @@
+from .config import JobQueueConfig
+from .queue import (
+    BATCH,
+    INTERACTIVE,
+    JobQueue,
+    JobStatus,
+    QueueFullError,
+    get_job_queue,
+    job_handler,
+)
+from .routes import router
+from .store import JobStore
+
+__all__ = [
+    "JobQueueConfig",
+    "BATCH",
+    "INTERACTIVE",
+    "JobQueue",
+    "JobStatus",
+    "QueueFullError",
+    "get_job_queue",
+    "job_handler",
+    "router",
+    "JobStore",
+]
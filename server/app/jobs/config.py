@@ -0,0 +1,44 @@
+import os
+
+
+class JobQueueConfig:
+    """Configuration for the analysis job queue - reads from environment dynamically"""
+
+    @staticmethod
+    def get_db_path():
+        return os.getenv("JOB_DB_PATH", "data/jobs.sqlite3")
+
+    @staticmethod
+    def get_workers():
+        return int(os.getenv("JOB_WORKERS", "8"))
+
+    @staticmethod
+    def get_provider_concurrency(provider: str):
+        # e.g. JOB_CONCURRENCY_GEMINI, JOB_CONCURRENCY_GROQ
+        return int(os.getenv(f"JOB_CONCURRENCY_{provider.upper()}", "4"))
+
+    @staticmethod
+    def get_max_queued():
+        return int(os.getenv("JOB_MAX_QUEUED", "1000"))
+
+    @staticmethod
+    def get_max_attempts():
+        return int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+    @staticmethod
+    def get_retry_delay():
+        return float(os.getenv("JOB_RETRY_DELAY", "2"))
+
+    @staticmethod
+    def get_lease():
+        # A running job is recovered when its worker stops renewing for this long
+        return float(os.getenv("JOB_LEASE", "60"))
+
+    @staticmethod
+    def get_watch_poll():
+        # How often a watcher re-reads a job another worker may be running
+        return float(os.getenv("JOB_WATCH_POLL", "5"))
+
+    @staticmethod
+    def get_result_ttl():
+        return float(os.getenv("JOB_RESULT_TTL", "86400"))
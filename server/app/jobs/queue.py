@@ -0,0 +1,478 @@
+"""
+Asynchronous analysis jobs.
+
+LLM-backed endpoints can be submitted as jobs instead of holding the HTTP
+connection for the whole provider call. Jobs are persisted in a local
+SQLite table, wait in one priority lane per provider, and are run by a
+bounded pool of asyncio workers: each provider gets as many workers as
+its concurrency cap, and JOB_WORKERS bounds them all together. Jobs
+rejected by an open circuit breaker or a provider failure (timeout, 429,
+5xx) are retried later instead of failing the burst.
+
+Worker processes may share the table. A job runs only where it was
+claimed, and a running job is taken over only once the lease of the
+process that claimed it has expired. Live workers also re-scan the table
+for queued jobs, so work submitted to a process that stopped is picked up
+without waiting for a restart.
+"""
+
+import asyncio
+import itertools
+import os
+import socket
+import time
+import uuid
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from ..ai import BATCH, INTERACTIVE, is_retryable, request_priority, retry_after
+from .config import JobQueueConfig
+from .store import (
+    FAILED,
+    FINISHED,
+    QUEUED,
+    SUCCEEDED,
+    JobStore,
+)
+
+# Lower runs first
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+# handler(params, uploaded file content) -> JSON-serialisable result
+JobFunction = Callable[[Any, Optional[bytes]], Awaitable[Any]]
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    priority: str
+    position: Optional[int] = None  # jobs ahead in the lane while queued
+    attempts: int = 0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class JobHandler:
+    def __init__(
+        self,
+        kind: str,
+        provider: str,
+        run: JobFunction,
+        model: Optional[Type[BaseModel]] = None,
+        upload: bool = False,
+    ):
+        self.kind = kind
+        self.provider = provider
+        self.run = run
+        self.model = model  # validates JSON params at submit time
+        self.upload = upload  # takes a multipart `file` instead of JSON
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self):
+        # Identifies this process's claims in a table shared between workers
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self.store: Optional[JobStore] = None
+        self._lanes: Dict[str, asyncio.PriorityQueue] = {}
+        self._order: Dict[str, Tuple[str, int, int]] = {}  # queued job -> lane key
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+        self._workers: List[asyncio.Task] = []
+        self._recovery: Optional[asyncio.Task] = None
+        self._retries: Dict[str, asyncio.TimerHandle] = {}  # jobs waiting to retry
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._sequence = itertools.count()
+        self._last_purge = 0.0
+        self.metrics: Dict[str, int] = {
+            "submitted": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retried": 0,
+            "rejected": 0,
+        }
+
+    def register(self, handler: JobHandler) -> None:
+        self.handlers[handler.kind] = handler
+
+    def handler(
+        self,
+        kind: str,
+        provider: str,
+        model: Optional[Type[BaseModel]] = None,
+        upload: bool = False,
+    ) -> Callable[[JobFunction], JobFunction]:
+        """Decorator registering an async function as the handler for `kind`."""
+
+        def decorator(run: JobFunction) -> JobFunction:
+            self.register(JobHandler(kind, provider, run, model, upload))
+            return run
+
+        return decorator
+
+    # Lifecycle
+
+    async def start(self, store: Optional[JobStore] = None) -> None:
+        self.store = store or await asyncio.to_thread(
+            JobStore, JobQueueConfig.get_db_path()
+        )
+        self._slots = asyncio.Semaphore(JobQueueConfig.get_workers())
+        await self._purge()
+
+        # Re-queue what was waiting, or interrupted, when a process stopped.
+        # Jobs still held by a live worker's lease are left to it.
+        await asyncio.to_thread(self.store.recover_expired, time.time())
+        for job in await asyncio.to_thread(self.store.queued):
+            await self._enqueue_job(job)
+
+        for provider in {handler.provider for handler in self.handlers.values()}:
+            for _ in range(JobQueueConfig.get_provider_concurrency(provider)):
+                self._workers.append(asyncio.create_task(self._work(provider)))
+        self._recovery = asyncio.create_task(self._recover_forever())
+
+    async def close(self) -> None:
+        for retry in self._retries.values():
+            retry.cancel()
+        self._retries = {}
+        tasks = [*self._workers, *([self._recovery] if self._recovery else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._recovery = None
+        self._lanes = {}
+        self._order = {}
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    # Submitting and inspecting jobs
+
+    async def submit(
+        self,
+        kind: str,
+        params: Any,
+        content: Optional[bytes] = None,
+        priority: str = INTERACTIVE,
+    ) -> JobStatus:
+        if len(self._order) >= JobQueueConfig.get_max_queued():
+            self.metrics["rejected"] += 1
+            raise QueueFullError("Job queue is full, try again shortly")
+
+        job_id = str(uuid.uuid4())
+        await asyncio.to_thread(
+            self.store.insert,
+            job_id,
+            kind,
+            PRIORITIES[priority],
+            jsonable_encoder(params),
+            content,
+        )
+        self._enqueue(job_id, kind, PRIORITIES[priority])
+        self.metrics["submitted"] += 1
+        return await self.status(job_id)
+
+    async def status(self, job_id: str) -> Optional[JobStatus]:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return None
+        return JobStatus(
+            job_id=job_id,
+            kind=job["kind"],
+            status=job["status"],
+            priority=self._priority_name(job["priority"]),
+            position=self._position(job_id),
+            attempts=job["attempts"],
+            result=job["result"],
+            error=job["error"],
+            created_at=job["created_at"],
+            started_at=job["started_at"],
+            finished_at=job["finished_at"],
+        )
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet, on any worker."""
+        if not await asyncio.to_thread(self.store.cancel, job_id):
+            return False
+        self._order.pop(job_id, None)
+        retry = self._retries.pop(job_id, None)
+        if retry is not None:
+            retry.cancel()
+        await self._notify(job_id)
+        return True
+
+    async def watch(self, job_id: str) -> AsyncIterator[JobStatus]:
+        """Current status of a job, then every change until it finishes."""
+        updates: asyncio.Queue = asyncio.Queue()
+        self._watchers.setdefault(job_id, set()).add(updates)
+        try:
+            status = await self.status(job_id)
+            while status is not None:
+                yield status
+                if status.status in FINISHED:
+                    break
+                status = await self._next_status(job_id, status, updates)
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(updates)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        depth: Dict[str, Dict[str, int]] = {}
+        for provider, _, priority in self._order.values():
+            lane = depth.setdefault(provider, {name: 0 for name in PRIORITIES})
+            lane[self._priority_name(priority)] += 1
+        return {
+            **self.metrics,
+            "queued": len(self._order),
+            "queue_depth": depth,
+            "workers": len(self._workers),
+        }
+
+    # Internals
+
+    @staticmethod
+    def _priority_name(priority: int) -> str:
+        for name, value in PRIORITIES.items():
+            if value == priority:
+                return name
+        return BATCH
+
+    def _lane(self, provider: str) -> asyncio.PriorityQueue:
+        if provider not in self._lanes:
+            self._lanes[provider] = asyncio.PriorityQueue()
+        return self._lanes[provider]
+
+    def _enqueue(self, job_id: str, kind: str, priority: int) -> None:
+        provider = self.handlers[kind].provider
+        sequence = next(self._sequence)
+        self._order[job_id] = (provider, sequence, priority)
+        self._lane(provider).put_nowait((priority, sequence, job_id))
+
+    async def _enqueue_job(self, job: Dict[str, Any]) -> None:
+        if job["kind"] not in self.handlers:
+            await self._finish(
+                job["job_id"], FAILED, error=f"Unknown job kind: {job['kind']}"
+            )
+            return
+        self._enqueue(job["job_id"], job["kind"], job["priority"])
+
+    def _position(self, job_id: str) -> Optional[int]:
+        if job_id not in self._order:
+            return None
+        provider, sequence, priority = self._order[job_id]
+        return sum(
+            1
+            for other_provider, other_sequence, other_priority in self._order.values()
+            if other_provider == provider
+            and (other_priority, other_sequence) < (priority, sequence)
+        )
+
+    async def _notify(self, job_id: str) -> None:
+        watchers = self._watchers.get(job_id)
+        if not watchers:
+            return
+        status = await self.status(job_id)
+        for updates in watchers:
+            updates.put_nowait(status)
+
+    async def _next_status(
+        self, job_id: str, previous: JobStatus, updates: asyncio.Queue
+    ) -> Optional[JobStatus]:
+        # Only this process's changes are notified; a job run by another
+        # worker sharing the table is seen by re-reading it
+        while True:
+            try:
+                return await asyncio.wait_for(
+                    updates.get(), JobQueueConfig.get_watch_poll()
+                )
+            except asyncio.TimeoutError:
+                status = await self.status(job_id)
+                if status != previous:
+                    return status
+
+    async def _finish(
+        self, job_id: str, status: str, owner: Optional[str] = None, **fields: Any
+    ) -> None:
+        updated = await asyncio.to_thread(
+            self.store.update,
+            job_id,
+            owner,
+            status=status,
+            finished_at=time.time(),
+            **fields,
+        )
+        if not updated:
+            # The lease ran out and another worker took the job over
+            print(f"Job {job_id} was taken over; dropping this run's {status}")
+        await self._notify(job_id)
+        await self._purge()
+
+    async def _purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        await asyncio.to_thread(
+            self.store.purge_finished, now - JobQueueConfig.get_result_ttl()
+        )
+
+    async def _recover_forever(self) -> None:
+        # Take over jobs left running by a worker that stopped renewing them,
+        # and queued jobs only a stopped worker held in its lanes. A job
+        # queued in more than one process still runs once: the claim is atomic.
+        while True:
+            await asyncio.sleep(JobQueueConfig.get_lease())
+            try:
+                jobs = await asyncio.to_thread(self.store.recover_expired, time.time())
+                for job in jobs:
+                    print(f"Job {job['job_id']} lease expired, re-queued")
+                    await self._enqueue_job(job)
+                held = self._order.keys() | self._retries.keys()
+                for job in await asyncio.to_thread(self.store.queued):
+                    if job["job_id"] not in held:
+                        await self._enqueue_job(job)
+            except Exception as e:
+                print(f"Job recovery error: {type(e).__name__}: {str(e)}")
+
+    async def _heartbeat(self, job_id: str, lease: float) -> None:
+        while True:
+            await asyncio.sleep(lease / 3)
+            if not await asyncio.to_thread(self.store.renew, job_id, self.owner, lease):
+                print(f"Job {job_id} lease lost")
+                return
+
+    async def _work(self, provider: str) -> None:
+        lane = self._lane(provider)
+        while True:
+            _, _, job_id = await lane.get()
+            # Cancelled while it was waiting
+            if self._order.pop(job_id, None) is None:
+                continue
+            async with self._slots:
+                try:
+                    await self._run(job_id)
+                except Exception as e:
+                    # Keep the worker alive whatever happened to this job
+                    print(f"Job worker error on {job_id}: {type(e).__name__}: {str(e)}")
+
+    async def _run(self, job_id: str) -> None:
+        lease = JobQueueConfig.get_lease()
+        job = await asyncio.to_thread(self.store.claim, job_id, self.owner, lease)
+        if job is None:
+            # Cancelled, or claimed by another worker sharing the table
+            return
+        handler = self.handlers[job["kind"]]
+        attempts = job["attempts"]
+        await self._notify(job_id)
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, lease))
+        try:
+            params = job["params"]
+            if handler.model is not None:
+                params = handler.model.model_validate(params)
+            content = (
+                await asyncio.to_thread(self.store.content, job_id)
+                if handler.upload
+                else None
+            )
+            # Provider quota serves interactive work before batch jobs
+            priority = request_priority.set(self._priority_name(job["priority"]))
+            try:
+                result = await handler.run(params, content)
+            finally:
+                request_priority.reset(priority)
+        except asyncio.CancelledError:
+            # Shutting down; hand the job back so the next start runs it
+            # straight away instead of waiting for the lease to expire
+            self.store.update(job_id, self.owner, status=QUEUED, started_at=None)
+            raise
+        except Exception as e:
+            if is_retryable(e) and attempts < JobQueueConfig.get_max_attempts():
+                await self._retry(job_id, job["kind"], job["priority"], e)
+                return
+            await self._fail(job_id, e)
+        else:
+            self.metrics["succeeded"] += 1
+            await self._finish(
+                job_id,
+                SUCCEEDED,
+                self.owner,
+                result=jsonable_encoder(result),
+                error=None,
+            )
+        finally:
+            heartbeat.cancel()
+
+    async def _fail(self, job_id: str, error: Exception) -> None:
+        print(f"Job {job_id} failed: {type(error).__name__}: {str(error)}")
+        self.metrics["failed"] += 1
+        # HTTPException raised by a reused route handler carries its message in detail
+        await self._finish(
+            job_id, FAILED, self.owner, error=str(getattr(error, "detail", error))
+        )
+
+    async def _retry(
+        self, job_id: str, kind: str, priority: int, error: Exception
+    ) -> None:
+        delay = retry_after(error) or JobQueueConfig.get_retry_delay()
+        print(f"Job {job_id} deferred {delay:.1f}s: {str(error)}")
+        self.metrics["retried"] += 1
+        # Other workers re-scanning the table leave the job until then
+        await asyncio.to_thread(
+            self.store.update,
+            job_id,
+            self.owner,
+            status=QUEUED,
+            started_at=None,
+            not_before=time.time() + delay,
+            error=str(error),
+        )
+        await self._notify(job_id)
+        retry = asyncio.get_running_loop().call_later(
+            delay, self._requeue, job_id, kind, priority
+        )
+        self._retries[job_id] = retry
+
+    def _requeue(self, job_id: str, kind: str, priority: int) -> None:
+        del self._retries[job_id]
+        self._enqueue(job_id, kind, priority)
+
+
+_job_queue = JobQueue()
+
+
+def get_job_queue() -> JobQueue:
+    return _job_queue
+
+
+def job_handler(
+    kind: str,
+    provider: str,
+    model: Optional[Type[BaseModel]] = None,
+    upload: bool = False,
+) -> Callable[[JobFunction], JobFunction]:
+    """Register an async function as the handler for jobs of `kind`."""
+    return _job_queue.handler(kind, provider, model, upload)
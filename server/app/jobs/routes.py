@@ -0,0 +1,107 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from starlette.datastructures import UploadFile
+
+from ..sse import sse_event, sse_response
+from ..uploads import UploadTooLargeError, read_upload
+from .queue import INTERACTIVE, PRIORITIES, JobStatus, QueueFullError, get_job_queue
+
+router = APIRouter()
+
+
+@router.get("/")
+async def list_job_kinds():
+    """Job kinds that can be submitted, and current queue depth"""
+    queue = get_job_queue()
+    return {
+        "kinds": {
+            kind: {"provider": handler.provider, "upload": handler.upload}
+            for kind, handler in queue.handlers.items()
+        },
+        "stats": queue.stats(),
+    }
+
+
+@router.post("/{kind}", response_model=JobStatus, status_code=202)
+async def submit_job(kind: str, request: Request, priority: str = INTERACTIVE):
+    """
+    Queue an analysis and return its job id straight away.
+    The body is what the matching synchronous endpoint takes: JSON, or a
+    multipart `file` for image analyses. Poll GET /api/jobs/{job_id} or
+    subscribe to GET /api/jobs/{job_id}/events for the result.
+    """
+    queue = get_job_queue()
+    handler = queue.handlers.get(kind)
+    if handler is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind: {kind}")
+    if priority not in PRIORITIES:
+        raise HTTPException(
+            status_code=422, detail=f"priority must be one of {list(PRIORITIES)}"
+        )
+
+    content = None
+    if handler.upload:
+        form = await request.form()
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(status_code=422, detail="Expected a multipart 'file'")
+        try:
+            content = await read_upload(upload)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        if not content:
+            raise HTTPException(status_code=400, detail="Empty file received")
+        params = {"filename": upload.filename, "content_type": upload.content_type}
+    else:
+        try:
+            params = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Expected a JSON body")
+        if handler.model is not None:
+            try:
+                params = handler.model.model_validate(params)
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=e.errors())
+
+    try:
+        return await queue.submit(kind, params, content, priority)
+    except QueueFullError as e:
+        return JSONResponse(
+            status_code=503, content={"detail": str(e)}, headers={"Retry-After": "5"}
+        )
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    status = await get_job_queue().status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: a `status` event on every change until the job finishes"""
+    queue = get_job_queue()
+    if await queue.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for status in queue.watch(job_id):
+            yield sse_event("status", status.model_dump(mode="json"))
+
+    return sse_response(events())
+
+
+@router.delete("/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    """Cancel a job that has not started running"""
+    queue = get_job_queue()
+    if await queue.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not await queue.cancel(job_id):
+        raise HTTPException(
+            status_code=409, detail="Job is already running or finished"
+        )
+    return await queue.status(job_id)
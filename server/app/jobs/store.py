@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+COLUMNS = (
+    "job_id",
+    "kind",
+    "priority",
+    "status",
+    "params",
+    "result",
+    "error",
+    "attempts",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "owner",
+    "lease_until",
+    "not_before",
+)
+
+
+class JobStore:
+    """
+    SQLite-backed job table, so queued work survives a restart.
+
+    Uploaded files are kept alongside their job until it finishes; params
+    and results are stored as JSON. Several processes can share one table:
+    a worker claims a queued job atomically and holds it under a lease it
+    renews while the job runs, so only jobs whose owner stopped renewing
+    are ever recovered.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        priority INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        params TEXT NOT NULL,
+        content BLOB,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        owner TEXT,
+        lease_until REAL,
+        not_before REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority, created_at);
+    """
+
+    # Columns added after the first release, for tables created before them
+    ADDED_COLUMNS = {"owner": "TEXT", "lease_until": "REAL", "not_before": "REAL"}
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, kind in self.ADDED_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    @staticmethod
+    def _row(row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip(COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def insert(
+        self,
+        job_id: str,
+        kind: str,
+        priority: int,
+        params: Dict[str, Any],
+        content: Optional[bytes] = None,
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, priority, status, params, content, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    priority,
+                    QUEUED,
+                    json.dumps(params),
+                    content,
+                    time.time(),
+                ),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def content(self, job_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def queued(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Jobs waiting to run, in the order they should run. Jobs deferred for
+        a retry are left out until `now` reaches the time they were put off to.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE status = ? "
+                "AND (not_before IS NULL OR not_before <= ?) "
+                "ORDER BY priority, created_at",
+                (QUEUED, now),
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def recover_expired(self, now: float) -> List[Dict[str, Any]]:
+        """
+        Re-queue running jobs whose lease ran out, i.e. whose worker died,
+        and return them. Jobs still renewed by a live worker are left alone.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A NULL lease is a job interrupted before leases existed
+                condition = "status = ? AND (lease_until IS NULL OR lease_until < ?)"
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE {condition} "
+                    "ORDER BY priority, created_at",
+                    (RUNNING, now),
+                ).fetchall()
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, "
+                    f"started_at = NULL WHERE {condition}",
+                    (QUEUED, RUNNING, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        jobs = [self._row(row) for row in rows]
+        for job in jobs:
+            job.update(status=QUEUED, owner=None, lease_until=None, started_at=None)
+        return jobs
+
+    def claim(self, job_id: str, owner: str, lease: float) -> Optional[Dict[str, Any]]:
+        """
+        Atomically move a queued job to running under `owner`, holding it for
+        `lease` seconds. Returns the claimed job, or None when another worker
+        claimed it first or it is no longer queued.
+        """
+        now = time.time()
+        with self._lock:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, "
+                "attempts = attempts + 1, started_at = ? "
+                "WHERE job_id = ? AND status = ?",
+                (RUNNING, owner, now + lease, now, job_id, QUEUED),
+            ).rowcount
+        return self.get(job_id) if claimed else None
+
+    def renew(self, job_id: str, owner: str, lease: float) -> bool:
+        """Extend the lease on a running job; False if `owner` lost it."""
+        with self._lock:
+            return bool(
+                self._conn.execute(
+                    "UPDATE jobs SET lease_until = ? "
+                    "WHERE job_id = ? AND owner = ? AND status = ?",
+                    (time.time() + lease, job_id, owner, RUNNING),
+                ).rowcount
+            )
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that is still queued; False once it was claimed."""
+        with self._lock:
+            return bool(
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, content = NULL "
+                    "WHERE job_id = ? AND status = ?",
+                    (CANCELLED, time.time(), job_id, QUEUED),
+                ).rowcount
+            )
+
+    def update(self, job_id: str, owner: Optional[str] = None, **fields: Any) -> bool:
+        """
+        Set fields on a job. With `owner`, only while that worker still holds
+        the job, so a worker whose lease expired cannot overwrite the run
+        that replaced it. Returns whether the row was updated.
+        """
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        if fields.get("status") in FINISHED:
+            # Uploads are only needed until the job has run
+            fields["content"] = None
+        if fields.get("status") in (QUEUED, *FINISHED):
+            fields.update(owner=None, lease_until=None)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        condition, values = "job_id = ?", [job_id]
+        if owner is not None:
+            condition += " AND owner = ? AND status = ?"
+            values += [owner, RUNNING]
+        with self._lock:
+            return bool(
+                self._conn.execute(
+                    f"UPDATE jobs SET {assignments} WHERE {condition}",
+                    (*fields.values(), *values),
+                ).rowcount
+            )
+
+    def purge_finished(self, before: float) -> int:
+        """Delete finished jobs older than `before`; returns the count."""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?",
+                (*FINISHED, before),
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 
 import dotenv
 from fastapi import FastAPI
@@ -7,20 +8,41 @@ from fastapi.staticfiles import StaticFiles
 
 dotenv.load_dotenv()
 
+from .ai import get_quota_scheduler, get_registry, get_result_cache
+from .handwriting import normalize_stats, prescreen_stats
+from .jobs import get_job_queue
+from .jobs import router as jobs_router
 from .routers.adhd import router as adhd_router
 from .routers.dyscalculia import router as dyscalculia_router
 from .routers.dysgraphia import router as dysgraphia_router
 from .routers.dyslexia import router as dyslexia_router
+from .routers.handwriting import router as handwriting_router
 from .routers.quiz import router as quiz_router
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared AI clients for every router, warmed before traffic
+    registry = get_registry()
+    await registry.start()
+    # Analysis jobs queued before a restart resume here
+    job_queue = get_job_queue()
+    await job_queue.start()
+    yield
+    await job_queue.close()
+    await registry.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Include routers
 app.include_router(adhd_router, prefix="/api/adhd", tags=["adhd"])
 app.include_router(dysgraphia_router, prefix="/api/dysgraphia", tags=["dysgraphia"])
 app.include_router(dyslexia_router, prefix="/api/dyslexia", tags=["dyslexia"])
+app.include_router(handwriting_router, prefix="/api/handwriting", tags=["handwriting"])
 app.include_router(dyscalculia_router, prefix="/api/dyscalculia", tags=["dyscalculia"])
 app.include_router(quiz_router, prefix="/api/quiz", tags=["quiz"])
+app.include_router(jobs_router, prefix="/api/jobs", tags=["jobs"])
 
 if os.path.exists("dist/assets"):
     app.mount("/assets", StaticFiles(directory="dist/assets"), name="assets")
@@ -28,7 +50,15 @@ if os.path.exists("dist/assets"):
 
 @app.get("/api/health")
 async def health():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "ai_providers": get_registry().health(),
+        "ai_cache": get_result_cache().stats(),
+        "ai_quota": get_quota_scheduler().stats(),
+        "jobs": get_job_queue().stats(),
+        "handwriting_prescreen": prescreen_stats(),
+        "handwriting_normalize": normalize_stats(),
+    }
 
 
 @app.get("/{path:path}")
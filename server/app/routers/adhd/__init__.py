@@ -1,19 +1,25 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
+from contextlib import aclosing
+import time
 import numpy as np
-import os
-from google import genai
 from google.genai import types
 
+from ...ai import (
+    GEMINI,
+    call_provider,
+    content_key,
+    get_registry,
+    get_result_cache,
+    stream_provider,
+)
+from ...jobs import job_handler
+from ...sse import sse_event, sse_response
+
 router = APIRouter(tags=["adhd"])
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    client = genai.Client(api_key=GEMINI_API_KEY)
-else:
-    client = None
+UNAVAILABLE_HTML = "<p><strong>⚠️ AI Analysis Unavailable</strong></p><p>Please set the GEMINI_API_KEY environment variable to enable AI-powered insights.</p>"
 
 class SARTData(BaseModel):
     reactionTimes: List[float]
@@ -62,6 +68,35 @@ async def finalize_assessment(data: AssessmentData):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@job_handler("adhd.finalize-assessment", GEMINI, model=AssessmentData)
+async def finalize_assessment_job(data: AssessmentData, _: Optional[bytes]) -> dict:
+    """Queued variant of /finalize-assessment, run by the job queue"""
+    metrics = calculate_metrics(data)
+    # Unlike the route, provider errors propagate so the queue can retry them
+    analysis = await request_ai_analysis(metrics)
+    if not analysis:
+        raise RuntimeError("Empty response from Gemini")
+    return AssessmentResponse(metrics=metrics, analysis=analysis).model_dump()
+
+@router.post("/finalize-assessment/stream")
+async def finalize_assessment_stream(data: AssessmentData):
+    """
+    Streaming variant of /finalize-assessment over Server-Sent Events.
+    Sends `metrics` immediately, then `analysis` HTML chunks as they are
+    generated, then `done` with the complete analysis (or `error`).
+    """
+    try:
+        metrics = calculate_metrics(data)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+    async def events():
+        yield sse_event("metrics", metrics)
+        async for event, payload in stream_ai_analysis(metrics):
+            yield sse_event(event, payload)
+
+    return sse_response(events())
+
 def calculate_metrics(data: AssessmentData) -> dict:
     """Calculate statistical metrics from test data"""
     
@@ -123,13 +158,110 @@ def calculate_metrics(data: AssessmentData) -> dict:
 
 async def generate_ai_analysis(metrics: dict, data: AssessmentData) -> str:
     """Generate AI-powered cognitive analysis using Gemini"""
-    
-    if not GEMINI_API_KEY:
-        return "<p><strong>⚠️ AI Analysis Unavailable</strong></p><p>Please set the GEMINI_API_KEY environment variable to enable AI-powered insights.</p>"
-    
     try:
-        # Prepare prompt with metrics
-        prompt = f"""You are a Neuro-Cognitive Analyst specializing in ADHD assessment interpretation.
+        return await request_ai_analysis(metrics) or ""
+    except Exception as e:
+        print(f"Gemini API Error: {e}")
+        return error_html(e)
+
+
+async def request_ai_analysis(metrics: dict) -> Optional[str]:
+    """
+    Analysis HTML from Gemini, or None for an empty answer. Provider errors
+    are raised, not rendered.
+    """
+    registry = get_registry()
+    if not registry.gemini_configured():
+        return UNAVAILABLE_HTML
+
+    prompt = build_analysis_prompt(metrics)
+    config = analysis_config()
+
+    # Model list is cached by the registry; no discovery call per request
+    model_name = select_model_name(registry.gemini_models)
+
+    async def generate() -> str:
+        # Generate analysis using the async google-genai client
+        response = await registry.gemini().aio.models.generate_content(
+            model=model_name,
+            contents=prompt,
+            config=config,
+        )
+
+        # None keeps empty answers out of the cache
+        return clean_analysis_html(response.text) or None
+
+    key = content_key("adhd", model=model_name, config=config, prompt=prompt)
+    return await get_result_cache().get_or_compute(
+        key,
+        lambda: call_provider(
+            GEMINI, generate, model=model_name, module="adhd"
+        ),
+    )
+
+
+async def stream_ai_analysis(metrics: dict) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Streaming counterpart of generate_ai_analysis. Yields (event, payload)
+    pairs: `analysis` chunks as Gemini writes them, then `done` with the
+    complete cleaned HTML, or `error`.
+    """
+    registry = get_registry()
+    if not registry.gemini_configured():
+        yield "done", {"analysis": UNAVAILABLE_HTML}
+        return
+
+    try:
+        prompt = build_analysis_prompt(metrics)
+        config = analysis_config()
+        model_name = select_model_name(registry.gemini_models)
+
+        # Shares cache entries with the non-streaming path
+        cache = get_result_cache()
+        key = content_key("adhd", model=model_name, config=config, prompt=prompt)
+        cached = await cache.aget(key)
+        if cached:
+            yield "analysis", {"text": cached}
+            yield "done", {"analysis": cached}
+            return
+
+        start_time = time.time()
+        stripper = FenceStripper()
+        parts = []
+        stream = stream_provider(
+            GEMINI,
+            lambda: registry.gemini().aio.models.generate_content_stream(
+                model=model_name,
+                contents=prompt,
+                config=config,
+            ),
+            model=model_name,
+            module="adhd",
+        )
+        # aclosing() ends the Gemini stream as soon as the client disconnects
+        async with aclosing(stream):
+            async for chunk in stream:
+                if not chunk.text:
+                    continue
+                parts.append(chunk.text)
+                text = stripper.feed(chunk.text)
+                if text:
+                    yield "analysis", {"text": text}
+
+        print(f"ADHD analysis streamed in {time.time() - start_time:.2f}s")
+        analysis = clean_analysis_html("".join(parts))
+        if analysis:
+            await cache.aset(key, analysis)
+        yield "done", {"analysis": analysis}
+
+    except Exception as e:
+        print(f"Gemini API Error: {e}")
+        yield "error", {"error": str(e), "analysis": error_html(e)}
+
+
+def build_analysis_prompt(metrics: dict) -> str:
+    """Prompt for the narrative analysis of the calculated metrics"""
+    return f"""You are a Neuro-Cognitive Analyst specializing in ADHD assessment interpretation.
 
 Analyze the following cognitive test results and provide a supportive, insightful summary:
 
@@ -167,48 +299,72 @@ Guidelines:
 
 Return ONLY the HTML content, no markdown code blocks."""
 
-        if not client:
-            raise Exception("Gemini client not initialized")
 
-        model_name = select_model_name(client)
+def analysis_config() -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        temperature=0.7,
+        top_p=0.95,
+        top_k=40,
+        max_output_tokens=2048,
+    )
 
-        # Generate analysis using google-genai
-        response = client.models.generate_content(
-            model=model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=2048,
-            )
-        )
-        
-        # Extract and clean response
-        analysis = response.text.strip()
-        
-        # Remove markdown code block markers if present
-        if analysis.startswith("```html"):
-            analysis = analysis[7:]
-        if analysis.startswith("```"):
-            analysis = analysis[3:]
-        if analysis.endswith("```"):
-            analysis = analysis[:-3]
-        
-        cleaned = analysis.strip()
 
-        # Basic guard to ensure we return complete HTML content
-        if cleaned and not cleaned.endswith("</p>"):
-            cleaned = f"{cleaned}</p>"
+def clean_analysis_html(text: Optional[str]) -> str:
+    """Strip markdown code fences and make sure the HTML ends cleanly"""
+    analysis = (text or "").strip()
 
-        return cleaned
-    
-    except Exception as e:
-        print(f"Gemini API Error: {e}")
-        return f"<p><strong>⚠️ AI Analysis Error</strong></p><p>Unable to generate analysis: {str(e)}</p>"
+    # Remove markdown code block markers if present
+    if analysis.startswith("```html"):
+        analysis = analysis[7:]
+    if analysis.startswith("```"):
+        analysis = analysis[3:]
+    if analysis.endswith("```"):
+        analysis = analysis[:-3]
+
+    cleaned = analysis.strip()
+
+    # Basic guard to ensure we return complete HTML content
+    if cleaned and not cleaned.endswith("</p>"):
+        cleaned = f"{cleaned}</p>"
+
+    return cleaned
+
+
+class FenceStripper:
+    """
+    Removes markdown code fences from streamed HTML as it passes through.
+    Trailing backticks and whitespace are held back until more text arrives,
+    so a closing fence is never sent.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.pending = ""
+
+    def feed(self, text: str) -> str:
+        self.pending += text
+        if not self.started:
+            head = self.pending.lstrip()
+            # Could still turn out to be an opening fence
+            if "```html".startswith(head):
+                return ""
+            for fence in ("```html", "```"):
+                if head.startswith(fence):
+                    head = head[len(fence):]
+                    break
+            self.pending = head.lstrip()
+            self.started = True
+
+        split = len(self.pending.rstrip("` \t\r\n"))
+        text, self.pending = self.pending[:split], self.pending[split:]
+        return text
 
 
-def select_model_name(client: genai.Client) -> str:
+def error_html(error: Exception) -> str:
+    return f"<p><strong>⚠️ AI Analysis Error</strong></p><p>Unable to generate analysis: {str(error)}</p>"
+
+
+def select_model_name(available: List[str]) -> str:
     """Select an available model that supports generateContent, preferring flash."""
     preferred = [
         "gemini-2.5-flash",
@@ -221,29 +377,13 @@ def select_model_name(client: genai.Client) -> str:
         "gemini-1.5-pro-latest",
     ]
 
-    try:
-        model_list = client.models.list()
-        models = getattr(model_list, "models", model_list)
-
-        available = []
-        for model in models:
-            name = getattr(model, "name", None) or getattr(model, "model", None) or str(model)
-            if not name:
-                continue
-            supported = getattr(model, "supported_actions", None) or getattr(model, "supported_methods", None)
-            if supported and "generateContent" not in supported:
-                continue
-            available.append(name)
-
-        for pref in preferred:
-            for name in available:
-                if pref in name:
-                    return name
-
-        if available:
-            return available[0]
-    except Exception:
-        pass
+    for pref in preferred:
+        for name in available:
+            if pref in name:
+                return name
+
+    if available:
+        return available[0]
 
     return "gemini-2.5-flash"
 
@@ -253,5 +393,5 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "ADHD Assessment API",
-        "gemini_configured": bool(GEMINI_API_KEY)
+        "gemini_configured": get_registry().gemini_configured()
     }
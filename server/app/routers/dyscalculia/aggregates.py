@@ -0,0 +1,128 @@
+from array import array
+from bisect import bisect_right
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    from .columns import AttemptColumns
+
+
+class TaskAggregate:
+    """
+    Running statistics for one task type, updated on every attempt.
+    Mirrors the quantities analysis.py derives from a full attempt list, so
+    reading them is constant time regardless of session length.
+
+    Values are not copied: the aggregate keeps the rows of its attempts in
+    the session's AttemptColumns and reads latencies, correctness and
+    timestamps from there.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.correct = 0
+        self.latency_sum = 0.0
+        # Rows of this task's attempts, in arrival order
+        self.rows = array("q")
+        # Sum of latencies of rows[: count // 2]
+        self.first_half_latency = 0.0
+        self.errors = 0
+        self.error_patterns: Dict[int, int] = {}
+        self.max_error_repeat = 0
+        # The same rows ordered by timestamp, for the improvement rate
+        self.ordered = array("q")
+        # Correct answers in ordered[: count // 2]
+        self.first_half_correct = 0
+
+    def add(self, columns: "AttemptColumns", row: int) -> None:
+        latency, correct = columns.latency, columns.correct
+        previous_half = self.count // 2
+        self.count += 1
+        half = self.count // 2
+
+        self.rows.append(row)
+        self.latency_sum += float(latency[row])
+        if half > previous_half:
+            self.first_half_latency += float(latency[self.rows[half - 1]])
+
+        is_correct = bool(correct[row])
+        if is_correct:
+            self.correct += 1
+        else:
+            self.errors += 1
+            pattern = columns.error_pattern(row)
+            repeats = self.error_patterns.get(pattern, 0) + 1
+            self.error_patterns[pattern] = repeats
+            self.max_error_repeat = max(self.max_error_repeat, repeats)
+
+        # Stable insert by timestamp; in-order arrivals go at the end
+        sort_key = columns.sort_key_at
+        timestamp = sort_key(row)
+        ordered = self.ordered
+        if not ordered or timestamp >= sort_key(ordered[-1]):
+            position = len(ordered)
+        else:
+            position = bisect_right(ordered, timestamp, key=sort_key)
+
+        # Shift the first-half count by the attempts entering or leaving it
+        if position < half:
+            self.first_half_correct += is_correct
+            if half == previous_half:
+                self.first_half_correct -= bool(correct[ordered[half - 1]])
+        elif half > previous_half:
+            self.first_half_correct += bool(correct[ordered[previous_half]])
+        ordered.insert(position, row)
+
+    @property
+    def error_rate(self) -> float:
+        return 1 - (self.correct / self.count)
+
+    @property
+    def avg_latency(self) -> float:
+        return self.latency_sum / self.count
+
+    @property
+    def error_consistency(self) -> float:
+        if self.errors < 2:
+            return 0
+        return self.max_error_repeat / self.errors
+
+    @property
+    def latency_trend(self) -> float:
+        if self.count < 3:
+            return 0
+
+        half = self.count // 2
+        first_avg = self.first_half_latency / half
+        second_avg = (self.latency_sum - self.first_half_latency) / (self.count - half)
+        if not first_avg:
+            # No trend from a zero baseline; the list-based analysis raised
+            # ZeroDivisionError here
+            return 0
+
+        return (first_avg - second_avg) / first_avg
+
+    @property
+    def improvement_rate(self) -> float:
+        if self.count < 3:
+            return 0
+
+        half = self.count // 2
+        first_correct = self.first_half_correct / half
+        second_correct = (self.correct - self.first_half_correct) / (self.count - half)
+
+        return max(-1, min(1, second_correct - first_correct))
+
+
+class SessionAggregates:
+    """Per-task running statistics for a whole session."""
+
+    def __init__(self):
+        self.total = 0
+        self.tasks: Dict[str, TaskAggregate] = {}
+
+    def add(self, columns: "AttemptColumns", row: int, task_type: str) -> None:
+        self.total += 1
+        self.tasks.setdefault(task_type, TaskAggregate()).add(columns, row)
+
+    def task(self, task_type: str) -> Optional[TaskAggregate]:
+        return self.tasks.get(task_type)
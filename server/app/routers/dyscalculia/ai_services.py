@@ -4,13 +4,28 @@ All API calls are made from the backend, not frontend
 """
 
 import json
-import os
-from typing import Any, Dict, Optional
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
 import httpx
+import numpy as np
 from google import genai
 from pydantic import BaseModel, Field
 
+from ...ai import (
+    GEMINI,
+    GROQ,
+    AIServiceConfig,
+    content_key,
+    get_registry,
+    get_result_cache,
+    call_provider,
+    hedge_delay,
+    hedged,
+)
+from ...http_client import get_http_client
+from .columns import AttemptColumns
+
 
 class AIAnalysisRequest(BaseModel):
     session_id: str
@@ -48,89 +63,153 @@ class GeminiAIAnalysisResponse(BaseModel):
     interpretation: str
 
 
-class AIServiceConfig:
-    """Configuration for AI services - reads from environment dynamically"""
+GROQ_SYSTEM_PROMPT = "You are an expert educational psychologist analyzing learning assessment data. Always respond with valid JSON only."
+GEMINI_MODEL = "gemini-2.5-flash"
 
-    @staticmethod
-    def get_groq_endpoint():
-        return os.getenv(
-            "GROQ_ENDPOINT", "https://api.groq.com/openai/v1/chat/completions"
-        )
 
-    @staticmethod
-    def get_groq_api_key():
-        return os.getenv("GROQ_API_KEY")
+RESPONSE_FORMAT = """Based on this data, provide an analysis in the following JSON format:
+{
+  "pattern": "exposure_related" | "possible_dyscalculia_signal" | "unclear",
+  "confidence": 0.0-1.0,
+  "score": 0-100,
+  "sub_scores": {
+    "quantity": 0-100,
+    "comparison": 0-100,
+    "symbol": 0-100,
+    "flash_counting": 0-100
+  },
+  "reasoning": "brief explanation of the analysis",
+  "interpretation": "user-friendly interpretation"
+}
+
+Return ONLY the JSON object, no additional text."""
 
-    @staticmethod
-    def get_groq_model():
-        return os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
 
-    @staticmethod
-    def get_gemini_api_key():
-        return os.getenv("GEMINI_API_KEY")
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about four characters per token for English and JSON"""
+    return (len(text) + 3) // 4
 
-    @staticmethod
-    def get_api_timeout():
-        return 5.0
 
+def compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def summarize_task(attempts: List[Dict[str, Any]]) -> str:
+    """One line of accuracy, latency quantiles, trend and top error patterns"""
+    total = len(attempts)
+    correct = np.array([bool(a.get("correct")) for a in attempts])
+    latency = np.array([float(a.get("latency", 0)) for a in attempts])
+    p25, p50, p90 = np.percentile(latency, [25, 50, 90])
+    line = (
+        f"{int(correct.sum())}/{total} correct ({round(correct.mean() * 100)}%), "
+        f"latency p25/p50/p90 {round(p25)}/{round(p50)}/{round(p90)}ms"
+    )
+
+    if total >= 4:
+        half = total // 2
+        line += (
+            f", accuracy first/second half "
+            f"{round(correct[:half].mean() * 100)}%/{round(correct[half:].mean() * 100)}%"
+        )
+
+    errors = Counter(
+        f"{compact_json(a.get('selected_answer'))}->{compact_json(a.get('correct_answer'))}"
+        for a in attempts
+        if not a.get("correct")
+    )
+    if errors:
+        patterns = ", ".join(f"{p} x{n}" for p, n in errors.most_common(3))
+        line += f", top errors (selected->correct) {patterns}"
+    return line
+
+
+def sample_attempts(attempts: List[Dict[str, Any]], budget: int) -> List[str]:
+    """Evenly spaced compact attempt rows that fit in `budget` tokens"""
+    rows = [
+        compact_json(
+            [
+                a.get("task_type"),
+                int(bool(a.get("correct"))),
+                a.get("selected_answer"),
+                a.get("correct_answer"),
+                round(float(a.get("latency", 0))),
+            ]
+        )
+        for a in attempts
+    ]
+    if not rows or budget <= 0:
+        return []
+
+    # Spread the sample across the session so early and late attempts both show
+    row_tokens = max(1, estimate_tokens("\n".join(rows)) // len(rows) + 1)
+    count = min(len(rows), budget // row_tokens)
+    if count <= 0:
+        return []
+    indices = np.linspace(0, len(rows) - 1, count).round().astype(int)
+    sample = [rows[i] for i in dict.fromkeys(indices.tolist())]
+    while sample and estimate_tokens("\n".join(sample)) > budget:
+        sample.pop()
+    return sample
+
+
+def format_analysis_prompt(
+    session_data: Dict[str, Any], token_budget: Optional[int] = None
+) -> str:
+    """
+    Format session data for AI analysis prompt
+    Summaries come first; raw attempts are sampled only into the token
+    budget that remains
+    """
+    if token_budget is None:
+        token_budget = AIServiceConfig.get_prompt_token_budget()
 
-def format_analysis_prompt(session_data: Dict[str, Any]) -> str:
-    """Format session data for AI analysis prompt"""
     attempts = session_data.get("attempts", [])
-    summary = {
-        "total_attempts": len(attempts),
-        "correct": sum(1 for a in attempts if a.get("correct")),
-        "incorrect": sum(1 for a in attempts if not a.get("correct")),
-        "avg_latency": sum(a.get("latency", 0) for a in attempts) / len(attempts)
-        if attempts
-        else 0,
-    }
-
-    by_task_type = {}
+    correct = sum(1 for a in attempts if a.get("correct"))
+    avg_latency = (
+        sum(a.get("latency", 0) for a in attempts) / len(attempts) if attempts else 0
+    )
+
+    by_task_type: Dict[str, List[Dict[str, Any]]] = {}
     for attempt in attempts:
-        task_type = attempt.get("task_type", "unknown")
-        if task_type not in by_task_type:
-            by_task_type[task_type] = {"correct": 0, "total": 0}
-        by_task_type[task_type]["total"] += 1
-        if attempt.get("correct"):
-            by_task_type[task_type]["correct"] += 1
+        by_task_type.setdefault(attempt.get("task_type", "unknown"), []).append(attempt)
 
     prompt = f"""Analyze this dyscalculia assessment session data and provide a structured analysis:
 
 SESSION SUMMARY:
-- Total attempts: {summary["total_attempts"]}
-- Correct answers: {summary["correct"]}
-- Incorrect answers: {summary["incorrect"]}
-- Average response time: {round(summary["avg_latency"])}ms
+- Total attempts: {len(attempts)}
+- Correct answers: {correct}
+- Incorrect answers: {len(attempts) - correct}
+- Average response time: {round(avg_latency)}ms
 
 TASK PERFORMANCE:
 """
-    for task_type, data in by_task_type.items():
-        percentage = round((data["correct"] / data["total"]) * 100)
-        prompt += f"- {task_type}: {data['correct']}/{data['total']} correct ({percentage}%)\n"
+    for task_type, task_attempts in by_task_type.items():
+        prompt += f"- {task_type}: {summarize_task(task_attempts)}\n"
 
+    exposures = session_data.get("exposures", [])
+    stress_indicators = session_data.get("stress_indicators", [])
     prompt += f"""
-RAW DATA:
-{json.dumps(session_data, indent=2)}
-
-Based on this data, provide an analysis in the following JSON format:
-{{
-  "pattern": "exposure_related" | "possible_dyscalculia_signal" | "unclear",
-  "confidence": 0.0-1.0,
-  "score": 0-100,
-  "sub_scores": {{
-    "quantity": 0-100,
-    "comparison": 0-100,
-    "symbol": 0-100,
-    "flash_counting": 0-100
-  }},
-  "reasoning": "brief explanation of the analysis",
-  "interpretation": "user-friendly interpretation"
-}}
-
-Return ONLY the JSON object, no additional text."""
+CONTEXT:
+- Exposures: {len(exposures)}
+- Stress indicators: {len(stress_indicators)}
+"""
+    for label, events in (
+        ("Exposure", exposures),
+        ("Stress indicator", stress_indicators),
+    ):
+        for event in events[-3:]:
+            prompt += f"- {label}: {compact_json(event)[:200]}\n"
+
+    # 30 tokens are held back for the sample header
+    remaining = token_budget - estimate_tokens(prompt + RESPONSE_FORMAT) - 30
+    sample = sample_attempts(attempts, remaining)
+    if sample:
+        prompt += f"""
+ATTEMPT SAMPLE ({len(sample)} of {len(attempts)}, in order; [task, correct, selected, answer, latency_ms]):
+"""
+        prompt += "\n".join(sample) + "\n"
 
-    return prompt
+    return prompt + "\n" + RESPONSE_FORMAT
 
 
 async def call_groq_api(prompt: str) -> Dict[str, Any]:
@@ -139,53 +218,54 @@ async def call_groq_api(prompt: str) -> Dict[str, Any]:
     if not api_key:
         raise Exception("Groq API key not configured")
 
-    async with httpx.AsyncClient(timeout=AIServiceConfig.get_api_timeout()) as client:
-        try:
-            response = await client.post(
-                AIServiceConfig.get_groq_endpoint(),
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}",
-                },
-                json={
-                    "model": AIServiceConfig.get_groq_model(),
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are an expert educational psychologist analyzing learning assessment data. Always respond with valid JSON only.",
-                        },
-                        {"role": "user", "content": prompt},
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 1000,
-                },
-            )
-            response.raise_for_status()
-            result = response.json()
+    client = get_http_client()
+    try:
+        response = await client.post(
+            AIServiceConfig.get_groq_endpoint(),
+            timeout=AIServiceConfig.get_api_timeout(),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {api_key}",
+            },
+            json={
+                "model": AIServiceConfig.get_groq_model(),
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": GROQ_SYSTEM_PROMPT,
+                    },
+                    {"role": "user", "content": prompt},
+                ],
+                "temperature": 0.3,
+                "max_tokens": 1000,
+            },
+        )
+        response.raise_for_status()
+        result = response.json()
 
-            content = result.get("choices", [{}])[0].get("message", {}).get("content")
-            if not content:
-                raise Exception("Invalid Groq response structure")
+        content = result.get("choices", [{}])[0].get("message", {}).get("content")
+        if not content:
+            raise Exception("Invalid Groq response structure")
 
-            return json.loads(content.strip())
+        return json.loads(content.strip())
 
-        except httpx.TimeoutException:
-            raise Exception("Groq API timeout after 5 seconds")
-        except httpx.HTTPStatusError as e:
-            raise Exception(
-                f"Groq API failed: {e.response.status_code} - {e.response.text}"
-            )
-        except json.JSONDecodeError as e:
-            raise Exception(f"Invalid JSON in Groq response: {str(e)}")
+    except httpx.TimeoutException:
+        raise Exception("Groq API timeout after 5 seconds")
+    except httpx.HTTPStatusError as e:
+        raise Exception(
+            f"Groq API failed: {e.response.status_code} - {e.response.text}"
+        )
+    except json.JSONDecodeError as e:
+        raise Exception(f"Invalid JSON in Groq response: {str(e)}")
 
 
 async def call_gemini_api(prompt: str) -> AIAnalysisResponse:
     """Call Gemini API with timeout"""
     try:
-        client = genai.Client().aio
+        client = get_registry().gemini().aio
 
         response = await client.models.generate_content(
-            model="gemini-2.5-flash",
+            model=GEMINI_MODEL,
             contents=[prompt],
             config=genai.types.GenerateContentConfig(
                 temperature=0.3,
@@ -200,7 +280,7 @@ async def call_gemini_api(prompt: str) -> AIAnalysisResponse:
         print(f"Gemini response: {response}")
 
         result = GeminiAIAnalysisResponse.model_validate_json(response.text)
-        result = result.dict()
+        result = result.model_dump()
         result["sub_scores"] = json.loads(result["sub_scores"])
         result = AIAnalysisResponse(**result)
         return result
@@ -212,51 +292,120 @@ async def get_ai_analysis(session_data: Dict[str, Any]) -> AIAnalysisResponse:
     """
     Get AI analysis from session data
     Tries Groq first, falls back to Gemini
+    Identical session data is answered from the result cache
     """
     prompt = format_analysis_prompt(session_data)
+    key = content_key(
+        "dyscalculia",
+        groq_model=AIServiceConfig.get_groq_model(),
+        groq_system_prompt=GROQ_SYSTEM_PROMPT,
+        gemini_model=GEMINI_MODEL,
+        prompt=prompt,
+    )
+    return await get_result_cache().get_or_compute_model(
+        key, AIAnalysisResponse, lambda: call_ai_providers(prompt)
+    )
 
-    # Try Groq first
+
+async def call_groq_analysis(prompt: str) -> AIAnalysisResponse:
+    """Groq call validated into an AIAnalysisResponse"""
+    return AIAnalysisResponse(**await call_groq_api(prompt))
+
+
+async def call_groq_guarded(prompt: str) -> AIAnalysisResponse:
+    """Groq call behind its circuit breaker, never past the Groq API timeout"""
+    return await call_provider(
+        GROQ,
+        lambda: call_groq_analysis(prompt),
+        timeout_ceiling=AIServiceConfig.get_api_timeout(),
+        model=AIServiceConfig.get_groq_model(),
+        module="dyscalculia",
+    )
+
+
+async def call_gemini_guarded(prompt: str) -> AIAnalysisResponse:
+    """Gemini call behind its circuit breaker and quota"""
+    return await call_provider(
+        GEMINI,
+        lambda: call_gemini_api(prompt),
+        model=GEMINI_MODEL,
+        module="dyscalculia",
+    )
+
+
+async def call_ai_providers(prompt: str) -> AIAnalysisResponse:
+    """
+    Call Groq, falling back to Gemini
+    With both configured, Gemini is started as a hedge once Groq runs past
+    its usual latency, and the first valid response wins
+    """
     groq_key = AIServiceConfig.get_groq_api_key()
+    gemini_key = AIServiceConfig.get_gemini_api_key()
+    if groq_key and gemini_key and AIServiceConfig.get_hedge_enabled():
+        delay = hedge_delay(GROQ)
+        try:
+            print(
+                f"Attempting Groq API call, hedging with Gemini after {delay:.2f}s..."
+            )
+            result = await hedged(
+                lambda: call_groq_guarded(prompt),
+                lambda: call_gemini_guarded(prompt),
+                delay,
+            )
+            print("Hedged AI call successful")
+            return result
+        except Exception as e:
+            print(f"Hedged AI call failed: {str(e)}")
+            raise Exception(
+                "All AI API calls failed. Please check API key configuration."
+            ) from e
+
+    # Kept as the cause of the final error, so callers can tell a provider
+    # outage (worth retrying) from a configuration problem
+    last_error = None
+
+    # Try Groq first
     if groq_key:
         try:
             print("Attempting Groq API call...")
-            result = await call_groq_api(prompt)
+            result = await call_groq_guarded(prompt)
             print("Groq API call successful")
-            return AIAnalysisResponse(**result)
+            return result
         except Exception as e:
             print(f"Groq API failed: {str(e)}")
+            last_error = e
     else:
         print("Groq not configured, skipping to Gemini")
 
     # Fallback to Gemini
-    gemini_key = AIServiceConfig.get_gemini_api_key()
     if gemini_key:
         try:
             print("Attempting Gemini API call...")
-            result = await call_gemini_api(prompt)
+            result = await call_gemini_guarded(prompt)
             print("Gemini API call successful")
             return result
         except Exception as e:
             print(f"Gemini API failed: {str(e)}")
+            last_error = e
     else:
         print("Gemini not configured")
 
     # If both fail
-    raise Exception("All AI API calls failed. Please check API key configuration.")
+    raise Exception(
+        "All AI API calls failed. Please check API key configuration."
+    ) from last_error
 
 
 def calculate_flash_duration(
-    session_data: Dict[str, Any], difficulty: int
+    attempts: AttemptColumns, difficulty: int
 ) -> FlashDurationResponse:
     """
     Calculate adaptive flash duration based on performance and difficulty
     Decrease by 0.2s per 10% above 70% (exemplary performance)
     Increase by 0.2s per 10% below 70% (struggling)
     """
-    attempts = session_data.get("attempts", [])
-
     # Filter flash counting attempts only
-    flash_attempts = [a for a in attempts if a.get("task_type") == "flash_counting"]
+    flash_attempts = attempts.for_task("flash_counting")
 
     # Determine base duration based on difficulty
     if difficulty <= 2:
@@ -273,8 +422,8 @@ def calculate_flash_duration(
     adjustment_reason = "Base duration for difficulty level"
 
     # Calculate performance if we have flash attempts
-    if flash_attempts:
-        correct_count = sum(1 for a in flash_attempts if a.get("correct"))
+    if len(flash_attempts):
+        correct_count = int(np.count_nonzero(flash_attempts.correct))
         total_count = len(flash_attempts)
         performance_percentage = round((correct_count / total_count) * 100, 1)
 
@@ -1,20 +1,23 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
+import numpy as np
+from .aggregates import SessionAggregates, TaskAggregate
+from .columns import AttemptColumns
 from .models import TaskAttempt, AnalysisResult
 
 
-def analyze_patterns(attempts: List[TaskAttempt]) -> AnalysisResult:
+def analyze_patterns(
+    attempts: Union[AttemptColumns, List[TaskAttempt]],
+) -> AnalysisResult:
     """Analyze task attempts to detect patterns in performance."""
+    if not isinstance(attempts, AttemptColumns):
+        attempts = AttemptColumns.from_attempts(attempts)
+
     if len(attempts) < 3:
-        return AnalysisResult(
-            pattern="insufficient_data",
-            confidence=0,
-            reasoning="Not enough attempts to identify patterns yet.",
-            sub_scores={},
-        )
+        return insufficient_data_result()
 
-    quantity_attempts = [a for a in attempts if a.task_type == "quantity"]
-    comparison_attempts = [a for a in attempts if a.task_type == "comparison"]
-    symbol_attempts = [a for a in attempts if a.task_type == "symbol"]
+    quantity_attempts = attempts.for_task("quantity")
+    comparison_attempts = attempts.for_task("comparison")
+    symbol_attempts = attempts.for_task("symbol")
 
     quantity_analysis = analyze_stability(quantity_attempts, "quantity")
     comparison_analysis = analyze_stability(comparison_attempts, "comparison")
@@ -33,17 +36,63 @@ def analyze_patterns(attempts: List[TaskAttempt]) -> AnalysisResult:
     ]
     improvement_rates = [rate for rate in improvement_rates if rate is not None]
 
-    avg_improvement = (
-        sum(improvement_rates) / len(improvement_rates) if improvement_rates else 0
+    return build_analysis_result(
+        len(attempts),
+        quantity_analysis,
+        comparison_analysis,
+        symbol_analysis,
+        improvement_rates,
     )
 
+
+def analyze_aggregates(aggregates: SessionAggregates) -> AnalysisResult:
+    """Same analysis as analyze_patterns, read from running per-task aggregates."""
+    if aggregates.total < 3:
+        return insufficient_data_result()
+
+    task_aggregates = [
+        aggregates.task(task_type) for task_type in ("quantity", "comparison", "symbol")
+    ]
+    improvement_rates = [
+        aggregate.improvement_rate
+        for aggregate in task_aggregates
+        if aggregate and aggregate.count > 2
+    ]
+
+    return build_analysis_result(
+        aggregates.total,
+        *[analyze_aggregate_stability(aggregate) for aggregate in task_aggregates],
+        improvement_rates,
+    )
+
+
+def insufficient_data_result() -> AnalysisResult:
+    """Result for sessions with too few attempts to analyze."""
+    return AnalysisResult(
+        pattern="insufficient_data",
+        confidence=0,
+        reasoning="Not enough attempts to identify patterns yet.",
+        sub_scores={},
+    )
+
+
+def build_analysis_result(
+    total_attempts: int,
+    quantity_analysis: Dict[str, Any],
+    comparison_analysis: Dict[str, Any],
+    symbol_analysis: Dict[str, Any],
+    improvement_rates: List[float],
+) -> AnalysisResult:
+    """Combine per-task stability analyses into the session result."""
+    avg_improvement = average_improvement(improvement_rates)
+
     pattern = determine_pattern(
         quantity_analysis, comparison_analysis, symbol_analysis, avg_improvement
     )
 
     return AnalysisResult(
         pattern=pattern,
-        confidence=min(len(attempts) / 10 + (1 if improvement_rates else 0), 0.95),
+        confidence=min(total_attempts / 10 + (1 if improvement_rates else 0), 0.95),
         reasoning=generate_reasoning(
             quantity_analysis, comparison_analysis, symbol_analysis, avg_improvement
         ),
@@ -56,17 +105,45 @@ def analyze_patterns(attempts: List[TaskAttempt]) -> AnalysisResult:
     )
 
 
-def analyze_stability(attempts: List[TaskAttempt], task_type: str) -> Dict[str, Any]:
+def average_improvement(improvement_rates: List[float]) -> float:
+    return sum(improvement_rates) / len(improvement_rates) if improvement_rates else 0
+
+
+def analyze_stability(attempts: AttemptColumns, task_type: str) -> Dict[str, Any]:
     """Analyze stability and error patterns in task attempts."""
-    if not attempts:
+    if not len(attempts):
         return {"score": 70, "stability": "no_data", "error_rate": 0, "avg_latency": 0}
 
-    correct = [a for a in attempts if a.correct]
-    error_rate = 1 - (len(correct) / len(attempts))
+    correct = int(np.count_nonzero(attempts.correct))
+
+    return summarize_stability(
+        error_rate=1 - (correct / len(attempts)),
+        error_consistency=calculate_error_consistency(attempts),
+        latency_trend=calculate_latency_trend(attempts),
+        avg_latency=float(attempts.latency.mean()),
+    )
+
+
+def analyze_aggregate_stability(aggregate: Optional[TaskAggregate]) -> Dict[str, Any]:
+    """Stability analysis for one task type, read from its running aggregate."""
+    if not aggregate:
+        return {"score": 70, "stability": "no_data", "error_rate": 0, "avg_latency": 0}
 
-    error_consistency = calculate_error_consistency(attempts)
-    latency_trend = calculate_latency_trend(attempts)
+    return summarize_stability(
+        error_rate=aggregate.error_rate,
+        error_consistency=aggregate.error_consistency,
+        latency_trend=aggregate.latency_trend,
+        avg_latency=aggregate.avg_latency,
+    )
 
+
+def summarize_stability(
+    error_rate: float,
+    error_consistency: float,
+    latency_trend: float,
+    avg_latency: float,
+) -> Dict[str, Any]:
+    """Score a task type from its error and latency statistics."""
     score = 80
     score -= error_rate * 30
     score -= error_consistency * 10
@@ -76,51 +153,52 @@ def analyze_stability(attempts: List[TaskAttempt], task_type: str) -> Dict[str,
         "score": max(20, min(100, score)),
         "stability": "consistent_errors" if error_consistency > 0.7 else "variable",
         "error_rate": error_rate,
-        "avg_latency": sum(a.latency for a in attempts) / len(attempts),
+        "avg_latency": avg_latency,
         "error_consistency": error_consistency,
     }
 
 
-def calculate_error_consistency(attempts: List[TaskAttempt]) -> float:
+def calculate_error_consistency(attempts: AttemptColumns) -> float:
     """Calculate how consistent error patterns are."""
-    errors = [a for a in attempts if not a.correct]
-    if len(errors) < 2:
+    error_patterns = attempts.error_patterns[~attempts.correct]
+    if len(error_patterns) < 2:
         return 0
 
-    error_patterns = [f"{a.selected_answer}-{a.correct_answer}" for a in errors]
-    pattern_counts = {}
-    for pattern in error_patterns:
-        pattern_counts[pattern] = pattern_counts.get(pattern, 0) + 1
-
-    max_repeat = max(pattern_counts.values())
-    return max_repeat / len(errors)
+    max_repeat = int(np.bincount(error_patterns).max())
+    return max_repeat / len(error_patterns)
 
 
-def calculate_latency_trend(attempts: List[TaskAttempt]) -> float:
+def calculate_latency_trend(attempts: AttemptColumns) -> float:
     """Calculate whether response times are improving."""
     if len(attempts) < 3:
         return 0
 
-    first_half = attempts[: len(attempts) // 2]
-    second_half = attempts[len(attempts) // 2 :]
+    latency = attempts.latency
+    half = len(latency) // 2
 
-    first_avg = sum(a.latency for a in first_half) / len(first_half)
-    second_avg = sum(a.latency for a in second_half) / len(second_half)
+    first_avg = float(latency[:half].mean())
+    second_avg = float(latency[half:].mean())
+    if not first_avg:
+        # No trend from a zero baseline; the list-based analysis raised
+        # ZeroDivisionError here
+        return 0
 
     return (first_avg - second_avg) / first_avg
 
 
-def calculate_improvement_rate(attempts: List[TaskAttempt]) -> float:
+def calculate_improvement_rate(attempts: AttemptColumns) -> float:
     """Calculate rate of improvement over time."""
     if len(attempts) < 3:
         return 0
 
-    sorted_attempts = sorted(attempts, key=lambda a: a.timestamp or 0)
-    first_half = sorted_attempts[: len(sorted_attempts) // 2]
-    second_half = sorted_attempts[len(sorted_attempts) // 2 :]
+    order = np.argsort(attempts.sort_key, kind="stable")
+    sorted_correct = attempts.correct[order]
+    half = len(sorted_correct) // 2
 
-    first_correct = len([a for a in first_half if a.correct]) / len(first_half)
-    second_correct = len([a for a in second_half if a.correct]) / len(second_half)
+    first_correct = int(np.count_nonzero(sorted_correct[:half])) / half
+    second_correct = int(np.count_nonzero(sorted_correct[half:])) / (
+        len(sorted_correct) - half
+    )
 
     return max(-1, min(1, second_correct - first_correct))
 
@@ -177,11 +255,20 @@ def generate_reasoning(
     )
 
 
-def calculate_overall_score(attempts: List[TaskAttempt]) -> float:
+def calculate_overall_score(
+    attempts: Union[AttemptColumns, List[TaskAttempt]],
+) -> float:
     """Calculate overall performance score."""
-    analysis = analyze_patterns(attempts)
-    sub_scores = analysis.sub_scores
+    return score_analysis(analyze_patterns(attempts))
+
+
+def score_analysis(analysis: AnalysisResult) -> float:
+    """Calculate overall performance score from an existing analysis."""
+    return score_sub_scores(analysis.sub_scores)
+
 
+def score_sub_scores(sub_scores: Dict[str, float]) -> float:
+    """Calculate overall performance score from per-task sub-scores."""
     score = 70
     score += sub_scores.get("improvement", 0) * 20
 
@@ -0,0 +1,292 @@
+"""
+Cohort analytics - scores many stored dyscalculia sessions in one pass.
+
+Per-session, per-task statistics are computed for the whole cohort at once
+with NumPy group reductions; the analysis.py rules then turn them into
+patterns and scores. Run as a CLI with:
+
+    python -m app.routers.dyscalculia.cohort --db data/dyscalculia.sqlite3
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .analysis import (
+    average_improvement,
+    determine_pattern,
+    insufficient_data_result,
+    score_analysis,
+    score_sub_scores,
+    summarize_stability,
+)
+from .models import CohortReport, SchoolSummary, TaskNorms
+from .storage import AttemptRow, SessionStore, SQLiteSessionStore, get_store
+
+TASK_TYPES = ["quantity", "comparison", "symbol"]
+# Attempts of other task types only count towards the session total
+OTHER_TASK = len(TASK_TYPES)
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+class CohortStatistics:
+    """Per-(session, task type) statistics for a cohort, as 2-D arrays."""
+
+    def __init__(self, session_ids: List[str], rows: List[AttemptRow]):
+        self.session_ids = session_ids
+        sessions = len(session_ids)
+        groups = sessions * (OTHER_TASK + 1)
+
+        session_codes = {
+            session_id: code for code, session_id in enumerate(session_ids)
+        }
+        task_codes = {task_type: code for code, task_type in enumerate(TASK_TYPES)}
+        rows = [row for row in rows if row[0] in session_codes]
+        columns = list(zip(*rows)) if rows else [()] * 7
+        row_sessions, tasks, corrects, latencies, timestamps, selected, answers = (
+            columns
+        )
+
+        session_index = np.array(
+            [session_codes[session_id] for session_id in row_sessions], np.int64
+        )
+        task_index = np.array(
+            [task_codes.get(task_type, OTHER_TASK) for task_type in tasks], np.int64
+        )
+        group = session_index * (OTHER_TASK + 1) + task_index
+        correct = np.array(corrects, np.bool_)
+        latency = np.array(latencies, np.float64)
+        # Missing timestamps sort as 0, as in calculate_improvement_rate
+        sort_key = np.nan_to_num(np.array(timestamps, np.float64), nan=0.0)
+        pattern, pattern_count = self._pattern_codes(selected, answers)
+
+        shape = (sessions, OTHER_TASK + 1)
+        counts = np.bincount(group, minlength=groups)
+        correct_counts = np.bincount(group, weights=correct, minlength=groups)
+        latency_sums = np.bincount(group, weights=latency, minlength=groups)
+        half = counts // 2
+
+        # Latency trend: halves in arrival order within each group
+        rank = self._rank_within_group(group, np.argsort(group, kind="stable"), counts)
+        first = rank < half[group]
+        first_latency = np.bincount(
+            group[first], weights=latency[first], minlength=groups
+        )
+
+        # Improvement rate: halves in timestamp order within each group
+        rank = self._rank_within_group(group, np.lexsort((sort_key, group)), counts)
+        first = rank < half[group]
+        first_correct = np.bincount(
+            group[first], weights=correct[first], minlength=groups
+        )
+
+        # Error consistency: most repeated error pattern within each group
+        errors = ~correct
+        error_keys = group[errors] * pattern_count + pattern[errors]
+        keys, repeats = np.unique(error_keys, return_counts=True)
+        max_repeat = np.zeros(groups)
+        np.maximum.at(max_repeat, keys // pattern_count, repeats)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            error_count = counts - correct_counts
+            first_avg = first_latency / half
+            second_avg = (latency_sums - first_latency) / (counts - half)
+            improvement = (correct_counts - first_correct) / (
+                counts - half
+            ) - first_correct / half
+
+            self.count = counts.reshape(shape)
+            self.total = self.count.sum(axis=1)
+            self.error_rate = (1 - correct_counts / counts).reshape(shape)
+            self.avg_latency = (latency_sums / counts).reshape(shape)
+            self.error_consistency = np.where(
+                error_count >= 2, max_repeat / error_count, 0
+            ).reshape(shape)
+            self.latency_trend = np.where(
+                (counts >= 3) & (first_avg != 0),
+                (first_avg - second_avg) / first_avg,
+                0,
+            ).reshape(shape)
+            self.improvement = np.where(counts >= 3, improvement, 0).reshape(shape)
+
+    @staticmethod
+    def _pattern_codes(
+        selected: Tuple[str, ...], answers: Tuple[str, ...]
+    ) -> Tuple[np.ndarray, int]:
+        """
+        Error-pattern code of every row, with the same identity analysis uses:
+        f"{selected}-{correct}" of the decoded answers.
+        """
+        if not selected:
+            return np.zeros(0, np.int64), 1
+        pairs, inverse = np.unique(
+            np.char.add(np.char.add(selected, "\x1f"), answers), return_inverse=True
+        )
+        patterns: Dict[str, int] = {}
+        pair_patterns = np.array(
+            [
+                patterns.setdefault(
+                    f"{json.loads(answer)}-{json.loads(correct)}", len(patterns)
+                )
+                for answer, correct in (pair.split("\x1f") for pair in pairs.tolist())
+            ],
+            np.int64,
+        )
+        return pair_patterns[inverse], len(patterns)
+
+    @staticmethod
+    def _rank_within_group(
+        group: np.ndarray, order: np.ndarray, counts: np.ndarray
+    ) -> np.ndarray:
+        """Position of every row within its group, following `order`."""
+        starts = np.cumsum(counts) - counts
+        rank = np.empty(len(group), np.int64)
+        rank[order] = np.arange(len(group)) - starts[group[order]]
+        return rank
+
+    def improvement_rate(self, session: int, task: int) -> float:
+        """Improvement rate, clamped exactly as calculate_improvement_rate does."""
+        return max(-1, min(1, float(self.improvement[session, task])))
+
+    def task_analysis(self, session: int, task: int) -> Dict:
+        """Stability analysis for one session and task, as analyze_stability returns it."""
+        if not self.count[session, task]:
+            return {
+                "score": 70,
+                "stability": "no_data",
+                "error_rate": 0,
+                "avg_latency": 0,
+            }
+
+        return summarize_stability(
+            error_rate=float(self.error_rate[session, task]),
+            error_consistency=float(self.error_consistency[session, task]),
+            latency_trend=float(self.latency_trend[session, task]),
+            avg_latency=float(self.avg_latency[session, task]),
+        )
+
+
+def _percentiles(values: np.ndarray) -> Dict[str, float]:
+    if not len(values):
+        return {}
+    return {
+        f"p{q}": float(value)
+        for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+    }
+
+
+def _pattern_counts(patterns: np.ndarray) -> Dict[str, int]:
+    names, counts = np.unique(patterns, return_counts=True)
+    return {str(name): int(count) for name, count in zip(names, counts)}
+
+
+def analyze_cohort(
+    store: SessionStore,
+    session_ids: Optional[List[str]] = None,
+    schools: Optional[Dict[str, str]] = None,
+) -> CohortReport:
+    """Score every session in a cohort and summarise the results."""
+    start_time = time.perf_counter()
+    schools = schools or {}
+
+    if session_ids is None:
+        session_ids = store.session_ids()
+    stats = CohortStatistics(session_ids, store.attempt_rows(session_ids))
+
+    patterns = []
+    scores = np.zeros(len(session_ids))
+    task_scores = np.zeros((len(session_ids), len(TASK_TYPES)))
+    for session in range(len(session_ids)):
+        if stats.total[session] < 3:
+            analysis = insufficient_data_result()
+            patterns.append(analysis.pattern)
+            scores[session] = score_analysis(analysis)
+            continue
+
+        task_analyses = [
+            stats.task_analysis(session, task) for task in range(len(TASK_TYPES))
+        ]
+        improvement_rates = [
+            stats.improvement_rate(session, task)
+            for task in range(len(TASK_TYPES))
+            if stats.count[session, task] > 2
+        ]
+        # Same rules as build_analysis_result, minus the per-session reasoning
+        improvement = average_improvement(improvement_rates)
+        patterns.append(determine_pattern(*task_analyses, improvement))
+        scores[session] = score_sub_scores(
+            {
+                "quantity": task_analyses[0]["score"],
+                "comparison": task_analyses[1]["score"],
+                "symbol": task_analyses[2]["score"],
+                "improvement": improvement,
+            }
+        )
+        task_scores[session] = [task["score"] for task in task_analyses]
+
+    patterns = np.asarray(patterns)
+    norms = {}
+    for task, task_type in enumerate(TASK_TYPES):
+        present = stats.count[:, task] > 0
+        norms[task_type] = TaskNorms(
+            sessions=int(present.sum()),
+            score=_percentiles(task_scores[present, task]),
+            error_rate=_percentiles(stats.error_rate[present, task]),
+            avg_latency=_percentiles(stats.avg_latency[present, task]),
+        )
+
+    school_names = np.asarray(
+        [schools.get(session_id, "unassigned") for session_id in session_ids]
+    )
+    school_summaries = {}
+    for school in np.unique(school_names):
+        members = school_names == school
+        school_summaries[str(school)] = SchoolSummary(
+            sessions=int(members.sum()),
+            mean_score=float(scores[members].mean()),
+            patterns=_pattern_counts(patterns[members]),
+            task_scores={
+                task_type: float(
+                    task_scores[members & (stats.count[:, task] > 0), task].mean()
+                )
+                for task, task_type in enumerate(TASK_TYPES)
+                if (members & (stats.count[:, task] > 0)).any()
+            },
+        )
+
+    return CohortReport(
+        sessions=len(session_ids),
+        mean_score=float(scores.mean()) if len(scores) else 0,
+        patterns=_pattern_counts(patterns),
+        norms=norms,
+        schools=school_summaries,
+        elapsed_ms=(time.perf_counter() - start_time) * 1000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Score stored dyscalculia sessions in bulk"
+    )
+    parser.add_argument(
+        "--db", help="SQLite session database (defaults to the configured store)"
+    )
+    parser.add_argument("--schools", help="JSON file mapping session_id to school")
+    parser.add_argument("--sessions", nargs="*", help="Only include these session ids")
+    args = parser.parse_args()
+
+    store = SQLiteSessionStore(args.db) if args.db else get_store()
+    schools = None
+    if args.schools:
+        with open(args.schools) as f:
+            schools = json.load(f)
+
+    report = analyze_cohort(store, args.sessions or None, schools)
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .aggregates import SessionAggregates
+from .models import TaskAttempt
+
+
+# Sentinel stored in the difficulty column when the client sent none
+MISSING_DIFFICULTY = np.iinfo(np.int64).min
+
+
+def _answer_key(selected: Any, correct: Any) -> str:
+    return json.dumps([selected, correct], sort_keys=True, default=str)
+
+
+class AnswerTable:
+    """
+    Interned (selected_answer, correct_answer) pairs shared by a session's
+    columns. Each pair also maps to the error-pattern code analysis uses.
+    """
+
+    def __init__(self):
+        self.pairs: List[Tuple[Any, Any]] = []
+        self.pattern_codes: List[int] = []
+        self._pair_codes: Dict[str, int] = {}
+        self._patterns: Dict[str, int] = {}
+
+    def intern(self, selected: Any, correct: Any) -> int:
+        key = _answer_key(selected, correct)
+        code = self._pair_codes.get(key)
+        if code is None:
+            code = len(self.pairs)
+            self._pair_codes[key] = code
+            self.pairs.append((selected, correct))
+            pattern = f"{selected}-{correct}"
+            self.pattern_codes.append(
+                self._patterns.setdefault(pattern, len(self._patterns))
+            )
+        return code
+
+
+class AttemptColumns:
+    """
+    Columnar, array-backed buffer of task attempts.
+    Each field lives in its own NumPy array so analysis can run vectorized;
+    TaskAttempt objects are only rebuilt at the API edge. Per-task running
+    aggregates over the rows are updated on every append, so a session's
+    analysis does not rescan its attempts.
+    """
+
+    FIELDS = {
+        "latency": np.float64,
+        "correct": np.bool_,
+        "timestamp": np.float64,  # NaN when the client sent none
+        # Client integers; TaskAttempt bounds them to the int64 range
+        "difficulty": np.int64,  # MISSING_DIFFICULTY when the client sent none
+        "tries": np.int64,
+        # Codes into task_types and the answer table
+        "task": np.int32,
+        "answer": np.int32,
+    }
+
+    def __init__(
+        self,
+        capacity: int = 32,
+        task_types: Optional[List[str]] = None,
+        answers: Optional[AnswerTable] = None,
+    ):
+        self._size = 0
+        self._arrays = {
+            name: np.empty(capacity, dtype) for name, dtype in self.FIELDS.items()
+        }
+        self.task_types: List[str] = task_types if task_types is not None else []
+        self.answers = answers if answers is not None else AnswerTable()
+        self.aggregates: Optional[SessionAggregates] = SessionAggregates()
+
+    @classmethod
+    def from_attempts(cls, attempts: List[TaskAttempt]) -> "AttemptColumns":
+        columns = cls(capacity=max(len(attempts), 1))
+        for attempt in attempts:
+            columns.append(attempt)
+        return columns
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, attempt: TaskAttempt) -> None:
+        if self._size == len(self._arrays["latency"]):
+            for name, array in self._arrays.items():
+                grown = np.empty(max(len(array) * 2, 1), array.dtype)
+                grown[: self._size] = array[: self._size]
+                self._arrays[name] = grown
+
+        row = self._size
+        self._arrays["latency"][row] = attempt.latency
+        self._arrays["correct"][row] = attempt.correct
+        self._arrays["timestamp"][row] = (
+            np.nan if attempt.timestamp is None else attempt.timestamp
+        )
+        self._arrays["difficulty"][row] = (
+            MISSING_DIFFICULTY if attempt.difficulty is None else attempt.difficulty
+        )
+        self._arrays["tries"][row] = attempt.attempts
+        self._arrays["task"][row] = self.task_code(attempt.task_type, create=True)
+        self._arrays["answer"][row] = self.answers.intern(
+            attempt.selected_answer, attempt.correct_answer
+        )
+        self._size += 1
+        if self.aggregates is not None:
+            self.aggregates.add(self, row, attempt.task_type)
+
+    def task_code(self, task_type: str, create: bool = False) -> int:
+        if task_type in self.task_types:
+            return self.task_types.index(task_type)
+        if not create:
+            return -1
+        self.task_types.append(task_type)
+        return len(self.task_types) - 1
+
+    def _column(self, name: str) -> np.ndarray:
+        return self._arrays[name][: self._size]
+
+    @property
+    def latency(self) -> np.ndarray:
+        return self._column("latency")
+
+    @property
+    def correct(self) -> np.ndarray:
+        return self._column("correct")
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        return self._column("timestamp")
+
+    @property
+    def sort_key(self) -> np.ndarray:
+        """Timestamps with missing values treated as 0, as analysis sorts them."""
+        return np.nan_to_num(self.timestamp, nan=0.0)
+
+    def sort_key_at(self, row: int) -> float:
+        timestamp = float(self._arrays["timestamp"][row])
+        return 0.0 if timestamp != timestamp else timestamp
+
+    def error_pattern(self, row: int) -> int:
+        """Error-pattern code of one attempt."""
+        return self.answers.pattern_codes[self._arrays["answer"][row]]
+
+    @property
+    def difficulty(self) -> np.ndarray:
+        return self._column("difficulty")
+
+    @property
+    def task(self) -> np.ndarray:
+        return self._column("task")
+
+    @property
+    def error_patterns(self) -> np.ndarray:
+        """Error-pattern code of every attempt."""
+        codes = np.asarray(self.answers.pattern_codes, dtype=np.int32)
+        return codes[self._column("answer")]
+
+    def for_task(self, task_type: str) -> "AttemptColumns":
+        """The attempts of one task type, in arrival order."""
+        mask = self.task == self.task_code(task_type)
+        selected = AttemptColumns(
+            capacity=0, task_types=self.task_types, answers=self.answers
+        )
+        selected._arrays = {
+            name: array[: self._size][mask] for name, array in self._arrays.items()
+        }
+        selected._size = int(np.count_nonzero(mask))
+        # A snapshot for vectorized analysis; it is never appended to
+        selected.aggregates = None
+        return selected
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Plain dicts in the TaskAttempt shape, for prompts and JSON."""
+        rows = zip(
+            self.task.tolist(),
+            self.correct.tolist(),
+            self._column("answer").tolist(),
+            self.latency.tolist(),
+            self._column("tries").tolist(),
+            self.timestamp.tolist(),
+            self.difficulty.tolist(),
+        )
+        return [
+            {
+                "task_type": self.task_types[task],
+                "correct": correct,
+                "selected_answer": self.answers.pairs[answer][0],
+                "correct_answer": self.answers.pairs[answer][1],
+                "latency": latency,
+                "attempts": tries,
+                "timestamp": None if timestamp != timestamp else timestamp,
+                "difficulty": None if difficulty == MISSING_DIFFICULTY else difficulty,
+            }
+            for task, correct, answer, latency, tries, timestamp, difficulty in rows
+        ]
+
+    def to_attempts(self) -> List[TaskAttempt]:
+        return [TaskAttempt(**row) for row in self.to_dicts()]
@@ -1,5 +1,9 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Dict, Any, Literal, Optional
+
+# Integers stored in the int64 attempt columns; the minimum is reserved
+# for "not sent"
+Int64 = Annotated[int, Field(ge=-(2**63) + 1, le=2**63 - 1)]
 
 
 class TaskAttempt(BaseModel):
@@ -8,9 +12,9 @@ class TaskAttempt(BaseModel):
     selected_answer: Any
     correct_answer: Any
     latency: float
-    attempts: int
+    attempts: Int64
     timestamp: Optional[float] = None
-    difficulty: Optional[int] = None
+    difficulty: Optional[Int64] = None
     # session_id is now taken from URL path
 
 
@@ -21,6 +25,21 @@ class SessionData(BaseModel):
     stress_indicators: List[Dict[str, Any]]
 
 
+class SessionEvent(BaseModel):
+    type: Literal["attempt", "exposure", "stress_indicator"]
+    data: Dict[str, Any]
+    # Client-generated key; resending an event with the same key is a no-op
+    idempotency_key: Optional[str] = None
+
+
+class BatchEventsResponse(BaseModel):
+    status: str
+    received: int
+    accepted: int
+    duplicates: int
+    version: int
+
+
 class AnalysisResult(BaseModel):
     pattern: str
     confidence: float
@@ -28,6 +47,36 @@ class AnalysisResult(BaseModel):
     sub_scores: Dict[str, float]
 
 
+class CohortRequest(BaseModel):
+    # Sessions to include; every stored session when omitted
+    session_ids: Optional[List[str]] = None
+    # Maps session_id to school for per-school aggregates
+    schools: Dict[str, str] = {}
+
+
+class TaskNorms(BaseModel):
+    sessions: int
+    score: Dict[str, float]
+    error_rate: Dict[str, float]
+    avg_latency: Dict[str, float]
+
+
+class SchoolSummary(BaseModel):
+    sessions: int
+    mean_score: float
+    patterns: Dict[str, int]
+    task_scores: Dict[str, float]
+
+
+class CohortReport(BaseModel):
+    sessions: int
+    mean_score: float
+    patterns: Dict[str, int]
+    norms: Dict[str, TaskNorms]
+    schools: Dict[str, SchoolSummary]
+    elapsed_ms: float
+
+
 class ExplanationResult(BaseModel):
     explanation: str
 
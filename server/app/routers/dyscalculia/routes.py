@@ -1,8 +1,33 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Any
-from .models import TaskAttempt, SessionData, AnalysisResult, ExplanationResult
-from .storage import get_session, get_or_create_session
-from .analysis import analyze_patterns, calculate_overall_score
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import ValidationError
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from ...ai import GROQ, SingleFlight
+from ...jobs import job_handler
+from .models import (
+    TaskAttempt,
+    SessionData,
+    SessionEvent,
+    BatchEventsResponse,
+    CohortRequest,
+    CohortReport,
+    AnalysisResult,
+    ExplanationResult,
+)
+from .storage import (
+    SessionState,
+    StorageConfig,
+    get_session,
+    get_session_state,
+    get_store,
+    append_attempt,
+    append_exposure,
+    append_stress_indicator,
+    append_events,
+)
+from .analysis import analyze_aggregates, score_analysis
+from .cohort import analyze_cohort
 from .explanation import generate_explanation_text
 from .ai_services import (
     get_ai_analysis,
@@ -15,33 +40,148 @@ from .ai_services import (
 
 router = APIRouter()
 
+ai_analysis_flights = SingleFlight()
+
+# Store calls do disk I/O and can wait on the SQLite write lock, so routes
+# using the store are plain `def` and run in FastAPI's threadpool; async
+# routes hand store calls to asyncio.to_thread
+
 
 @router.post("/sessions/{session_id}/attempts")
-async def add_attempt(session_id: str, attempt: TaskAttempt):
+def add_attempt(session_id: str, attempt: TaskAttempt):
     """Log a task attempt for a session."""
-    session = get_or_create_session(session_id)
-    session.attempts.append(attempt)
+    append_attempt(session_id, attempt)
     return {"status": "success"}
 
 
 @router.post("/sessions/{session_id}/exposures")
-async def add_exposure(session_id: str, exposure: Dict[str, Any]):
+def add_exposure(session_id: str, exposure: Dict[str, Any]):
     """Log an exposure event for a session."""
-    session = get_or_create_session(session_id)
-    session.exposures.append(exposure)
+    append_exposure(session_id, exposure)
     return {"status": "success"}
 
 
 @router.post("/sessions/{session_id}/stress-indicators")
-async def add_stress_indicator(session_id: str, indicator: Dict[str, Any]):
+def add_stress_indicator(session_id: str, indicator: Dict[str, Any]):
     """Log a stress indicator for a session."""
-    session = get_or_create_session(session_id)
-    session.stress_indicators.append(indicator)
+    append_stress_indicator(session_id, indicator)
     return {"status": "success"}
 
 
+def parse_event(raw: Any, index: int) -> Tuple[str, Any, Optional[str]]:
+    """Validate one batch entry, raising a 422 that points at the bad entry."""
+    try:
+        event = SessionEvent.model_validate(raw)
+        payload = TaskAttempt(**event.data) if event.type == "attempt" else event.data
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "index": index,
+                "errors": e.errors(include_url=False, include_context=False),
+            },
+        )
+    return event.type, payload, event.idempotency_key
+
+
+def body_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"Batch body is larger than {max_bytes} bytes"
+    )
+
+
+async def iter_body(request: Request, max_bytes: int) -> AsyncIterator[bytes]:
+    """Chunks of a request body, raising a 413 once it passes `max_bytes`."""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise body_too_large(max_bytes)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise body_too_large(max_bytes)
+        yield chunk
+
+
+async def iter_ndjson_lines(request: Request, max_bytes: int) -> AsyncIterator[bytes]:
+    """Yield non-empty lines of a request body as it streams in."""
+    buffer = b""
+    async for chunk in iter_body(request, max_bytes):
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+def check_event_count(count: int) -> None:
+    max_events = StorageConfig.get_batch_max_events()
+    if count > max_events:
+        raise HTTPException(
+            status_code=413, detail=f"Batch has more than {max_events} events"
+        )
+
+
+@router.post("/sessions/{session_id}/events:batch", response_model=BatchEventsResponse)
+async def add_events_batch(session_id: str, request: Request):
+    """
+    Log a mixed batch of attempts, exposures and stress indicators.
+    Accepts a JSON array of events (or {"events": [...]}), or a streamed
+    NDJSON body (Content-Type: application/x-ndjson) with one event per line.
+    The whole batch is validated before anything is stored, then appended
+    in one transaction: a bad entry rejects the batch with a 422 naming it.
+    Events carrying an idempotency_key that was already stored are skipped,
+    so clients can safely resend a buffered batch after a failure.
+    """
+    max_bytes = StorageConfig.get_batch_max_bytes()
+    events: List[Tuple[str, Any, Optional[str]]] = []
+
+    if "ndjson" in request.headers.get("content-type", ""):
+        async for line in iter_ndjson_lines(request, max_bytes):
+            check_event_count(len(events) + 1)
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise HTTPException(
+                    status_code=422,
+                    detail={"index": len(events), "errors": [f"Invalid JSON: {e}"]},
+                )
+            events.append(parse_event(raw, len(events)))
+    else:
+        body = b"".join([chunk async for chunk in iter_body(request, max_bytes)])
+        try:
+            body = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be valid JSON")
+        raw_events = body.get("events") if isinstance(body, dict) else body
+        if not isinstance(raw_events, list):
+            raise HTTPException(
+                status_code=400, detail="Body must be a JSON array of events"
+            )
+        check_event_count(len(raw_events))
+        events = [parse_event(raw, index) for index, raw in enumerate(raw_events)]
+
+    _, version, accepted = await asyncio.to_thread(append_events, session_id, events)
+    return BatchEventsResponse(
+        status="success",
+        received=len(events),
+        accepted=accepted,
+        duplicates=len(events) - accepted,
+        version=version,
+    )
+
+
+def session_analysis(state: SessionState) -> AnalysisResult:
+    """Pattern analysis for the current version of a session."""
+    return state.memoize(
+        "analysis", lambda: analyze_aggregates(state.attempts.aggregates)
+    )
+
+
 @router.get("/sessions/{session_id}")
-async def get_session_data(session_id: str) -> SessionData:
+def get_session_data(session_id: str) -> SessionData:
     """Get all data for a session."""
     session = get_session(session_id)
     if not session:
@@ -50,38 +190,41 @@ async def get_session_data(session_id: str) -> SessionData:
 
 
 @router.post("/sessions/{session_id}/analyze")
-async def analyze_session(session_id: str) -> AnalysisResult:
+def analyze_session(session_id: str) -> AnalysisResult:
     """Analyze patterns in a session's data."""
-    session = get_session(session_id)
-    if not session:
+    state = get_session_state(session_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    analysis = analyze_patterns(session.attempts)
-    return analysis
+    return session_analysis(state)
 
 
 @router.post("/sessions/{session_id}/explanation")
-async def generate_explanation(session_id: str) -> ExplanationResult:
+def generate_explanation(session_id: str) -> ExplanationResult:
     """Generate human-readable explanation for a session."""
-    session = get_session(session_id)
-    if not session:
+    state = get_session_state(session_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    analysis = analyze_patterns(session.attempts)
-    explanation = generate_explanation_text(analysis, session.exposures)
-
-    return ExplanationResult(explanation=explanation)
+    return state.memoize(
+        "explanation",
+        lambda: ExplanationResult(
+            explanation=generate_explanation_text(
+                session_analysis(state), state.exposures
+            )
+        ),
+    )
 
 
 @router.get("/sessions/{session_id}/score")
-async def get_session_score(session_id: str) -> Dict[str, Any]:
+def get_session_score(session_id: str) -> Dict[str, Any]:
     """Get the overall score for a session."""
-    session = get_session(session_id)
-    if not session:
+    state = get_session_state(session_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    score = calculate_overall_score(session.attempts)
-    analysis = analyze_patterns(session.attempts)
+    analysis = session_analysis(state)
+    score = state.memoize("score", lambda: score_analysis(analysis))
 
     return {
         "session_id": session_id,
@@ -92,54 +235,61 @@ async def get_session_score(session_id: str) -> Dict[str, Any]:
     }
 
 
+@router.post("/cohorts/analyze", response_model=CohortReport)
+def analyze_cohort_endpoint(request: CohortRequest):
+    """
+    Score many stored sessions in one pass: pattern distribution,
+    per-task percentile norms and per-school summaries.
+    Runs in the threadpool since large cohorts are CPU-bound.
+    """
+    return analyze_cohort(get_store(), request.session_ids, request.schools)
+
+
 @router.post("/ai-analysis", response_model=AIAnalysisResponse)
 async def get_ai_analysis_endpoint(request: AIAnalysisRequest):
     """
     Get AI-powered analysis for a session using Groq or Google AI Studio
     All API calls are made from backend, not frontend
     """
-    session = get_session(request.session_id)
-    if not session:
+    state = await asyncio.to_thread(get_session_state, request.session_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # Convert SessionData to dict for analysis
-    session_dict = {
-        "session_id": session.session_id,
-        "attempts": [
-            attempt.dict() if hasattr(attempt, "dict") else attempt
-            for attempt in session.attempts
-        ],
-        "exposures": session.exposures,
-        "stress_indicators": session.stress_indicators,
-    }
-
     try:
-        analysis = await get_ai_analysis(session_dict)
-        return analysis
+        return await session_ai_analysis(state)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@job_handler("dyscalculia.ai-analysis", GROQ, model=AIAnalysisRequest)
+async def ai_analysis_job(request: AIAnalysisRequest, _: Optional[bytes]):
+    """Queued variant of /ai-analysis, run by the job queue"""
+    state = await asyncio.to_thread(get_session_state, request.session_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Session not found")
+    # Unlike the route, provider errors propagate so the queue can retry them
+    return await session_ai_analysis(state)
+
+
+async def session_ai_analysis(state: SessionState) -> AIAnalysisResponse:
+    # Duplicate clicks and polling share one call per session version; the
+    # prompt is built from the same version as the key
+    version, session = await asyncio.to_thread(state.snapshot)
+    return await ai_analysis_flights.do(
+        (state.session_id, version),
+        lambda: get_ai_analysis(session),
+    )
+
+
 @router.post("/flash-duration", response_model=FlashDurationResponse)
-async def get_flash_duration_endpoint(request: FlashDurationRequest):
+def get_flash_duration_endpoint(request: FlashDurationRequest):
     """
     Calculate adaptive flash duration based on session performance
     Decreases duration for exemplary performance (>70%), increases for struggling (<70%)
     """
-    session = get_session(request.session_id)
-    if not session:
+    state = get_session_state(request.session_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # Convert SessionData to dict for analysis
-    session_dict = {
-        "session_id": session.session_id,
-        "attempts": [
-            attempt.dict() if hasattr(attempt, "dict") else attempt
-            for attempt in session.attempts
-        ],
-        "exposures": session.exposures,
-        "stress_indicators": session.stress_indicators,
-    }
-
-    duration_info = calculate_flash_duration(session_dict, request.difficulty)
+    duration_info = calculate_flash_duration(state.attempts, request.difficulty)
     return duration_info
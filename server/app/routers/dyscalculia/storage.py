@@ -1,31 +1,616 @@
-from typing import Dict
-from .models import SessionData
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
-# In-memory storage (replace with database in production)
-sessions: Dict[str, SessionData] = {}
+from ...cache import TTLCache
+from .columns import AttemptColumns
+from .models import SessionData, TaskAttempt
+
+T = TypeVar("T")
+
+ATTEMPT = "attempt"
+EXPOSURE = "exposure"
+STRESS_INDICATOR = "stress_indicator"
+
+# (kind, payload, idempotency key) of an event waiting to be appended
+PendingEvent = Tuple[str, Dict[str, Any], Optional[str]]
+
+# (session_id, task_type, correct, latency, timestamp, selected JSON, correct JSON)
+AttemptRow = Tuple[str, str, bool, float, Optional[float], str, str]
+
+
+class StorageConfig:
+    """Configuration for session storage - reads from environment dynamically"""
+
+    @staticmethod
+    def get_backend():
+        return os.getenv("DYSCALCULIA_STORE", "sqlite")
+
+    @staticmethod
+    def get_db_path():
+        return os.getenv("DYSCALCULIA_DB_PATH", "data/dyscalculia.sqlite3")
+
+    @staticmethod
+    def get_cache_size():
+        return int(os.getenv("DYSCALCULIA_CACHE_SIZE", "512"))
+
+    @staticmethod
+    def get_cache_ttl():
+        return float(os.getenv("DYSCALCULIA_CACHE_TTL", "900"))
+
+    @staticmethod
+    def get_batch_max_events():
+        return int(os.getenv("DYSCALCULIA_BATCH_MAX_EVENTS", "10000"))
+
+    @staticmethod
+    def get_batch_max_bytes():
+        return int(os.getenv("DYSCALCULIA_BATCH_MAX_BYTES", str(10 * 1024 * 1024)))
+
+
+class SessionStore:
+    """
+    Durable session backend. Sessions are stored as append-only event logs.
+
+    Every append bumps a per-session version and is recorded under that
+    sequence number, so any process can catch up on a session by reading
+    the events after the version it already holds. A shared key-value
+    service can back this interface just as well as a local database.
+    """
+
+    def version(self, session_id: str) -> Optional[int]:
+        """Current version of a session, or None if it does not exist."""
+        raise NotImplementedError
+
+    def events_since(
+        self, session_id: str, version: int
+    ) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Events with a sequence number above `version`, in order."""
+        raise NotImplementedError
+
+    def create(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def append(self, session_id: str, kind: str, payload: Dict[str, Any]) -> int:
+        """Append an event and return the new session version."""
+        version, _ = self.append_many(session_id, [(kind, payload, None)])
+        return version
+
+    def append_many(
+        self, session_id: str, events: List[PendingEvent]
+    ) -> Tuple[int, int]:
+        """
+        Atomically append a batch of events.
+        Events whose idempotency key was already stored for the session are
+        skipped. Returns the new session version and the number appended.
+        """
+        raise NotImplementedError
+
+    def session_ids(self) -> List[str]:
+        raise NotImplementedError
+
+    def attempt_rows(self, session_ids: Optional[List[str]] = None) -> List[AttemptRow]:
+        """
+        Flat attempt rows for bulk analytics, ordered by session and then
+        arrival. Answers are returned JSON-encoded.
+        """
+        rows = []
+        for session_id in (
+            session_ids if session_ids is not None else self.session_ids()
+        ):
+            for _, kind, payload in self.events_since(session_id, 0):
+                if kind != ATTEMPT:
+                    continue
+                rows.append(
+                    (
+                        session_id,
+                        payload["task_type"],
+                        bool(payload["correct"]),
+                        float(payload["latency"]),
+                        payload.get("timestamp"),
+                        json.dumps(payload["selected_answer"]),
+                        json.dumps(payload["correct_answer"]),
+                    )
+                )
+        return rows
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local backend, used for development and testing."""
+
+    def __init__(self):
+        self._events: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        self._keys: Dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def version(self, session_id: str) -> Optional[int]:
+        events = self._events.get(session_id)
+        return None if events is None else len(events)
+
+    def events_since(
+        self, session_id: str, version: int
+    ) -> List[Tuple[int, str, Dict[str, Any]]]:
+        with self._lock:
+            events = self._events.get(session_id, [])[version:]
+        return [
+            (version + offset + 1, kind, payload)
+            for offset, (kind, payload) in enumerate(events)
+        ]
+
+    def create(self, session_id: str) -> None:
+        with self._lock:
+            self._events.setdefault(session_id, [])
+
+    def append_many(
+        self, session_id: str, events: List[PendingEvent]
+    ) -> Tuple[int, int]:
+        with self._lock:
+            stored = self._events.setdefault(session_id, [])
+            keys = self._keys.setdefault(session_id, set())
+            accepted = 0
+            for kind, payload, key in events:
+                if key is not None:
+                    if key in keys:
+                        continue
+                    keys.add(key)
+                stored.append((kind, payload))
+                accepted += 1
+            return len(stored), accepted
+
+    def session_ids(self) -> List[str]:
+        return list(self._events)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+            self._keys.clear()
+
+
+# PRAGMA user_version of the current schema; 0 is a new database or one
+# written before versioning
+SCHEMA_VERSION = 2
+
+
+def _attempt_row(session_id: str, seq: int, payload: Dict[str, Any]) -> tuple:
+    """session_attempts row of an attempt event."""
+    return (
+        session_id,
+        seq,
+        payload["task_type"],
+        bool(payload["correct"]),
+        payload["latency"],
+        payload.get("timestamp"),
+        json.dumps(payload["selected_answer"]),
+        json.dumps(payload["correct_answer"]),
+    )
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Embedded SQLite backend in WAL mode; sessions survive restarts.
+
+    Safe to share between worker processes: appends run inside
+    `BEGIN IMMEDIATE` transactions, which take the database write lock
+    before the version is read, so concurrent writers never interleave.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS session_events (
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        idempotency_key TEXT,
+        PRIMARY KEY (session_id, seq)
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_session_events_idempotency
+        ON session_events (session_id, idempotency_key)
+        WHERE idempotency_key IS NOT NULL;
+    -- Typed copy of attempt events, so bulk analytics never parses payloads
+    CREATE TABLE IF NOT EXISTS session_attempts (
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        task_type TEXT NOT NULL,
+        correct INTEGER NOT NULL,
+        latency REAL NOT NULL,
+        timestamp REAL,
+        selected_answer TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        PRIMARY KEY (session_id, seq)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def _columns(self, table: str) -> set[str]:
+        return {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+
+    def _migrate(self) -> None:
+        """
+        Create the schema, or bring a database written by an earlier release
+        up to SCHEMA_VERSION. Runs under the write lock, so workers starting
+        together migrate once.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+            if version < SCHEMA_VERSION:
+                self._upgrade()
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _upgrade(self) -> None:
+        # The first layout numbered events with one global autoincrement id
+        # and had no per-session version
+        legacy = "id" in self._columns("session_events")
+        if legacy:
+            self._conn.execute("ALTER TABLE session_events RENAME TO session_events_v1")
+            self._conn.execute("DROP INDEX IF EXISTS idx_session_events_session")
+        sessions = self._columns("sessions")
+        if sessions and "version" not in sessions:
+            self._conn.execute(
+                "ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+
+        # executescript() would commit the open transaction
+        for statement in self.SCHEMA.split(";"):
+            if statement.strip():
+                self._conn.execute(statement)
+
+        if legacy:
+            self._conn.execute(
+                "INSERT INTO session_events (session_id, seq, kind, payload, created_at) "
+                "SELECT session_id, "
+                "ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id), "
+                "kind, payload, created_at FROM session_events_v1"
+            )
+            self._conn.execute("DROP TABLE session_events_v1")
+            self._conn.execute(
+                "UPDATE sessions SET version = (SELECT COUNT(*) FROM session_events "
+                "WHERE session_events.session_id = sessions.session_id)"
+            )
+
+        # Attempts stored before session_attempts existed
+        rows = self._conn.execute(
+            "SELECT session_id, seq, payload FROM session_events "
+            "WHERE kind = ? AND NOT EXISTS (SELECT 1 FROM session_attempts "
+            "WHERE session_attempts.session_id = session_events.session_id "
+            "AND session_attempts.seq = session_events.seq)",
+            (ATTEMPT,),
+        ).fetchall()
+        self._conn.executemany(
+            "INSERT INTO session_attempts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                _attempt_row(session_id, seq, json.loads(payload))
+                for session_id, seq, payload in rows
+            ],
+        )
+
+    def version(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def events_since(
+        self, session_id: str, version: int
+    ) -> List[Tuple[int, str, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, kind, payload FROM session_events "
+                "WHERE session_id = ? AND seq > ? ORDER BY seq",
+                (session_id, version),
+            ).fetchall()
+        return [(seq, kind, json.loads(payload)) for seq, kind, payload in rows]
+
+    def create(self, session_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, created_at, updated_at) "
+                "VALUES (?, ?, ?)",
+                (session_id, now, now),
+            )
+
+    def append_many(
+        self, session_id: str, events: List[PendingEvent]
+    ) -> Tuple[int, int]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO sessions "
+                    "(session_id, created_at, updated_at) VALUES (?, ?, ?)",
+                    (session_id, now, now),
+                )
+                (version,) = self._conn.execute(
+                    "SELECT version FROM sessions WHERE session_id = ?",
+                    (session_id,),
+                ).fetchone()
+
+                accepted = 0
+                for kind, payload, key in events:
+                    inserted = self._conn.execute(
+                        "INSERT OR IGNORE INTO session_events "
+                        "(session_id, seq, kind, payload, created_at, idempotency_key) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (session_id, version + 1, kind, json.dumps(payload), now, key),
+                    ).rowcount
+                    version += inserted
+                    accepted += inserted
+                    if inserted and kind == ATTEMPT:
+                        self._conn.execute(
+                            "INSERT INTO session_attempts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            _attempt_row(session_id, version, payload),
+                        )
+
+                self._conn.execute(
+                    "UPDATE sessions SET version = ?, updated_at = ? "
+                    "WHERE session_id = ?",
+                    (version, now, session_id),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return version, accepted
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT session_id FROM sessions").fetchall()
+        return [session_id for (session_id,) in rows]
+
+    def attempt_rows(self, session_ids: Optional[List[str]] = None) -> List[AttemptRow]:
+        query = (
+            "SELECT session_id, task_type, correct, latency, timestamp, "
+            "selected_answer, correct_answer FROM session_attempts"
+        )
+        params: Tuple[Any, ...] = ()
+        if session_ids is not None:
+            query += " WHERE session_id IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(session_ids),)
+        query += " ORDER BY session_id, seq"
+
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_events")
+            self._conn.execute("DELETE FROM session_attempts")
+            self._conn.execute("DELETE FROM sessions")
+
+
+def create_store() -> SessionStore:
+    """Build the configured storage backend."""
+    backend = StorageConfig.get_backend()
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore(StorageConfig.get_db_path())
+    raise ValueError(f"Unknown DYSCALCULIA_STORE backend: {backend}")
+
+
+class SessionState:
+    """
+    A session held in the hot cache, tagged with the store version it
+    reflects. Attempts are kept in a columnar buffer, which analysis reads
+    directly; SessionData is only built when a route returns it. Derived
+    results are memoized against the version, so they are only recomputed
+    after new events arrive. `lock` guards both applying events and
+    computing memoized results, so a result always matches its version.
+    """
+
+    __slots__ = (
+        "session_id",
+        "attempts",
+        "exposures",
+        "stress_indicators",
+        "version",
+        "lock",
+        "_memo",
+        "_memo_version",
+    )
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.attempts = AttemptColumns()
+        self.exposures: List[Dict[str, Any]] = []
+        self.stress_indicators: List[Dict[str, Any]] = []
+        self.version = 0
+        # Reentrant: memoized computations may read other memoized results
+        self.lock = threading.RLock()
+        self._memo: Dict[str, Any] = {}
+        self._memo_version = 0
+
+    def memoize(self, key: str, compute: Callable[[], T]) -> T:
+        """Return the value cached under `key` for this version, computing it once."""
+        with self.lock:
+            if self._memo_version != self.version:
+                self._memo = {}
+                self._memo_version = self.version
+            if key not in self._memo:
+                self._memo[key] = compute()
+            return self._memo[key]
+
+    def snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        """The version and plain-dict form of the session, taken together."""
+        with self.lock:
+            return self.version, self.to_dict()
+
+    def apply(self, kind: str, payload: Any) -> None:
+        """Apply a stored event to the session."""
+        if kind == ATTEMPT:
+            self.attempts.append(TaskAttempt(**payload))
+        elif kind == EXPOSURE:
+            self.exposures.append(payload)
+        elif kind == STRESS_INDICATOR:
+            self.stress_indicators.append(payload)
+        else:
+            raise ValueError(f"Unknown session event kind: {kind}")
+
+    def to_session_data(self) -> SessionData:
+        return self.memoize(
+            "session_data",
+            lambda: SessionData(
+                session_id=self.session_id,
+                attempts=self.attempts.to_attempts(),
+                exposures=list(self.exposures),
+                stress_indicators=list(self.stress_indicators),
+            ),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-dict form of the session, for prompts."""
+        return {
+            "session_id": self.session_id,
+            "attempts": self.attempts.to_dicts(),
+            "exposures": list(self.exposures),
+            "stress_indicators": list(self.stress_indicators),
+        }
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+# Hot cache of recently used sessions; the store is the source of truth
+cache: TTLCache[SessionState] = TTLCache(
+    max_size=StorageConfig.get_cache_size(), ttl=StorageConfig.get_cache_ttl()
+)
+
+
+def get_store() -> SessionStore:
+    """Get the storage backend, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+
+def set_store(store: SessionStore) -> None:
+    """Replace the storage backend (for testing)."""
+    global _store
+    _store = store
+    cache.clear()
+
+
+def _sync(session_id: str, version: int) -> SessionState:
+    """Bring the cached copy of a session up to `version` of the store."""
+    with _cache_lock:
+        entry = cache.get(session_id)
+        if entry is None:
+            entry = SessionState(session_id)
+            cache.set(session_id, entry)
+
+    with entry.lock:
+        if entry.version < version:
+            for seq, kind, payload in get_store().events_since(
+                session_id, entry.version
+            ):
+                entry.apply(kind, payload)
+                entry.version = seq
+    return entry
+
+
+def get_session_state(session_id: str) -> SessionState | None:
+    """Get the cached state of a session, catching up on writes from other workers."""
+    version = get_store().version(session_id)
+    if version is None:
+        cache.pop(session_id)
+        return None
+    return _sync(session_id, version)
 
 
 def get_session(session_id: str) -> SessionData | None:
     """Get session data by ID."""
-    return sessions.get(session_id)
+    state = get_session_state(session_id)
+    return state.to_session_data() if state else None
 
 
 def create_session(session_id: str) -> SessionData:
     """Create a new session."""
-    session = SessionData(
-        session_id=session_id, attempts=[], exposures=[], stress_indicators=[]
-    )
-    sessions[session_id] = session
-    return session
+    get_store().create(session_id)
+    return get_session(session_id)
 
 
 def get_or_create_session(session_id: str) -> SessionData:
     """Get existing session or create a new one."""
-    if session_id not in sessions:
+    session = get_session(session_id)
+    if session is None:
         return create_session(session_id)
-    return sessions[session_id]
+    return session
+
+
+def _stored_payload(payload: Any) -> Dict[str, Any]:
+    return payload.model_dump() if isinstance(payload, TaskAttempt) else payload
+
+
+def _append(session_id: str, kind: str, payload: Any) -> SessionState:
+    version = get_store().append(session_id, kind, _stored_payload(payload))
+    return _sync(session_id, version)
+
+
+def append_attempt(session_id: str, attempt: TaskAttempt) -> SessionState:
+    """Persist a task attempt and return the up-to-date session state."""
+    return _append(session_id, ATTEMPT, attempt)
+
+
+def append_exposure(session_id: str, exposure: Dict[str, Any]) -> SessionState:
+    """Persist an exposure event and return the up-to-date session state."""
+    return _append(session_id, EXPOSURE, exposure)
+
+
+def append_stress_indicator(session_id: str, indicator: Dict[str, Any]) -> SessionState:
+    """Persist a stress indicator and return the up-to-date session state."""
+    return _append(session_id, STRESS_INDICATOR, indicator)
+
+
+def append_events(
+    session_id: str, events: List[Tuple[str, Any, Optional[str]]]
+) -> Tuple[SessionState, int, int]:
+    """
+    Persist a batch of validated events in a single transaction.
+    Returns the up-to-date session state, its version and how many events were
+    new (events with an already-seen idempotency key are skipped).
+    """
+    pending = [(kind, _stored_payload(payload), key) for kind, payload, key in events]
+    version, accepted = get_store().append_many(session_id, pending)
+    return _sync(session_id, version), version, accepted
 
 
 def clear_all_sessions():
     """Clear all sessions (for testing)."""
-    sessions.clear()
+    get_store().clear()
+    cache.clear()
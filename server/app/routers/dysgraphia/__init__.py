@@ -1,18 +1,22 @@
 import os
-import tempfile
 import uuid
 
 from fastapi import APIRouter, File, UploadFile
 from fastapi.responses import JSONResponse
 
+from ...ai import GEMINI
+from ...handwriting import (
+    add_batch_routes,
+    add_document_routes,
+    assess_quality,
+    rejection,
+)
+from ...jobs import job_handler
+from ...uploads import UploadTooLargeError, archive_upload, read_upload
 from .predict_gemini import GeminiPredictor, PredictionResult
 
 router = APIRouter()
 
-tmpdir = tempfile.TemporaryDirectory()
-UPLOAD_DIR = os.path.join(tmpdir.name, "uploads/dysgraphia")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 
 @router.get("/")
 async def get_dysgraphia():
@@ -22,16 +26,15 @@ async def get_dysgraphia():
 @router.post("/analyze")
 async def analyze_dysgraphia(file: UploadFile = File(...)):
     try:
-        file_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(file.filename or "")[1]
-        filename = f"{file_id}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
+        content = await read_upload(file)
+        report = await assess_quality(content)
+        if report is not None and not report.passed:
+            return JSONResponse(status_code=422, content=rejection(report))
 
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        file_extension = os.path.splitext(file.filename or "")[1]
+        await archive_upload("dysgraphia", content, f"{uuid.uuid4()}{file_extension}")
 
-        result = await process_file(file_path)
+        result = await process_file(content)
 
         if result:
             return {
@@ -40,6 +43,8 @@ async def analyze_dysgraphia(file: UploadFile = File(...)):
             }
         else:
             return {"status": "failure", "result": None}
+    except UploadTooLargeError as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
     except Exception as e:
         print(e)
         return JSONResponse(
@@ -47,15 +52,30 @@ async def analyze_dysgraphia(file: UploadFile = File(...)):
         )
 
 
-predictor = None
+@job_handler("dysgraphia.analyze", GEMINI, upload=True)
+async def analyze_dysgraphia_job(params: dict, content: bytes) -> dict:
+    """Queued variant of /analyze, run by the job queue"""
+    report = await assess_quality(content)
+    if report is not None and not report.passed:
+        raise ValueError(report.message())
+
+    # Unlike the route, provider errors propagate so the queue can retry them
+    result = await predictor.predict_bytes(content)
+    if result is None:
+        raise RuntimeError("Failed to analyze handwriting sample.")
+    return {"status": "success", "result": result}
+
+
+predictor = GeminiPredictor()
 
+# POST /analyze/batch and GET /analyze/batch/{batch_id}
+add_batch_routes(router, predictor)
+# POST /analyze/document for multi-page scans
+add_document_routes(router, predictor)
 
-async def process_file(file_path: str) -> PredictionResult | None:
-    global predictor
-    if not predictor:
-        predictor = GeminiPredictor()
 
-    return await predictor.predict(file_path)
+async def process_file(content: bytes) -> PredictionResult | None:
+    return await predictor.predict_bytes_safely(content)
     # file_size = os.path.getsize(file_path)
     #
     # return {
@@ -1,10 +1,13 @@
 import os
 import uuid
 import traceback
-import tempfile
 from fastapi import APIRouter, File, UploadFile
 from fastapi.responses import JSONResponse
 from .predict_gemini import GeminiDyslexiaPredictor
+from ...ai import GEMINI
+from ...handwriting import add_batch_routes, add_document_routes, assess_quality, rejection
+from ...jobs import job_handler
+from ...uploads import UploadTooLargeError, archive_upload, read_upload
 # Import the reading router
 from .reading_router import router as reading_router
 
@@ -12,11 +15,12 @@ router = APIRouter()
 # Include the reading router so endpoints like /api/dyslexia/analyze_reading are registered
 router.include_router(reading_router)
 
-tmpdir = tempfile.TemporaryDirectory()
-UPLOAD_DIR = os.path.join(tmpdir.name, "uploads/dyslexia")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+predictor = GeminiDyslexiaPredictor()
 
-predictor = None
+# POST /analyze/batch and GET /analyze/batch/{batch_id}
+add_batch_routes(router, predictor)
+# POST /analyze/document for multi-page scans
+add_document_routes(router, predictor)
 
 
 @router.get("/")
@@ -42,31 +46,25 @@ async def analyze_dyslexia(file: UploadFile = File(...)):
         if not file_extension:
             file_extension = '.jpg'
         filename = f"{file_id}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        
-        print(f"Saving file to: {file_path}")
-
-        # Save uploaded file
-        try:
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                if not content:
-                    return JSONResponse(
-                        status_code=400,
-                        content={"error": "Empty file received"}
-                    )
-                buffer.write(content)
-            print(f"File saved successfully. Size: {len(content)} bytes")
-        except Exception as save_error:
-            print(f"Error saving file: {save_error}")
+
+        # Read the upload into memory, up to UPLOAD_MAX_BYTES
+        content = await read_upload(file)
+        if not content:
             return JSONResponse(
-                status_code=500,
-                content={"error": f"Failed to save file: {str(save_error)}"}
+                status_code=400,
+                content={"error": "Empty file received"}
             )
+        print(f"File received. Size: {len(content)} bytes")
+
+        # Reject blurry, dark, blank or tiny photos before calling Gemini
+        report = await assess_quality(content)
+        if report is not None and not report.passed:
+            return JSONResponse(status_code=422, content=rejection(report))
+        await archive_upload("dyslexia", content, filename)
 
         # Process file
         print("Starting analysis...")
-        result = await process_file(file_path)
+        result = await process_file(content)
 
         if result is None:
             print("Analysis returned None")
@@ -83,6 +81,8 @@ async def analyze_dyslexia(file: UploadFile = File(...)):
             "status": "completed",
         }
 
+    except UploadTooLargeError as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
     except Exception as e:
         print(f"Error in analyze_dyslexia: {type(e).__name__}: {str(e)}")
         traceback.print_exc()
@@ -92,15 +92,36 @@ async def analyze_dyslexia(file: UploadFile = File(...)):
         )
 
 
-async def process_file(file_path: str):
-    global predictor
+@job_handler("dyslexia.analyze", GEMINI, upload=True)
+async def analyze_dyslexia_job(params: dict, content: bytes) -> dict:
+    """Queued variant of /analyze, run by the job queue"""
+    content_type = params.get("content_type")
+    if not content_type or not content_type.startswith('image/'):
+        raise ValueError("Invalid file type. Please upload an image file.")
+    report = await assess_quality(content)
+    if report is not None and not report.passed:
+        raise ValueError(report.message())
+
+    file_id = str(uuid.uuid4())
+    file_extension = os.path.splitext(params.get("filename") or "")[1] or '.jpg'
+    filename = f"{file_id}{file_extension}"
+
+    # Unlike the route, provider errors propagate so the queue can retry them
+    result = await predictor.predict_bytes(content)
+    if result is None:
+        raise RuntimeError("Failed to analyze handwriting sample. Please check server logs.")
+
+    return {
+        "file_id": file_id,
+        "filename": filename,
+        "analysis": result.model_dump(),
+        "status": "completed",
+    }
+
+
+async def process_file(content: bytes):
     try:
-        if not predictor:
-            print("Initializing GeminiDyslexiaPredictor...")
-            predictor = GeminiDyslexiaPredictor()
-            print("Predictor initialized successfully")
-        
-        result = await predictor.predict(file_path)
+        result = await predictor.predict_bytes(content)
         return result
     except Exception as e:
         print(f"Error in process_file: {type(e).__name__}: {str(e)}")
@@ -1,10 +1,32 @@
 import json
+import re
 import time
-import os
+from contextlib import aclosing
+from typing import AsyncIterator
 from google import genai
-from PIL import Image
 from pydantic import BaseModel
 
+from ...handwriting import HandwritingPredictor, weighted_mean
+from ...ai import (
+    GEMINI,
+    call_provider,
+    content_key,
+    get_registry,
+    get_result_cache,
+    stream_provider,
+)
+
+MODEL = "gemini-2.5-flash"
+
+# Rubric weights, as given to Gemini in the system instruction
+FACTOR_WEIGHTS = {
+    "letter_reversals": 0.30,
+    "spacing_inconsistency": 0.20,
+    "baseline_instability": 0.15,
+    "stroke_corrections": 0.20,
+    "letter_inconsistency": 0.15,
+}
+
 
 class FactorScores(BaseModel):
     letter_reversals: float
@@ -30,16 +52,11 @@ class DyslexiaAnalysisResult(BaseModel):
     explanation: str
 
 
-class GeminiDyslexiaPredictor:
+class GeminiDyslexiaPredictor(HandwritingPredictor[DyslexiaAnalysisResult]):
+    NAMESPACE = "dyslexia"
+    RESULT_TYPE = DyslexiaAnalysisResult
+
     def __init__(self):
-        # Get API key from environment
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        # Initialize synchronous client for async wrapper
-        self.client = genai.Client(api_key=api_key).aio
-        
         self.system_instruction = """
 You are an assistive handwriting analysis system.
 You are NOT a medical professional and you MUST NOT diagnose dyslexia.
@@ -79,58 +96,58 @@ Do NOT diagnose dyslexia.
 Be cautious, conservative, and explainable.
 """
 
-    async def predict(self, image_path: str) -> DyslexiaAnalysisResult | None:
-        try:
-            start_time = time.time()
-            
-            # Open and validate image
-            if not os.path.exists(image_path):
-                print(f"Error: Image file not found at {image_path}")
-                return None
-                
-            image = Image.open(image_path)
-            print(f"Image loaded successfully: {image.size}")
-
-            # Make API call
-            response = await self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[image],
-                config=genai.types.GenerateContentConfig(
-                    temperature=0.2,
-                    top_p=0.2,
-                    top_k=20,
-                    response_mime_type="application/json",
-                    response_schema=DyslexiaAnalysisResult,
-                    system_instruction=[self.system_instruction],
-                ),
-            )
-
-            processing_time = time.time() - start_time
-            print(f"Response received in {processing_time:.2f}s")
-            
-            if not response or not response.text:
-                print("Error: Empty response from Gemini API")
-                return None
-
-            print(f"Raw response: {response.text}")
-
-            # Parse and validate response
-            try:
-                json_response = DyslexiaAnalysisResult.model_validate_json(
-                    response.text
-                )
-                print("Successfully parsed response")
-                return json_response
-            except Exception as parse_error:
-                print(f"JSON parse error: {parse_error}")
-                print(f"Response text: {response.text}")
-                return None
-
-        except Exception as e:
-            print(f"Prediction error: {type(e).__name__}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return None
+    def generate_config(
+        self, response_schema: type | None = None
+    ) -> genai.types.GenerateContentConfig:
+        return genai.types.GenerateContentConfig(
+            temperature=0.2,
+            top_p=0.2,
+            top_k=20,
+            response_mime_type="application/json",
+            response_schema=response_schema or DyslexiaAnalysisResult,
+            system_instruction=[self.system_instruction],
+        )
+
+    def aggregate(
+        self, results: list[DyslexiaAnalysisResult], weights: list[float]
+    ) -> DyslexiaAnalysisResult:
+        """Weighted mean of the tiles' factor scores, re-scored with the rubric."""
+        factor_scores = FactorScores(
+            **{
+                name: round(weighted_mean(
+                    [getattr(result.factor_scores, name) for result in results], weights
+                ), 2)
+                for name in FACTOR_WEIGHTS
+            }
+        )
+        weighted = WeightedContributions(
+            **{
+                name: round(score * FACTOR_WEIGHTS[name], 4)
+                for name, score in factor_scores.model_dump().items()
+            }
+        )
+        final_risk_score = round(sum(weighted.model_dump().values()), 4)
+        worst = max(results, key=lambda result: result.final_risk_score)
+        return DyslexiaAnalysisResult(
+            factor_scores=factor_scores,
+            weighted_contributions=weighted,
+            final_risk_score=final_risk_score,
+            risk_level=risk_level(final_risk_score),
+            explanation=(
+                f"Combined from {len(results)} sections of the sample, weighted by "
+                "the amount of writing in each. Highest-risk section: "
+                f"{worst.explanation}"
+            ),
+        )
+
+
+def risk_level(final_risk_score: float) -> str:
+    """Risk interpretation from the rubric in the system instruction."""
+    if final_risk_score <= 0.30:
+        return "Low"
+    if final_risk_score <= 0.60:
+        return "Moderate"
+    return "High"
 
 
 class ReadingAnalysisResult(BaseModel):
@@ -144,11 +161,6 @@ class ReadingAnalysisResult(BaseModel):
 
 class GeminiReadingPredictor:
     def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not found")
-        self.client = genai.Client(api_key=self.api_key).aio
-
         self.system_instruction = """
 You are an expert Speech-Language Pathologist (SLP) AI assistant.
 Your task is to analyze aggregated reading metrics from a web-based fluency test.
@@ -172,10 +184,15 @@ Do NOT diagnose. Use terms like "potential indicators", "areas for improvement".
 For Malayalam, ensure recommendations are culturally relevant if needed (e.g. "Practice Aksharamala").
 """
 
-    async def predict(self, data: dict) -> ReadingAnalysisResult | None:
-        try:
-            start_time = time.time()
-            prompt = f"""
+    @property
+    def client(self):
+        return get_registry().gemini().aio
+
+    def _request(
+        self, data: dict
+    ) -> tuple[str, genai.types.GenerateContentConfig, str]:
+        """Prompt, config and cache key for one reading session."""
+        prompt = f"""
             Analyze this reading session:
             Language: {data.get('language')}
             Text Snippet Read: "{data.get('target_text_snippet')}"
@@ -188,25 +205,145 @@ For Malayalam, ensure recommendations are culturally relevant if needed (e.g. "P
             Provide a compassionate but analytical summary suitable for a parent or teacher.
             """
 
+        config = genai.types.GenerateContentConfig(
+            temperature=0.3, # Low temp for consistent analysis
+            response_mime_type="application/json",
+            response_schema=ReadingAnalysisResult,
+            system_instruction=self.system_instruction,
+        )
+        key = content_key("reading", model=MODEL, config=config, prompt=prompt)
+        return prompt, config, key
+
+    async def predict(self, data: dict) -> ReadingAnalysisResult | None:
+        try:
+            return await self.analyze(data)
+        except Exception as e:
+            print(f"Gemini Reading Error: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    async def analyze(self, data: dict) -> ReadingAnalysisResult | None:
+        """predict without the error handling: provider errors are raised."""
+        start_time = time.time()
+        prompt, config, key = self._request(data)
+
+        async def generate() -> ReadingAnalysisResult | None:
             response = await self.client.models.generate_content(
-                model="gemini-2.5-flash",
+                model=MODEL,
                 contents=[prompt],
-                config=genai.types.GenerateContentConfig(
-                    temperature=0.3, # Low temp for consistent analysis
-                    response_mime_type="application/json",
-                    response_schema=ReadingAnalysisResult,
-                    system_instruction=self.system_instruction,
-                ),
+                config=config,
             )
-            
+
             print(f"Reading Analysis took {time.time() - start_time:.2f}s")
-            
+
             if response.text:
                 return ReadingAnalysisResult.model_validate_json(response.text)
             return None
 
+        return await get_result_cache().get_or_compute_model(
+            key,
+            ReadingAnalysisResult,
+            lambda: call_provider(
+                GEMINI, generate, model=MODEL, module="reading"
+            ),
+        )
+
+    async def stream(self, data: dict) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Streaming counterpart of predict. Yields (event, payload) pairs:
+        `summary` chunks of the parent-facing summary as Gemini writes it,
+        then `done` with the full ReadingAnalysisResult, or `error`.
+        """
+        try:
+            start_time = time.time()
+            prompt, config, key = self._request(data)
+
+            # Shares cache entries with predict()
+            cache = get_result_cache()
+            cached = await cache.aget(key)
+            if cached:
+                yield "summary", {"text": cached["summary"]}
+                yield "done", cached
+                return
+
+            summary = JsonStringStream("summary")
+            parts = []
+            stream = stream_provider(
+                GEMINI,
+                lambda: self.client.models.generate_content_stream(
+                    model=MODEL,
+                    contents=[prompt],
+                    config=config,
+                ),
+                model=MODEL,
+                module="reading",
+            )
+            async with aclosing(stream):
+                async for chunk in stream:
+                    if not chunk.text:
+                        continue
+                    parts.append(chunk.text)
+                    text = summary.feed(chunk.text)
+                    if text:
+                        yield "summary", {"text": text}
+
+            print(f"Reading Analysis streamed in {time.time() - start_time:.2f}s")
+
+            result = ReadingAnalysisResult.model_validate_json("".join(parts))
+            payload = result.model_dump(mode="json")
+            await cache.aset(key, payload)
+            yield "done", payload
+
         except Exception as e:
             print(f"Gemini Reading Error: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+            yield "error", {"error": str(e)}
+
+
+class JsonStringStream:
+    """
+    Decodes one string field of a JSON object while the object is still
+    being streamed, so its text can be forwarded before the JSON completes.
+    Escapes split across chunks are held back until they are whole.
+    """
+
+    def __init__(self, field: str):
+        self.opening = re.compile(rf'"{re.escape(field)}"\s*:\s*"')
+        self.buffer = ""
+        self.position: int | None = None  # index of the next undecoded char
+        self.finished = False
+
+    def feed(self, text: str) -> str:
+        self.buffer += text
+        if self.finished:
+            return ""
+        if self.position is None:
+            match = self.opening.search(self.buffer)
+            if not match:
+                return ""
+            self.position = match.end()
+
+        decoded = []
+        i = self.position
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == '"':
+                self.finished = True
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+
+            length = 6 if self.buffer[i + 1 : i + 2] == "u" else 2
+            # A high surrogate is only decodable together with its pair
+            high_surrogate = self.buffer[i + 2 : i + 4].lower() in ("d8", "d9", "da", "db")
+            if length == 6 and high_surrogate:
+                length = 12
+            if i + length > len(self.buffer):
+                break
+            decoded.append(json.loads(f'"{self.buffer[i : i + length]}"'))
+            i += length
+
+        self.position = i
+        return "".join(decoded)
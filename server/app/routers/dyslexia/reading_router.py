@@ -1,6 +1,9 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from .predict_gemini import GeminiReadingPredictor
+from ...ai import GEMINI
+from ...jobs import job_handler
+from ...sse import sse_event, sse_response
 import traceback
 
 router = APIRouter()
@@ -20,8 +23,35 @@ class ReadingTestData(BaseModel):
 async def analyze_reading(data: ReadingTestData):
     try:
         print(f"Received reading data: {data}")
-        result = await predictor.predict(data.dict())
+        result = await predictor.predict(data.model_dump())
         return result
     except Exception as e:
         traceback.print_exc()
         return {"error": str(e)}
+
+
+@job_handler("dyslexia.analyze_reading", GEMINI, model=ReadingTestData)
+async def analyze_reading_job(data: ReadingTestData, _: bytes | None) -> dict:
+    """Queued variant of /analyze_reading, run by the job queue"""
+    # Unlike the route, provider errors propagate so the queue can retry them
+    result = await predictor.analyze(data.model_dump())
+    if result is None:
+        raise RuntimeError("Reading analysis failed. Please check server logs.")
+    return result.model_dump()
+
+
+@router.post("/analyze_reading/stream")
+async def analyze_reading_stream(data: ReadingTestData):
+    """
+    Streaming variant of /analyze_reading over Server-Sent Events.
+    Sends the submitted `metrics` immediately, then `summary` text chunks
+    as they are generated, then `done` with the full result (or `error`).
+    """
+    metrics = data.model_dump()
+
+    async def events():
+        yield sse_event("metrics", metrics)
+        async for event, payload in predictor.stream(metrics):
+            yield sse_event(event, payload)
+
+    return sse_response(events())
@@ -0,0 +1,85 @@
+import os
+import uuid
+
+from fastapi import APIRouter, File, UploadFile
+from fastapi.responses import JSONResponse
+
+from ...ai import GEMINI
+from ...handwriting import (
+    add_batch_routes,
+    add_document_routes,
+    assess_quality,
+    rejection,
+)
+from ...jobs import job_handler
+from ...uploads import UploadTooLargeError, archive_upload, read_upload
+from .predict_gemini import CombinedAnalysisResult, CombinedPredictor
+
+router = APIRouter()
+
+predictor = CombinedPredictor()
+
+# POST /analyze/batch and GET /analyze/batch/{batch_id}
+add_batch_routes(router, predictor)
+# POST /analyze/document for multi-page scans
+add_document_routes(router, predictor)
+
+
+@router.get("/")
+async def get_handwriting():
+    return {"message": "Combined dyslexia and dysgraphia handwriting endpoint"}
+
+
+@router.post("/analyze")
+async def analyze_handwriting(file: UploadFile = File(...)):
+    """
+    Dyslexia and dysgraphia analyses of one handwriting sample, from a
+    single Gemini call. The same results are then served by
+    /api/dyslexia/analyze and /api/dysgraphia/analyze for this image.
+    """
+    try:
+        content = await read_upload(file)
+        if not content:
+            return JSONResponse(
+                status_code=400, content={"error": "Empty file received"}
+            )
+        report = await assess_quality(content)
+        if report is not None and not report.passed:
+            return JSONResponse(status_code=422, content=rejection(report))
+
+        file_id = str(uuid.uuid4())
+        file_extension = os.path.splitext(file.filename or "")[1]
+        await archive_upload("handwriting", content, f"{file_id}{file_extension}")
+
+        result = await process_file(content)
+        if result is None:
+            return JSONResponse(
+                status_code=500,
+                content={"error": "Failed to analyze handwriting sample."},
+            )
+        return {"file_id": file_id, "status": "completed", **result.model_dump()}
+    except UploadTooLargeError as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except Exception as e:
+        print(e)
+        return JSONResponse(
+            status_code=500, content={"error": f"Failed to process file: {str(e)}"}
+        )
+
+
+@job_handler("handwriting.analyze", GEMINI, upload=True)
+async def analyze_handwriting_job(params: dict, content: bytes) -> dict:
+    """Queued variant of /analyze, run by the job queue"""
+    report = await assess_quality(content)
+    if report is not None and not report.passed:
+        raise ValueError(report.message())
+
+    # Unlike the route, provider errors propagate so the queue can retry them
+    result = await predictor.predict_bytes(content)
+    if result is None:
+        raise RuntimeError("Failed to analyze handwriting sample.")
+    return {"status": "completed", **result.model_dump()}
+
+
+async def process_file(content: bytes) -> CombinedAnalysisResult | None:
+    return await predictor.predict_bytes_safely(content)
@@ -0,0 +1,137 @@
+from google import genai
+from pydantic import BaseModel
+
+from ...ai import get_result_cache
+from ...handwriting import (
+    HandwritingPredictor,
+    PendingSample,
+    features_prompt,
+    is_clearly_low_risk,
+    record_outcome,
+    screen,
+)
+from ..dysgraphia.predict_gemini import GeminiPredictor, PredictionResult
+from ..dyslexia.predict_gemini import DyslexiaAnalysisResult, GeminiDyslexiaPredictor
+
+
+class CombinedAnalysisResult(BaseModel):
+    dyslexia: DyslexiaAnalysisResult
+    dysgraphia: PredictionResult
+
+
+class CombinedPredictor(HandwritingPredictor[CombinedAnalysisResult]):
+    """
+    Dyslexia and dysgraphia analyses of one sample in a single Gemini call.
+    Each half is also cached under the single-module key, so the
+    /api/dyslexia and /api/dysgraphia endpoints are served from it, and a
+    sample both of those have already seen is answered without a call.
+
+    The pre-screen can only clear the dysgraphia half: for a clearly
+    low-risk sample that half is answered locally and only the dyslexia
+    rubric goes to Gemini. Grouped and batch requests send the combined
+    rubric.
+    """
+
+    NAMESPACE = "handwriting"
+    RESULT_TYPE = CombinedAnalysisResult
+
+    def __init__(self):
+        self.dyslexia = GeminiDyslexiaPredictor()
+        self.dysgraphia = GeminiPredictor()
+        self.system_instruction = f"""
+You will assess one handwriting sample against two separate screening
+rubrics and return both results in one JSON object. Score each rubric
+independently; do not let one influence the other.
+
+For the "dyslexia" result:
+{"".join(self.dyslexia.generate_config().system_instruction)}
+
+For the "dysgraphia" result:
+{"".join(self.dysgraphia.generate_config().system_instruction)}
+"""
+
+    def generate_config(
+        self, response_schema: type | None = None
+    ) -> genai.types.GenerateContentConfig:
+        return genai.types.GenerateContentConfig(
+            temperature=0.2,
+            top_p=0.2,
+            top_k=20,
+            response_mime_type="application/json",
+            response_schema=response_schema or CombinedAnalysisResult,
+            system_instruction=[self.system_instruction],
+        )
+
+    async def predict_bytes(self, image_bytes: bytes) -> CombinedAnalysisResult | None:
+        features = await screen(image_bytes)
+        notes = features_prompt(features)
+        # Dyslexia always needs Gemini, so the sample is never answered whole
+        record_outcome(False)
+        if not is_clearly_low_risk(features):
+            return await self._escalate(image_bytes, notes)
+
+        dyslexia = await self.dyslexia._escalate(image_bytes, notes)
+        if dyslexia is None:
+            return None
+        return CombinedAnalysisResult(
+            dyslexia=dyslexia, dysgraphia=self.dysgraphia.local_result(features)
+        )
+
+    def aggregate(
+        self, results: list[CombinedAnalysisResult], weights: list[float]
+    ) -> CombinedAnalysisResult:
+        return CombinedAnalysisResult(
+            dyslexia=self.dyslexia.aggregate(
+                [result.dyslexia for result in results], weights
+            ),
+            dysgraphia=self.dysgraphia.aggregate(
+                [result.dysgraphia for result in results], weights
+            ),
+        )
+
+    async def cached_result(
+        self, image_bytes: bytes, notes: str
+    ) -> CombinedAnalysisResult | None:
+        return await super().cached_result(
+            image_bytes, notes
+        ) or await self._cached_parts(image_bytes, notes)
+
+    async def _cached_parts(
+        self, image_bytes: bytes, notes: str
+    ) -> CombinedAnalysisResult | None:
+        cache = get_result_cache()
+        dyslexia = await cache.aget(self.dyslexia.cache_key(image_bytes, notes))
+        dysgraphia = await cache.aget(self.dysgraphia.cache_key(image_bytes, notes))
+        if dyslexia is None or dysgraphia is None:
+            return None
+        return CombinedAnalysisResult(dyslexia=dyslexia, dysgraphia=dysgraphia)
+
+    async def _store_parts(
+        self, image_bytes: bytes, notes: str, result: CombinedAnalysisResult
+    ) -> None:
+        cache = get_result_cache()
+        await cache.aset(
+            self.dyslexia.cache_key(image_bytes, notes),
+            result.dyslexia.model_dump(mode="json"),
+        )
+        await cache.aset(
+            self.dysgraphia.cache_key(image_bytes, notes),
+            result.dysgraphia.model_dump(mode="json"),
+        )
+
+    async def _escalate(
+        self, image_bytes: bytes, notes: str
+    ) -> CombinedAnalysisResult | None:
+        cached = await self._cached_parts(image_bytes, notes)
+        if cached is not None:
+            return cached
+        result = await super()._escalate(image_bytes, notes)
+        if result is not None:
+            await self._store_parts(image_bytes, notes, result)
+        return result
+
+    async def cache_result(
+        self, sample: PendingSample, result: CombinedAnalysisResult
+    ) -> None:
+        await super().cache_result(sample, result)
+        await self._store_parts(sample.image_bytes, sample.notes, result)
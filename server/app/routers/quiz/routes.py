@@ -2,9 +2,10 @@ import json
 from typing import List
 
 from fastapi import APIRouter, HTTPException
-from google import genai
 from pydantic import BaseModel
 
+from ...ai import GEMINI, call_provider, get_registry
+
 router = APIRouter()
 
 # Fallback questions when Gemini is unavailable
@@ -71,15 +72,6 @@ FALLBACK_QUESTIONS = [
     },
 ]
 
-# Initialize Gemini
-try:
-    client = genai.Client()
-    GEMINI_AVAILABLE = True
-except Exception as e:
-    print(f"Gemini initialization failed: {e}")
-    GEMINI_AVAILABLE = False
-    client = None
-
 
 class Answer(BaseModel):
     id: int
@@ -92,7 +84,8 @@ class SubmitRequest(BaseModel):
 
 async def generate_questions_with_gemini():
     """Generate quiz questions using Gemini API"""
-    if not client:
+    registry = get_registry()
+    if not registry.gemini_configured():
         return None
 
     try:
@@ -114,8 +107,13 @@ Return ONLY a valid JSON array with this exact structure, no additional text:
 
 Make questions educational and promote understanding of disabilities. Include a mix of yes and no answers."""
 
-        response = await client.aio.models.generate_content(
-            model="gemini-2.5-flash", contents=prompt
+        response = await call_provider(
+            GEMINI,
+            lambda: registry.gemini().aio.models.generate_content(
+                model="gemini-2.5-flash", contents=prompt
+            ),
+            model="gemini-2.5-flash",
+            module="quiz",
         )
 
         # Extract JSON from response
@@ -150,7 +148,7 @@ Make questions educational and promote understanding of disabilities. Include a
 async def get_questions():
     """Get quiz questions - tries Gemini first, falls back to static questions"""
 
-    if GEMINI_AVAILABLE:
+    if get_registry().gemini_configured():
         gemini_questions = await generate_questions_with_gemini()
         if gemini_questions:
             # Store questions for scoring (in production, use database/cache)
@@ -0,0 +1,101 @@
+"""
+Bounded reads of uploaded files.
+
+Uploads are read in chunks, up to UPLOAD_MAX_BYTES, and handed on as bytes,
+so the request path never writes them to disk. Set UPLOAD_ARCHIVE_DIR to
+keep a copy of each upload; copies are written off the event loop and
+removed once they are older than UPLOAD_ARCHIVE_RETENTION hours.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from typing import List, Optional
+
+from starlette.datastructures import UploadFile
+
+
+class UploadConfig:
+    """Upload limits and archiving - reads from environment dynamically"""
+
+    @staticmethod
+    def get_max_bytes() -> int:
+        return int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+
+    @staticmethod
+    def get_chunk_size() -> int:
+        return int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+    @staticmethod
+    def get_archive_dir() -> Optional[str]:
+        # Unset: uploads are never written to disk
+        return os.getenv("UPLOAD_ARCHIVE_DIR") or None
+
+    @staticmethod
+    def get_archive_retention() -> float:
+        return float(os.getenv("UPLOAD_ARCHIVE_RETENTION", "24"))
+
+
+class UploadTooLargeError(ValueError):
+    def __init__(self, filename: Optional[str], max_bytes: int):
+        super().__init__(
+            f"{filename or 'Upload'} is larger than the {max(max_bytes, 0) / (1024 * 1024):.1f} MB limit"
+        )
+
+
+async def read_upload(file: UploadFile, max_bytes: Optional[int] = None) -> bytes:
+    """Read an upload in chunks, giving up as soon as it passes `max_bytes`."""
+    if max_bytes is None:
+        max_bytes = UploadConfig.get_max_bytes()
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(file.filename, max_bytes)
+
+    chunk_size = UploadConfig.get_chunk_size()
+    chunks: List[bytes] = []
+    total = 0
+    while chunk := await file.read(chunk_size):
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLargeError(file.filename, max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _archive(directory: str, filename: str, content: bytes) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    with open(path, "wb") as f:
+        f.write(content)
+
+    # Expire old copies while we are here, so the directory stays bounded
+    cutoff = time.time() - UploadConfig.get_archive_retention() * 3600
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    return path
+
+
+async def archive_upload(
+    namespace: str, content: bytes, filename: Optional[str] = None
+) -> Optional[str]:
+    """
+    Keep a copy of an upload under UPLOAD_ARCHIVE_DIR/<namespace>, if
+    configured. Returns the path written, or None.
+    """
+    directory = UploadConfig.get_archive_dir()
+    if directory is None:
+        return None
+    filename = os.path.basename(filename or "") or str(uuid.uuid4())
+    try:
+        return await asyncio.to_thread(
+            _archive, os.path.join(directory, namespace), filename, content
+        )
+    except OSError as e:
+        # Archiving is best effort; the analysis does not depend on it
+        print(f"Failed to archive upload {filename}: {str(e)}")
+        return None
@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+# Isolate the app from the developer's .env and data/ before it is imported;
+# load_dotenv() never overrides variables that are already set
+_data_dir = tempfile.mkdtemp(prefix="scout-tests-")
+os.environ.update(
+    GEMINI_API_KEY="",
+    GOOGLE_API_KEY="",
+    GROQ_API_KEY="",
+    AI_CACHE_DIR="",
+    DYSCALCULIA_STORE="memory",
+    JOB_DB_PATH=os.path.join(_data_dir, "jobs.sqlite3"),
+    HANDWRITING_BATCH_DB_PATH=os.path.join(_data_dir, "batches.sqlite3"),
+)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,165 @@
+import asyncio
+import itertools
+
+import pytest
+
+from app.ai import (
+    BATCH,
+    INTERACTIVE,
+    AIServiceConfig,
+    FakeProvider,
+    QuotaScheduler,
+    call_provider,
+    request_priority,
+)
+from app.routers.dysgraphia.predict_gemini import GeminiPredictor, PredictionResult
+
+_providers = itertools.count()
+
+
+class FrozenClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def scheduler(rpm, burst, workers=1, clock=None):
+    return QuotaScheduler(
+        rpm=lambda provider, model: rpm,
+        burst=lambda provider, model: burst,
+        workers=lambda: workers,
+        **({"clock": clock} if clock else {}),
+    )
+
+
+@pytest.fixture
+def quota(monkeypatch):
+    """Route call_provider through a scheduler the test configures."""
+
+    def use(scheduler):
+        monkeypatch.setattr("app.ai.resilience.get_quota_scheduler", lambda: scheduler)
+        return scheduler
+
+    return use
+
+
+@pytest.fixture
+def provider():
+    # Each test gets its own breaker and bucket in the shared registry
+    return f"fake-{next(_providers)}"
+
+
+async def send(provider, fake, module, priority=INTERACTIVE, samples=1):
+    request_priority.set(priority)
+    return await call_provider(
+        provider,
+        lambda: fake.generate(module, samples),
+        module=module,
+        cost=samples,
+    )
+
+
+async def burst_of_calls(provider, fake):
+    return await asyncio.gather(
+        *(send(provider, fake, module) for module in ["quiz", "adhd", "reading"] * 4),
+        return_exceptions=True,
+    )
+
+
+@pytest.mark.anyio
+async def test_unscheduled_burst_is_rate_limited(quota, provider):
+    quota(scheduler(rpm=0, burst=0))
+    fake = FakeProvider(limit=4, window=0.1)
+
+    results = await burst_of_calls(provider, fake)
+    # 429s, then fast failures once they open the circuit for everyone
+    assert fake.metrics["accepted"] == 4
+    assert len([result for result in results if isinstance(result, Exception)]) == 8
+
+
+@pytest.mark.anyio
+async def test_scheduled_burst_stays_within_the_provider_quota(quota, provider):
+    # 20 requests a second with a burst of 2: at most 4 in any 0.1s window
+    quota(scheduler(rpm=1200, burst=2))
+    fake = FakeProvider(limit=4, window=0.1)
+
+    results = await burst_of_calls(provider, fake)
+    assert not [result for result in results if isinstance(result, Exception)]
+    assert fake.metrics == {"accepted": 12, "rate_limited": 0}
+
+
+@pytest.mark.anyio
+async def test_waiting_modules_take_turns(quota, provider):
+    quota(scheduler(rpm=3000, burst=1))
+    fake = FakeProvider(limit=100)
+
+    calls = [send(provider, fake, "dysgraphia") for _ in range(6)]
+    calls += [send(provider, fake, "quiz") for _ in range(2)]
+    await asyncio.gather(*calls)
+
+    modules = [module for module, _ in fake.requests]
+    assert modules[:5] == ["dysgraphia", "dysgraphia", "quiz", "dysgraphia", "quiz"]
+
+
+@pytest.mark.anyio
+async def test_interactive_calls_overtake_waiting_batch_jobs(quota, provider):
+    quota(scheduler(rpm=3000, burst=1))
+    fake = FakeProvider(limit=100)
+
+    calls = [send(provider, fake, f"batch-{n}", BATCH) for n in range(3)]
+    calls += [send(provider, fake, f"live-{n}", INTERACTIVE) for n in range(2)]
+    await asyncio.gather(*calls)
+
+    modules = [module for module, _ in fake.requests]
+    assert modules == ["batch-0", "live-0", "live-1", "batch-1", "batch-2"]
+
+
+@pytest.mark.anyio
+async def test_grouped_calls_are_charged_per_sample(quota, provider):
+    clock = FrozenClock()
+    limits = quota(scheduler(rpm=60, burst=10, clock=clock))
+    fake = FakeProvider(limit=100)
+
+    await send(provider, fake, "dysgraphia", samples=3)
+    assert limits.stats()[f"{provider}/default"]["tokens"] == 7
+    assert fake.requests == [("dysgraphia", 3)]
+
+
+@pytest.mark.anyio
+async def test_predict_many_charges_the_group_per_sample(quota, monkeypatch):
+    monkeypatch.setenv("HANDWRITING_PRESCREEN", "0")
+    clock = FrozenClock()
+    limits = quota(scheduler(rpm=60, burst=10, clock=clock))
+    fake = FakeProvider(limit=100)
+    predictor = GeminiPredictor()
+
+    async def generate_group(pending):
+        await fake.generate("dysgraphia", len(pending))
+        return [PredictionResult(confidence=0.1, message="ok") for _ in pending]
+
+    monkeypatch.setattr(predictor, "_generate_group", generate_group)
+    images = [f"quota sample {n}".encode() for n in range(4)]
+
+    results = await predictor.predict_many(images)
+    assert [result.message for result in results] == ["ok"] * 4
+    assert fake.requests == [("dysgraphia", 4)]
+    assert limits.stats()["gemini/gemini-2.5-flash"]["tokens"] == 6
+
+
+def test_limits_are_split_between_worker_processes():
+    limits = scheduler(rpm=60, burst=10, workers=4)
+    bucket = limits._quota("gemini", "default").bucket
+    assert bucket.rate * 60 == 15
+    assert bucket.capacity == 2.5
+
+
+def test_worker_count_defaults_to_the_server_concurrency(monkeypatch):
+    monkeypatch.delenv("AI_QUOTA_WORKERS", raising=False)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert AIServiceConfig.get_quota_workers() == 1
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert AIServiceConfig.get_quota_workers() == 3
+    monkeypatch.setenv("AI_QUOTA_WORKERS", "5")
+    assert AIServiceConfig.get_quota_workers() == 5
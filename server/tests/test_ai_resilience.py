@@ -0,0 +1,127 @@
+import itertools
+
+import httpx
+import pytest
+from google.genai import errors
+from pydantic import BaseModel, ValidationError
+
+from app.ai import (
+    CircuitOpenError,
+    call_provider,
+    get_registry,
+    is_provider_failure,
+    stream_provider,
+)
+
+_providers = itertools.count()
+
+
+class Answer(BaseModel):
+    score: int
+
+
+def api_error(code):
+    return errors.APIError(code, {"error": {"code": code, "message": "x"}})
+
+
+def fresh_provider():
+    # Each test gets its own breaker in the shared registry
+    return f"test-provider-{next(_providers)}"
+
+
+async def fail_with(error):
+    raise error
+
+
+async def parse_garbage():
+    return Answer.model_validate_json("not json")
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        httpx.ConnectError("refused"),
+        httpx.ReadTimeout("slow"),
+        TimeoutError("slow"),
+        api_error(429),
+        api_error(503),
+    ],
+)
+def test_transport_timeouts_429_and_5xx_are_provider_failures(error):
+    assert is_provider_failure(error)
+
+
+def test_wrapped_provider_failure_is_found():
+    try:
+        try:
+            raise api_error(500)
+        except errors.APIError as e:
+            raise RuntimeError("generation failed") from e
+    except RuntimeError as wrapped:
+        assert is_provider_failure(wrapped)
+
+
+@pytest.mark.parametrize(
+    "error", [api_error(400), api_error(404), ValueError("bad"), KeyError("x")]
+)
+def test_client_and_parse_errors_are_not_provider_failures(error):
+    assert not is_provider_failure(error)
+
+
+@pytest.mark.anyio
+async def test_parse_errors_do_not_open_the_breaker():
+    provider = fresh_provider()
+    breaker = get_registry().breaker(provider)
+
+    for _ in range(breaker.failure_threshold * 2):
+        with pytest.raises(ValidationError):
+            await call_provider(provider, parse_garbage)
+
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+@pytest.mark.anyio
+async def test_bad_requests_do_not_open_the_breaker():
+    provider = fresh_provider()
+    breaker = get_registry().breaker(provider)
+
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(errors.APIError):
+            await call_provider(provider, lambda: fail_with(api_error(400)))
+
+    assert breaker.state == "closed"
+
+
+@pytest.mark.anyio
+async def test_server_errors_open_the_breaker():
+    provider = fresh_provider()
+    breaker = get_registry().breaker(provider)
+
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(errors.APIError):
+            await call_provider(provider, lambda: fail_with(api_error(503)))
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await call_provider(provider, parse_garbage)
+
+
+@pytest.mark.anyio
+async def test_stream_parse_errors_do_not_open_the_breaker():
+    provider = fresh_provider()
+    breaker = get_registry().breaker(provider)
+
+    async def chunks():
+        yield "{"
+        raise ValueError("malformed chunk")
+
+    async def open_stream():
+        return chunks()
+
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ValueError):
+            async for _chunk in stream_provider(provider, open_stream):
+                pass
+
+    assert breaker.state == "closed"
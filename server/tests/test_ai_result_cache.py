@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.ai.result_cache import ResultCache
+from app.routers.dyscalculia.models import ExplanationResult
+
+
+class LoopCheckingCache(ResultCache):
+    """Records every disk read and write made on the event loop thread."""
+
+    def __init__(self, directory):
+        super().__init__(directory=directory)
+        self.on_loop = []
+
+    def _check(self, method):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.on_loop.append(method)
+
+    def _read_disk(self, key):
+        self._check("_read_disk")
+        return super()._read_disk(key)
+
+    def _write_disk(self, key, value, ttl):
+        self._check("_write_disk")
+        return super()._write_disk(key, value, ttl)
+
+
+@pytest.mark.anyio
+async def test_async_paths_keep_disk_io_off_the_event_loop(tmp_path):
+    cache = LoopCheckingCache(str(tmp_path))
+
+    async def compute():
+        return {"answer": 42}
+
+    assert await cache.get_or_compute("a", compute) == {"answer": 42}
+    await cache.aset("b", [1, 2])
+    cache.clear()
+    assert await cache.aget("a") == {"answer": 42}
+    assert await cache.aget("b") == [1, 2]
+    assert await cache.aget("missing") is None
+
+    assert cache.on_loop == []
+    assert cache.metrics["disk_hits"] == 2
+    assert cache.metrics["misses"] == 2
+
+
+@pytest.mark.anyio
+async def test_model_results_are_shared_through_the_disk_tier(tmp_path):
+    writer = LoopCheckingCache(str(tmp_path))
+    reader = LoopCheckingCache(str(tmp_path))
+    result = ExplanationResult(explanation="steady counting")
+
+    async def compute():
+        return result
+
+    async def unexpected():
+        raise AssertionError("the reader should hit the cache")
+
+    key = "dyscalculia-key"
+    await writer.get_or_compute_model(key, ExplanationResult, compute)
+    assert (
+        await reader.get_or_compute_model(key, ExplanationResult, unexpected) == result
+    )
+    assert writer.on_loop == reader.on_loop == []
+
+
+def test_sync_api_still_reads_the_disk_tier(tmp_path):
+    ResultCache(directory=str(tmp_path)).set("k", "v")
+    assert ResultCache(directory=str(tmp_path)).get("k") == "v"
+
+
+def disk_entries(directory):
+    return sorted(
+        name
+        for _, _, names in os.walk(directory)
+        for name in names
+        if name.endswith(".json")
+    )
+
+
+def test_writes_sweep_expired_entries_from_disk(tmp_path):
+    cache = ResultCache(directory=str(tmp_path), sweep_interval=3600)
+    cache.set("old", "stale", ttl=0.01)
+    time.sleep(0.02)
+    cache.set("kept", "fresh")
+    # Swept with the first write; the next sweep is an interval away
+    assert disk_entries(tmp_path) == ["kept.json", "old.json"]
+
+    cache._next_sweep = 0
+    cache.set("new", "fresh")
+    assert disk_entries(tmp_path) == ["kept.json", "new.json"]
+
+
+def test_disk_tier_is_capped_by_evicting_the_oldest_entries(tmp_path):
+    cache = ResultCache(directory=str(tmp_path), sweep_interval=3600)
+    for index, key in enumerate(["first", "second", "third"]):
+        cache.set(key, "x" * 100)
+        os.utime(cache._path(key), (1000 + index, 1000 + index))
+    # Room for the two newest entries
+    cache.max_disk_bytes = sum(
+        os.path.getsize(cache._path(key)) for key in ["second", "third"]
+    )
+    assert cache.sweep() == 1
+    assert disk_entries(tmp_path) == ["second.json", "third.json"]
+    assert cache.metrics["disk_evictions"] == 1
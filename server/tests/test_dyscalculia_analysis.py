@@ -0,0 +1,151 @@
+import random
+
+import pytest
+
+import reference_analysis
+from app.routers.dyscalculia.analysis import (
+    analyze_aggregates,
+    analyze_patterns,
+    calculate_latency_trend,
+    score_analysis,
+)
+from app.routers.dyscalculia.columns import AttemptColumns
+from app.routers.dyscalculia.models import TaskAttempt
+
+TASK_TYPES = ["quantity", "comparison", "symbol", "flash_counting"]
+
+
+def analyze(attempts):
+    return analyze_patterns(AttemptColumns.from_attempts(attempts))
+
+
+def analyze_incrementally(attempts):
+    """Analysis of every prefix of `attempts`, from the running aggregates."""
+    columns = AttemptColumns()
+    results = []
+    for attempt in attempts:
+        columns.append(attempt)
+        results.append(analyze_aggregates(columns.aggregates))
+    return results
+
+
+def make_attempt(task_type, correct, latency, timestamp=None, answer=(1, 2)):
+    return TaskAttempt(
+        task_type=task_type,
+        correct=correct,
+        selected_answer=answer[0],
+        correct_answer=answer[1],
+        latency=latency,
+        attempts=1,
+        timestamp=timestamp,
+    )
+
+
+def random_session(rng):
+    """Attempts with repeated error patterns and missing, late or tied timestamps."""
+    clock = 1000.0
+    attempts = []
+    for _ in range(rng.randint(0, 40)):
+        clock += rng.choice([0, 0.5, 3])
+        timestamp = rng.choice([clock, clock, clock - rng.uniform(0, 20), None])
+        attempts.append(
+            make_attempt(
+                rng.choice(TASK_TYPES[: rng.randint(1, 4)]),
+                rng.random() < 0.6,
+                0.0 if rng.random() < 0.02 else rng.uniform(200, 3000),
+                timestamp,
+                answer=(rng.randint(1, 3), rng.choice([2, "2", [2]])),
+            )
+        )
+    return attempts
+
+
+def assert_matches_reference(attempts, actual=None):
+    expected = reference_analysis.analyze_patterns(attempts)
+    actual = actual or analyze(attempts)
+    assert actual.pattern == expected.pattern
+    assert actual.reasoning == expected.reasoning
+    assert actual.confidence == pytest.approx(expected.confidence)
+    assert actual.sub_scores == pytest.approx(expected.sub_scores)
+    assert score_analysis(actual) == pytest.approx(
+        reference_analysis.calculate_overall_score(attempts)
+    )
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_list_based_analysis(seed):
+    attempts = random_session(random.Random(seed))
+    try:
+        reference_analysis.analyze_patterns(attempts)
+    except ZeroDivisionError:
+        pytest.skip("covered by test_zero_first_half_latency_has_no_trend")
+    assert_matches_reference(attempts)
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_aggregates_match_list_based_analysis_after_every_append(seed):
+    attempts = random_session(random.Random(seed))
+    for length, actual in enumerate(analyze_incrementally(attempts), start=1):
+        prefix = attempts[:length]
+        try:
+            reference_analysis.analyze_patterns(prefix)
+        except ZeroDivisionError:
+            continue
+        assert_matches_reference(prefix, actual)
+
+
+def test_late_and_out_of_order_timestamps():
+    # Correctness improves in timestamp order but not in arrival order
+    attempts = [
+        make_attempt("quantity", True, 900, timestamp=50),
+        make_attempt("quantity", True, 800, timestamp=40),
+        make_attempt("quantity", False, 700, timestamp=10),
+        make_attempt("quantity", False, 600, timestamp=20),
+        make_attempt("quantity", True, 500, timestamp=30),
+        make_attempt("quantity", True, 400, timestamp=30),
+        make_attempt("comparison", False, 900),
+        make_attempt("comparison", True, 500, timestamp=5),
+        make_attempt("comparison", True, 400, timestamp=1),
+    ]
+    assert reference_analysis.analyze_patterns(attempts).sub_scores["improvement"] > 0
+    assert_matches_reference(attempts)
+    for length, actual in enumerate(analyze_incrementally(attempts), start=1):
+        assert_matches_reference(attempts[:length], actual)
+
+
+@pytest.mark.parametrize(
+    "task_types",
+    [
+        [],
+        ["quantity", "quantity"],
+        ["flash_counting"] * 5,
+        ["symbol"] * 4,
+        ["quantity", "comparison", "symbol"],
+    ],
+)
+def test_sessions_with_empty_tasks(task_types):
+    attempts = [
+        make_attempt(task_type, index % 2 == 0, 500 + index)
+        for index, task_type in enumerate(task_types)
+    ]
+    assert_matches_reference(attempts)
+
+
+def test_zero_first_half_latency_has_no_trend():
+    """
+    Behaviour change: the list-based analysis raised ZeroDivisionError when
+    the first half of a task's attempts averaged 0 ms; the trend is now 0.
+    """
+    attempts = [
+        make_attempt("quantity", True, latency) for latency in (0.0, 0.0, 400.0, 500.0)
+    ]
+    with pytest.raises(ZeroDivisionError):
+        reference_analysis.analyze_patterns(attempts)
+
+    columns = AttemptColumns.from_attempts(attempts)
+    assert calculate_latency_trend(columns) == 0
+    assert columns.aggregates.task("quantity").latency_trend == 0
+
+    # Scored as if the latency had not changed
+    unchanged = [make_attempt("quantity", True, 450.0) for _ in attempts]
+    assert_matches_reference(unchanged, actual=analyze(attempts))
@@ -0,0 +1,212 @@
+import asyncio
+import json
+
+import pytest
+
+from app.routers.dyscalculia import routes
+from app.routers.dyscalculia.storage import (
+    ATTEMPT,
+    MemorySessionStore,
+    SessionState,
+    set_store,
+)
+
+
+class LoopCheckingStore(MemorySessionStore):
+    """Records every store call made on the event loop thread."""
+
+    def __init__(self):
+        super().__init__()
+        self.on_loop = []
+
+    def _check(self, method):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.on_loop.append(method)
+
+    def version(self, session_id):
+        self._check("version")
+        return super().version(session_id)
+
+    def events_since(self, session_id, version):
+        self._check("events_since")
+        return super().events_since(session_id, version)
+
+    def create(self, session_id):
+        self._check("create")
+        return super().create(session_id)
+
+    def append_many(self, session_id, events):
+        self._check("append_many")
+        return super().append_many(session_id, events)
+
+
+@pytest.fixture
+def store():
+    store = LoopCheckingStore()
+    set_store(store)
+    yield store
+    set_store(MemorySessionStore())
+
+
+def attempt(task_type="quantity", correct=True, latency=900.0, **fields):
+    return {
+        "task_type": task_type,
+        "correct": correct,
+        "selected_answer": 3,
+        "correct_answer": 3 if correct else 4,
+        "latency": latency,
+        "attempts": 1,
+        **fields,
+    }
+
+
+def test_session_routes_keep_store_calls_off_the_event_loop(client, store):
+    base = "/api/dyscalculia/sessions/s1"
+    for index in range(4):
+        response = client.post(f"{base}/attempts", json=attempt(correct=index % 2 == 0))
+        assert response.status_code == 200
+    assert client.post(f"{base}/exposures", json={"kind": "school"}).status_code == 200
+    assert (
+        client.post(f"{base}/stress-indicators", json={"level": 1}).status_code == 200
+    )
+    events = [{"type": "attempt", "data": attempt(task_type="symbol")}]
+    assert client.post(f"{base}/events:batch", json=events).status_code == 200
+    response = client.post(
+        f"{base}/events:batch",
+        content="\n".join(json.dumps(event) for event in events),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+
+    assert len(client.get(base).json()["attempts"]) == 6
+    assert client.post(f"{base}/analyze").status_code == 200
+    assert client.post(f"{base}/explanation").status_code == 200
+    assert client.get(f"{base}/score").status_code == 200
+    response = client.post(
+        "/api/dyscalculia/flash-duration", json={"session_id": "s1", "difficulty": 3}
+    )
+    assert response.status_code == 200
+    # No provider is configured, but the session is still looked up first
+    client.post("/api/dyscalculia/ai-analysis", json={"session_id": "s1"})
+
+    assert store.on_loop == []
+
+
+def ndjson(events):
+    return "\n".join(json.dumps(event) for event in events)
+
+
+def test_ndjson_batch_with_a_bad_line_stores_nothing(client, store):
+    events = [
+        {"type": "attempt", "data": attempt(), "idempotency_key": str(index)}
+        for index in range(600)
+    ]
+    events[550]["data"]["latency"] = "slow"
+    response = client.post(
+        "/api/dyscalculia/sessions/s2/events:batch",
+        content=ndjson(events),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"]["index"] == 550
+    assert store.version("s2") is None
+
+    events[550]["data"]["latency"] = 700.0
+    response = client.post(
+        "/api/dyscalculia/sessions/s2/events:batch",
+        content=ndjson(events),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.json()["accepted"] == 600
+    assert store.version("s2") == 600
+
+
+def test_batch_resent_without_the_entry_a_422_names_is_stored(client, store):
+    # How the client's event logger recovers from one bad buffered event
+    url = "/api/dyscalculia/sessions/s5/events:batch"
+    events = [
+        {"type": "attempt", "data": attempt(), "idempotency_key": str(index)}
+        for index in range(3)
+    ]
+    events[1]["data"]["correct"] = "maybe"
+    response = client.post(url, json=events)
+    assert response.status_code == 422
+
+    del events[response.json()["detail"]["index"]]
+    response = client.post(url, json=events)
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 2
+    assert store.version("s5") == 2
+
+
+@pytest.mark.parametrize("content_type", ["application/json", "application/x-ndjson"])
+def test_batches_over_the_limits_are_rejected(client, store, monkeypatch, content_type):
+    events = [{"type": "exposure", "data": {"n": index}} for index in range(20)]
+    body = ndjson(events) if "ndjson" in content_type else json.dumps(events)
+    url = "/api/dyscalculia/sessions/s3/events:batch"
+    headers = {"content-type": content_type}
+
+    monkeypatch.setenv("DYSCALCULIA_BATCH_MAX_EVENTS", "10")
+    assert client.post(url, content=body, headers=headers).status_code == 413
+
+    monkeypatch.setenv("DYSCALCULIA_BATCH_MAX_EVENTS", "100")
+    monkeypatch.setenv("DYSCALCULIA_BATCH_MAX_BYTES", "100")
+    assert client.post(url, content=body, headers=headers).status_code == 413
+    assert store.version("s3") is None
+
+
+def test_large_attempt_counters_round_trip(client, store):
+    base = "/api/dyscalculia/sessions/s4"
+    big = attempt(attempts=2**40, difficulty=2**33)
+    assert client.post(f"{base}/attempts", json=big).status_code == 200
+    stored = client.get(base).json()["attempts"][0]
+    assert (stored["attempts"], stored["difficulty"]) == (2**40, 2**33)
+
+    too_big = attempt(attempts=2**63)
+    assert client.post(f"{base}/attempts", json=too_big).status_code == 422
+    assert store.version("s4") == 1
+
+
+def test_analysis_routes_read_the_running_aggregates(client, store, monkeypatch):
+    def rescan(*args):
+        raise AssertionError("analysis rescanned every attempt")
+
+    monkeypatch.setattr("app.routers.dyscalculia.analysis.analyze_patterns", rescan)
+    monkeypatch.setattr(
+        "app.routers.dyscalculia.columns.AttemptColumns.for_task", rescan
+    )
+    base = "/api/dyscalculia/sessions/s6"
+    for index in range(6):
+        client.post(f"{base}/attempts", json=attempt(correct=index % 3 == 0))
+        assert client.post(f"{base}/analyze").status_code == 200
+        assert client.get(f"{base}/score").status_code == 200
+        assert client.post(f"{base}/explanation").status_code == 200
+    assert client.post(f"{base}/analyze").json()["pattern"] != "insufficient_data"
+
+
+@pytest.mark.anyio
+async def test_ai_analysis_prompt_matches_the_version_in_its_key(monkeypatch):
+    state = SessionState("s7")
+    for _ in range(2):
+        state.apply(ATTEMPT, attempt())
+        state.version += 1
+    calls = []
+
+    async def get_ai_analysis(session):
+        return session
+
+    async def do(key, call):
+        # An event lands while the call waits to start
+        state.apply(ATTEMPT, attempt())
+        state.version += 1
+        calls.append((key, await call()))
+
+    monkeypatch.setattr(routes, "get_ai_analysis", get_ai_analysis)
+    monkeypatch.setattr(routes.ai_analysis_flights, "do", do)
+    await routes.session_ai_analysis(state)
+
+    [((_, version), session)] = calls
+    assert version == len(session["attempts"]) == 2
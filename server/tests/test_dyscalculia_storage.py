@@ -0,0 +1,136 @@
+import json
+import sqlite3
+import threading
+
+from app.routers.dyscalculia.storage import (
+    ATTEMPT,
+    EXPOSURE,
+    SCHEMA_VERSION,
+    SessionState,
+    SQLiteSessionStore,
+)
+
+# Layout written by the first SQLite store, before per-session versions
+FIRST_SCHEMA = """
+CREATE TABLE sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE session_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX idx_session_events_session ON session_events (session_id, id);
+"""
+
+ATTEMPT_PAYLOAD = {
+    "task_type": "quantity",
+    "correct": False,
+    "selected_answer": "seven",
+    "correct_answer": [7],
+    "latency": 812.5,
+    "attempts": 1,
+    "timestamp": 10.0,
+    "difficulty": None,
+}
+
+
+def write_first_layout(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(FIRST_SCHEMA)
+    conn.executemany("INSERT INTO sessions VALUES (?, 0, 0)", [("a",), ("b",)])
+    conn.executemany(
+        "INSERT INTO session_events (session_id, kind, payload, created_at) "
+        "VALUES (?, ?, ?, 0)",
+        [
+            ("a", ATTEMPT, json.dumps(ATTEMPT_PAYLOAD)),
+            ("b", EXPOSURE, json.dumps({"kind": "school"})),
+            ("a", EXPOSURE, json.dumps({"kind": "home"})),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_database_from_first_release_is_migrated(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    write_first_layout(path)
+
+    store = SQLiteSessionStore(path)
+    assert store.version("a") == 2
+    assert store.version("b") == 1
+    assert [(seq, kind) for seq, kind, _ in store.events_since("a", 0)] == [
+        (1, ATTEMPT),
+        (2, EXPOSURE),
+    ]
+    assert store.attempt_rows(["a"]) == [
+        ("a", "quantity", 0, 812.5, 10.0, '"seven"', "[7]")
+    ]
+
+    assert store.append("a", EXPOSURE, {"kind": "clinic"}) == 3
+    store._conn.close()
+
+    # Opening an up-to-date database again changes nothing
+    store = SQLiteSessionStore(path)
+    assert store.version("a") == 3
+    (version,) = store._conn.execute("PRAGMA user_version").fetchone()
+    assert version == SCHEMA_VERSION
+
+
+def test_attempts_missing_from_typed_table_are_backfilled(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SQLiteSessionStore(path)
+    store.append("a", ATTEMPT, dict(ATTEMPT_PAYLOAD, selected_answer=True))
+    # As written before session_attempts and schema versioning existed
+    store._conn.execute("DELETE FROM session_attempts")
+    store._conn.execute("PRAGMA user_version = 0")
+    store._conn.close()
+
+    store = SQLiteSessionStore(path)
+    assert store.attempt_rows() == [("a", "quantity", 0, 812.5, 10.0, "true", "[7]")]
+
+
+def test_memoized_result_is_never_stored_for_a_newer_version():
+    state = SessionState("s")
+    started, release = threading.Event(), threading.Event()
+
+    def slow_count():
+        seen = len(state.attempts)
+        started.set()
+        release.wait(5)
+        return seen
+
+    def append_and_read():
+        with state.lock:
+            state.apply(ATTEMPT, ATTEMPT_PAYLOAD)
+            state.version += 1
+        state.memoize("count", lambda: len(state.attempts))
+
+    reader = threading.Thread(target=state.memoize, args=("count", slow_count))
+    reader.start()
+    started.wait(5)
+    writer = threading.Thread(target=append_and_read)
+    writer.start()
+    # Held back by the computation for the older version
+    writer.join(0.1)
+    assert writer.is_alive()
+
+    release.set()
+    reader.join(5)
+    writer.join(5)
+    assert state.memoize("count", lambda: -1) == 1
+
+
+def test_snapshot_is_detached_from_later_events():
+    state = SessionState("s")
+    state.apply(EXPOSURE, {"n": 1})
+    state.version = 1
+    version, session = state.snapshot()
+    state.apply(EXPOSURE, {"n": 2})
+    state.version = 2
+    assert version == 1
+    assert session["exposures"] == [{"n": 1}]
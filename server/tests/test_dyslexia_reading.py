@@ -0,0 +1,33 @@
+import importlib
+import warnings
+
+from pydantic.warnings import PydanticDeprecatedSince20
+
+# The package re-exports the module's router under the module's name
+reading_router = importlib.import_module("app.routers.dyslexia.reading_router")
+
+READING = {
+    "wpm": 90,
+    "accuracy": 88.0,
+    "missed_words": ["through"],
+    "total_words": 40,
+    "duration_seconds": 30.0,
+    "language": "en",
+    "target_text_snippet": "The cat went through the door.",
+}
+
+
+def test_reading_route_uses_no_deprecated_pydantic_api(client, monkeypatch):
+    received = []
+
+    async def predict(metrics):
+        received.append(metrics)
+        return {"summary": "steady reading"}
+
+    monkeypatch.setattr(reading_router.predictor, "predict", predict)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", PydanticDeprecatedSince20)
+        response = client.post("/api/dyslexia/analyze_reading", json=READING)
+
+    assert response.json() == {"summary": "steady reading"}
+    assert received == [{**READING, "pauses_count": 0}]
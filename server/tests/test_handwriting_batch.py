@@ -0,0 +1,161 @@
+import asyncio
+import base64
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from google.genai import types
+from PIL import Image
+
+from app.ai import GEMINI, CircuitOpenError, ContentDigest, content_key, get_registry
+from app.handwriting.batch import OfflineBatches, Sample, get_offline_batches
+from app.routers.dysgraphia.predict_gemini import GeminiPredictor, PredictionResult
+
+
+def png(seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, (120, 160), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setenv("HANDWRITING_QUALITY_GATE", "0")
+    monkeypatch.setenv("HANDWRITING_PRESCREEN", "0")
+
+
+async def poll_until_done(batches, batch_id, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        batch = await batches.poll(batch_id)
+        if batch["status"] == "completed":
+            return batch
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"batch {batch_id} did not finish")
+
+
+class FakeBatches:
+    """The provider's batch API, answering every request with `answer`."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.created = {}
+        self.polls = 0
+
+    async def create(self, model, src, config):
+        name = f"batches/{len(self.created)}"
+        self.created[name] = src
+        return SimpleNamespace(name=name)
+
+    async def get(self, name):
+        self.polls += 1
+        responses = [
+            SimpleNamespace(
+                error=None, response=SimpleNamespace(text=self.answer.model_dump_json())
+            )
+            for _ in self.created[name]
+        ]
+        return SimpleNamespace(
+            state=types.JobState.JOB_STATE_SUCCEEDED,
+            dest=SimpleNamespace(inlined_responses=responses),
+        )
+
+
+class FakeBatchPredictor(GeminiPredictor):
+    def __init__(self, batches):
+        super().__init__()
+        self.batches = batches
+
+    @property
+    def client(self):
+        return SimpleNamespace(batches=self.batches)
+
+
+def test_content_digest_keys_match_the_image_keys():
+    image = png(0)
+    digest = ContentDigest.of(image)
+    assert content_key("test", image=digest) == content_key("test", image=image)
+
+
+@pytest.mark.anyio
+async def test_local_batches_can_be_polled_from_another_worker(offline, monkeypatch):
+    monkeypatch.setenv("HANDWRITING_BATCH_BACKEND", "local")
+    monkeypatch.setenv("HANDWRITING_BATCH_MAX_GROUP", "1")
+    predictor = GeminiPredictor()
+
+    async def predict(image_bytes):
+        return PredictionResult(confidence=0.2, message="done")
+
+    monkeypatch.setattr(predictor, "predict_bytes_safely", predict)
+    accepting = get_offline_batches()
+    accepting.register(predictor)
+    samples = [Sample(f"page-{n}.png", png(n)) for n in range(3)]
+
+    batch = await accepting.submit(predictor, samples)
+    assert batch["status"] == "running"
+
+    # A fresh instance stands in for a worker that never saw the upload
+    other = OfflineBatches()
+    other.register(GeminiPredictor())
+    batch = await poll_until_done(other, batch["batch_id"])
+    assert [line["status"] for line in batch["results"]] == ["success"] * 3
+    assert batch["results"][2]["filename"] == "page-2.png"
+    assert await other.poll("unknown") is None
+
+
+@pytest.mark.anyio
+async def test_provider_batches_are_stored_without_the_images(offline):
+    answer = PredictionResult(confidence=0.7, message="from the batch API")
+    batches = FakeBatches(answer)
+    predictor = FakeBatchPredictor(batches)
+    accepting = OfflineBatches()
+    accepting.register(predictor)
+    images = [png(10), png(11)]
+
+    batch = await accepting.submit(
+        predictor, [Sample(f"{n}.png", image) for n, image in enumerate(images)]
+    )
+    stored = await asyncio.to_thread(accepting.store().get, batch["batch_id"])
+    assert stored["state"]["provider_batch"] == "batches/0"
+    assert [p["digest"] for p in stored["state"]["pending"]] == [
+        ContentDigest.of(image).sha256 for image in images
+    ]
+    row = accepting.store()._conn.execute("SELECT * FROM offline_batches").fetchall()
+    assert base64.b64encode(images[0][:48]).decode() not in repr(row)
+
+    other = OfflineBatches()
+    other.register(FakeBatchPredictor(batches))
+    batch = await other.poll(batch["batch_id"])
+    assert batch["status"] == "completed"
+    assert [line["result"]["message"] for line in batch["results"]] == [
+        "from the batch API"
+    ] * 2
+    stored_after = await asyncio.to_thread(other.store().get, batch["batch_id"])
+    assert stored_after["state"] is None
+
+    # Cached under the key a later upload of the same image looks up
+    notes = stored["state"]["pending"][0]["notes"]
+    assert await predictor.cached_result(images[0], notes) == answer
+
+
+@pytest.mark.anyio
+async def test_polling_goes_through_the_circuit_breaker(offline, monkeypatch):
+    answer = PredictionResult(confidence=0.4, message="polled")
+    batches = FakeBatches(answer)
+    predictor = FakeBatchPredictor(batches)
+    accepting = OfflineBatches()
+    accepting.register(predictor)
+    batch = await accepting.submit(predictor, [Sample("0.png", png(20))])
+
+    def circuit_open():
+        raise CircuitOpenError(GEMINI, 30)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(get_registry().breaker(GEMINI), "before_call", circuit_open)
+        assert (await accepting.poll(batch["batch_id"]))["status"] == "running"
+        assert batches.polls == 0
+
+    batch = await accepting.poll(batch["batch_id"])
+    assert batch["status"] == "completed"
+    assert batches.polls == 1
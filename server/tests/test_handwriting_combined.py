@@ -0,0 +1,177 @@
+import io
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.ai import get_registry
+from app.handwriting import HandwritingFeatures, prescreen_stats
+from app.routers.dysgraphia.predict_gemini import PredictionResult, local_prediction
+from app.routers.dyslexia.predict_gemini import (
+    FACTOR_WEIGHTS,
+    DyslexiaAnalysisResult,
+)
+from app.routers.handwriting.predict_gemini import (
+    CombinedAnalysisResult,
+)
+
+
+def writing():
+    """Scribbled lines with fresh noise, so no test has cached this image."""
+    image = Image.new("L", (600, 300), 235)
+    draw = ImageDraw.Draw(image)
+    for top in range(40, 260, 60):
+        for left in range(30, 540, 45):
+            draw.line([(left, top), (left + 15, top + 25), (left + 30, top)], 30, 3)
+    pixels = np.asarray(image).astype(np.int16)
+    noise = np.random.default_rng(uuid.uuid4().int).integers(-6, 7, pixels.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8)).save(
+        buffer, format="PNG"
+    )
+    return buffer.getvalue()
+
+
+def dyslexia_answer(score=0.1):
+    scores = {name: score for name in FACTOR_WEIGHTS}
+    return DyslexiaAnalysisResult(
+        factor_scores=scores,
+        weighted_contributions={
+            name: score * weight for name, weight in FACTOR_WEIGHTS.items()
+        },
+        final_risk_score=score,
+        risk_level="Low",
+        explanation="from Gemini",
+    )
+
+
+def low_risk_features():
+    return HandwritingFeatures(
+        width=600,
+        height=300,
+        ink_ratio=0.05,
+        lines=4,
+        segments=40,
+        measurable=True,
+        baseline_deviation=0.02,
+        spacing_variation=0.1,
+        size_variation=0.05,
+        baseline_instability=0.05,
+        spacing_inconsistency=0.1,
+        size_inconsistency=0.1,
+    )
+
+
+class FakeModels:
+    """Gemini's generate_content, answering every call with `answer`."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+        self.configs = []
+        self.contents = []
+
+    async def generate_content(self, model, contents, config):
+        self.calls += 1
+        self.configs.append(config)
+        self.contents.append(contents)
+        return SimpleNamespace(text=self.answer)
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    monkeypatch.setenv("HANDWRITING_PRESCREEN", "0")
+    monkeypatch.setenv("HANDWRITING_QUALITY_GATE", "0")
+
+    def use(answer):
+        models = FakeModels(answer)
+        client = SimpleNamespace(aio=SimpleNamespace(models=models))
+        monkeypatch.setattr(get_registry(), "gemini", lambda: client)
+        return models
+
+    return use
+
+
+def test_single_module_calls_reuse_the_combined_result(client, gemini):
+    image = writing()
+    answer = CombinedAnalysisResult(
+        dyslexia=dyslexia_answer(),
+        dysgraphia=PredictionResult(confidence=0.1, message="from Gemini"),
+    )
+    models = gemini(answer.model_dump_json())
+    upload = {"file": ("sample.png", image, "image/png")}
+
+    combined = client.post("/api/handwriting/analyze", files=upload)
+    assert combined.status_code == 200
+    assert models.calls == 1
+
+    dyslexia = client.post("/api/dyslexia/analyze", files=upload)
+    assert dyslexia.status_code == 200
+    assert dyslexia.json()["analysis"] == answer.dyslexia.model_dump()
+
+    dysgraphia = client.post("/api/dysgraphia/analyze", files=upload)
+    assert dysgraphia.status_code == 200
+    assert dysgraphia.json()["result"] == answer.dysgraphia.model_dump()
+
+    assert models.calls == 1
+
+
+@pytest.fixture
+def cleared(gemini, monkeypatch):
+    """A pre-screen that finds every sample clearly low-risk."""
+    monkeypatch.setenv("HANDWRITING_PRESCREEN", "1")
+    monkeypatch.setattr(
+        "app.handwriting.prescreen.extract_features",
+        lambda image_bytes: low_risk_features(),
+    )
+    return gemini
+
+
+def test_cleared_dysgraphia_sample_is_answered_locally(client, cleared):
+    models = cleared(PredictionResult(confidence=0.9, message="x").model_dump_json())
+    response = client.post(
+        "/api/dysgraphia/analyze",
+        files={"file": ("sample.png", writing(), "image/png")},
+    )
+    assert response.status_code == 200
+    assert (
+        response.json()["result"] == local_prediction(low_risk_features()).model_dump()
+    )
+    assert models.calls == 0
+
+
+def test_cleared_dyslexia_sample_still_goes_to_gemini(client, cleared):
+    answer = dyslexia_answer(0.5)
+    models = cleared(answer.model_dump_json())
+    before = prescreen_stats()
+
+    response = client.post(
+        "/api/dyslexia/analyze",
+        files={"file": ("sample.png", writing(), "image/png")},
+    )
+    assert response.status_code == 200
+    assert response.json()["analysis"] == answer.model_dump()
+    assert models.calls == 1
+    # The local measurements go with the image
+    assert "Baseline instability: 0.05" in models.contents[0][-1]
+    after = prescreen_stats()
+    assert after["escalated"] == before["escalated"] + 1
+    assert after["answered_locally"] == before["answered_locally"]
+
+
+def test_cleared_combined_sample_asks_gemini_for_dyslexia_only(client, cleared):
+    answer = dyslexia_answer(0.5)
+    models = cleared(answer.model_dump_json())
+
+    response = client.post(
+        "/api/handwriting/analyze",
+        files={"file": ("sample.png", writing(), "image/png")},
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["dyslexia"] == answer.model_dump()
+    assert result["dysgraphia"] == local_prediction(low_risk_features()).model_dump()
+    assert models.calls == 1
+    assert models.configs[0].response_schema is DyslexiaAnalysisResult
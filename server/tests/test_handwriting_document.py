@@ -0,0 +1,71 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.handwriting.document import tile_document
+
+
+def png(width=100, height=100):
+    buffer = io.BytesIO()
+    Image.new("L", (width, height), 235).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def no_pages(monkeypatch):
+    # What a PDF with an empty page tree decodes to
+    monkeypatch.setattr(
+        "app.handwriting.document.load_pages", lambda content, max_pages=None: []
+    )
+
+
+def test_tiling_a_document_without_pages_raises(no_pages):
+    with pytest.raises(ValueError, match="no pages"):
+        tile_document([b"%PDF-1.7 empty"])
+
+
+@pytest.mark.parametrize("gate", ["0", "1"])
+def test_document_without_pages_is_a_422(client, no_pages, monkeypatch, gate):
+    monkeypatch.setenv("HANDWRITING_QUALITY_GATE", gate)
+    response = client.post(
+        "/api/handwriting/analyze/document",
+        files={"files": ("empty.pdf", b"%PDF-1.7 empty", "application/pdf")},
+    )
+    assert response.status_code == 422
+    assert response.json() == {"detail": "The document has no pages"}
+
+
+def test_tiling_stops_decoding_once_past_the_page_limit(monkeypatch):
+    monkeypatch.setenv("HANDWRITING_MAX_PAGES", "3")
+    limits = []
+
+    def two_pages(content, max_pages=None):
+        limits.append(max_pages)
+        return [Image.new("L", (100, 100), 235)] * 2
+
+    monkeypatch.setattr("app.handwriting.document.load_pages", two_pages)
+    with pytest.raises(ValueError, match="Too many pages; the limit is 3"):
+        tile_document([b"page"] * 5)
+    # Each file is decoded up to the pages left, and no file after the excess
+    assert limits == [3, 1]
+
+
+def test_decompression_bomb_is_a_422(client, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    response = client.post(
+        "/api/handwriting/analyze/document",
+        files={"files": ("page.png", png(), "image/png")},
+    )
+    assert response.status_code == 422
+    assert response.json() == {"detail": "A page has too many pixels to process"}
+
+
+def test_each_document_file_is_held_to_the_upload_limit(client, monkeypatch):
+    content = png()
+    monkeypatch.setenv("UPLOAD_MAX_BYTES", str(len(content) - 1))
+    response = client.post(
+        "/api/handwriting/analyze/document",
+        files={"files": ("page.png", content, "image/png")},
+    )
+    assert response.status_code == 413
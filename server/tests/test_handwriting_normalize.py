@@ -0,0 +1,47 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from app.handwriting.normalize import normalize_image
+
+
+def ruled_page(width, height, margin):
+    """Ruled lines on clean paper: tiny as a PNG, large as a JPEG."""
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for top in range(margin, height - margin, 40):
+        draw.line([(margin, top), (width - margin, top)], 0, 2)
+    if not margin:
+        draw.rectangle([0, 0, width - 1, height - 1], outline=0, width=2)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def size_of(content):
+    return Image.open(io.BytesIO(content)).size
+
+
+def test_large_scan_is_shrunk_even_when_the_original_is_smaller(monkeypatch):
+    monkeypatch.setenv("HANDWRITING_MAX_EDGE", "1600")
+    original = ruled_page(4000, 3000, margin=600)
+    normalized = normalize_image(original)
+    assert len(normalized.content) > len(original)
+    assert normalized.mime_type == "image/jpeg"
+    assert max(size_of(normalized.content)) <= 1600
+
+
+def test_small_uncropped_scan_is_sent_as_it_is(monkeypatch):
+    monkeypatch.setenv("HANDWRITING_MAX_EDGE", "1600")
+    original = ruled_page(600, 400, margin=0)
+    normalized = normalize_image(original)
+    assert normalized.content == original
+    assert normalized.mime_type == "image/png"
+
+
+def test_cropped_scan_is_sent_cropped(monkeypatch):
+    monkeypatch.setenv("HANDWRITING_MAX_EDGE", "1600")
+    normalized = normalize_image(ruled_page(600, 400, margin=100))
+    assert normalized.mime_type == "image/jpeg"
+    width, height = size_of(normalized.content)
+    assert width < 600 and height < 400
@@ -0,0 +1,93 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.handwriting import (
+    HandwritingFeatures,
+    extract_features,
+    features_prompt,
+    is_clearly_low_risk,
+    prescreen_stats,
+)
+
+MEASURED = {
+    "baseline_deviation": 0.02,
+    "spacing_variation": 0.1,
+    "size_variation": 0.05,
+}
+
+
+def features(**fields):
+    values = {
+        "width": 800,
+        "height": 600,
+        "ink_ratio": 0.05,
+        "lines": 3,
+        "segments": 40,
+        "measurable": True,
+        **MEASURED,
+        "baseline_instability": 0.05,
+        "spacing_inconsistency": 0.1,
+        "size_inconsistency": 0.1,
+        **fields,
+    }
+    return HandwritingFeatures(**values)
+
+
+def one_word_image():
+    """One line of evenly sized, tightly spaced letters: no word gaps."""
+    image = Image.new("L", (900, 200), 235)
+    draw = ImageDraw.Draw(image)
+    for n in range(12):
+        left = 40 + n * 60
+        draw.rectangle([left, 60, left + 45, 120], fill=30)
+    # Scanner noise, so the page is not a perfect two-tone image
+    noise = np.random.default_rng(0).integers(-15, 16, (200, 900))
+    image = Image.fromarray((np.asarray(image) + noise).astype(np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_fully_measured_consistent_sample_is_answered_locally():
+    assert is_clearly_low_risk(features())
+
+
+def test_checking_a_sample_is_not_counted_as_an_outcome():
+    before = prescreen_stats()
+    is_clearly_low_risk(features())
+    is_clearly_low_risk(features(baseline_deviation=None))
+    assert prescreen_stats() == before
+
+
+@pytest.mark.parametrize("unmeasured", list(MEASURED))
+def test_unmeasured_factor_is_never_answered_locally(unmeasured):
+    # The score defaults to 0.0, which alone would look consistent
+    sample = features(**{unmeasured: None})
+    assert not sample.fully_measured
+    assert not is_clearly_low_risk(sample)
+
+
+@pytest.mark.parametrize(
+    "unmeasured, label",
+    [
+        ("baseline_deviation", "Baseline instability"),
+        ("spacing_variation", "Spacing inconsistency"),
+        ("size_variation", "Letter size inconsistency"),
+    ],
+)
+def test_prompt_reports_unmeasured_factors_as_unavailable(unmeasured, label):
+    prompt = features_prompt(features(**{unmeasured: None}))
+    assert f"- {label}: unavailable" in prompt
+    assert f"- {label}: 0.00" not in prompt
+
+
+def test_single_word_has_no_spacing_measurement():
+    sample = extract_features(one_word_image())
+    assert sample.measurable
+    assert sample.spacing_variation is None
+    assert sample.spacing_inconsistency == 0.0
+    assert not is_clearly_low_risk(sample)
+    assert "Spacing inconsistency: unavailable" in features_prompt(sample)
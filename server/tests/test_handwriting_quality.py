@@ -0,0 +1,70 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.handwriting import extract_features
+from app.handwriting.quality import assess_quality
+
+EXAMPLES = sorted((Path(__file__).parents[2] / "examples").iterdir())
+
+
+def encode(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def writing(width=600, height=300, paper=235, ink=30):
+    """A few lines of scribbles, with noise like a photo."""
+    image = Image.new("L", (width, height), paper)
+    draw = ImageDraw.Draw(image)
+    for top in range(40, height - 40, 60):
+        for left in range(30, width - 60, 45):
+            draw.line([(left, top), (left + 15, top + 25), (left + 30, top)], ink, 3)
+    pixels = np.asarray(image).astype(np.int16)
+    noise = np.random.default_rng(0).integers(-6, 7, pixels.shape)
+    return Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+
+
+@pytest.fixture(autouse=True)
+def gate_on(monkeypatch):
+    monkeypatch.setenv("HANDWRITING_QUALITY_GATE", "1")
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("path", EXAMPLES, ids=lambda path: path.name)
+async def test_example_images_pass(path):
+    report = await assess_quality(path.read_bytes())
+    assert report.passed, report.message()
+
+
+@pytest.mark.anyio
+async def test_light_writing_on_a_dark_page_passes():
+    report = await assess_quality(encode(writing(paper=20, ink=235)))
+    assert report.passed, report.message()
+    assert 0 < report.ink_coverage < 0.35
+
+
+@pytest.mark.anyio
+async def test_dark_photo_of_a_light_page_is_still_too_dark():
+    report = await assess_quality(encode(writing(paper=45, ink=10)))
+    assert "too_dark" in [problem.code for problem in report.problems]
+
+
+@pytest.mark.anyio
+async def test_cropped_line_of_writing_is_not_too_small():
+    report = await assess_quality(encode(writing(width=360, height=140)))
+    assert report.passed, report.message()
+
+    report = await assess_quality(encode(writing(width=150, height=120)))
+    assert [problem.code for problem in report.problems] == ["too_small"]
+
+
+def test_features_read_light_writing_on_a_dark_page():
+    light = extract_features(encode(writing()))
+    dark = extract_features(encode(writing(paper=20, ink=235)))
+    assert dark.lines == light.lines
+    assert dark.ink_ratio == pytest.approx(light.ink_ratio, rel=0.1)
@@ -0,0 +1,445 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from app.ai import GEMINI, GROQ, CircuitOpenError, get_registry
+from app.jobs import JobQueue, JobStore
+from app.jobs.store import FAILED, QUEUED, RUNNING, SUCCEEDED
+from app.routers.dyscalculia.storage import MemorySessionStore, set_store
+
+
+class LoopCheckingJobStore(JobStore):
+    """Records every store call made on the event loop thread."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.on_loop = []
+
+    def _check(self, method):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.on_loop.append(method)
+
+    def insert(self, *args, **kwargs):
+        self._check("insert")
+        return super().insert(*args, **kwargs)
+
+    def get(self, job_id):
+        self._check("get")
+        return super().get(job_id)
+
+    def claim(self, job_id, owner, lease):
+        self._check("claim")
+        return super().claim(job_id, owner, lease)
+
+    def update(self, job_id, owner=None, **fields):
+        self._check("update")
+        return super().update(job_id, owner, **fields)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setenv("JOB_RETRY_DELAY", "0.01")
+    monkeypatch.setenv("JOB_MAX_ATTEMPTS", "3")
+
+
+async def wait_finished(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = await queue.status(job_id)
+        if status.status in (SUCCEEDED, FAILED):
+            return status
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def make_queue(run, provider="test"):
+    queue = JobQueue()
+    queue.handler("test.job", provider)(run)
+    return queue
+
+
+def test_only_one_store_can_claim_a_job(db_path):
+    first, second = JobStore(db_path), JobStore(db_path)
+    first.insert("job", "test.job", 0, {})
+
+    claimed = first.claim("job", "worker-a", lease=60)
+    assert claimed["status"] == RUNNING
+    assert claimed["owner"] == "worker-a"
+    assert claimed["attempts"] == 1
+    assert second.claim("job", "worker-b", lease=60) is None
+    assert first.claim("job", "worker-a", lease=60) is None
+
+
+def test_only_expired_leases_are_recovered(db_path):
+    store = JobStore(db_path)
+    store.insert("job", "test.job", 0, {})
+    store.claim("job", "worker-a", lease=60)
+
+    assert store.recover_expired(time.time()) == []
+    assert store.get("job")["status"] == RUNNING
+
+    recovered = store.recover_expired(time.time() + 120)
+    assert [job["job_id"] for job in recovered] == ["job"]
+    assert store.get("job")["status"] == QUEUED
+    assert store.get("job")["owner"] is None
+
+
+def test_renew_and_owned_updates_need_the_lease(db_path):
+    store = JobStore(db_path)
+    store.insert("job", "test.job", 0, {})
+    store.claim("job", "worker-a", lease=60)
+
+    assert store.renew("job", "worker-a", lease=60)
+    assert not store.renew("job", "worker-b", lease=60)
+    assert not store.update("job", "worker-b", status=SUCCEEDED)
+    assert store.update("job", "worker-a", status=SUCCEEDED)
+    assert store.get("job")["status"] == SUCCEEDED
+
+
+def test_cancel_only_wins_before_the_claim(db_path):
+    store = JobStore(db_path)
+    store.insert("queued", "test.job", 0, {})
+    store.insert("running", "test.job", 0, {})
+    store.claim("running", "worker-a", lease=60)
+
+    assert store.cancel("queued")
+    assert not store.cancel("running")
+    assert store.claim("queued", "worker-a", lease=60) is None
+
+
+def test_tables_from_before_leases_are_migrated(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE jobs (
+            job_id TEXT PRIMARY KEY, kind TEXT NOT NULL,
+            priority INTEGER NOT NULL, status TEXT NOT NULL,
+            params TEXT NOT NULL, content BLOB, result TEXT, error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL,
+            started_at REAL, finished_at REAL
+        );
+        INSERT INTO jobs (job_id, kind, priority, status, params, attempts, created_at)
+        VALUES ('old', 'test.job', 0, 'running', '{}', 1, 0);
+        """
+    )
+    conn.close()
+
+    store = JobStore(db_path)
+    # Interrupted before leases existed, so nobody can still hold it
+    assert [job["job_id"] for job in store.recover_expired(time.time())] == ["old"]
+
+
+@pytest.mark.anyio
+async def test_jobs_held_by_a_live_worker_are_not_rerun(db_path):
+    runs = []
+
+    async def run(params, content):
+        runs.append(params["name"])
+        return {"ok": True}
+
+    store = JobStore(db_path)
+    store.insert("live", "test.job", 0, {"name": "live"})
+    store.insert("dead", "test.job", 0, {"name": "dead"})
+    store.claim("live", "other-worker", lease=60)
+    store.claim("dead", "other-worker", lease=-1)
+
+    queue = make_queue(run)
+    await queue.start(store)
+    try:
+        status = await wait_finished(queue, "dead")
+        assert status.status == SUCCEEDED
+        assert status.attempts == 2
+        assert runs == ["dead"]
+        assert (await queue.status("live")).status == RUNNING
+    finally:
+        await queue.close()
+
+
+@pytest.mark.anyio
+async def test_two_queues_sharing_a_table_run_each_job_once(db_path):
+    runs = []
+
+    async def run(params, content):
+        runs.append(params["n"])
+        await asyncio.sleep(0.01)
+        return params["n"]
+
+    seed = JobStore(db_path)
+    for n in range(20):
+        seed.insert(f"job-{n}", "test.job", 0, {"n": n})
+    seed.close()
+
+    queues = [make_queue(run), make_queue(run)]
+    for queue in queues:
+        await queue.start(JobStore(db_path))
+    try:
+        for n in range(20):
+            await wait_finished(queues[0], f"job-{n}")
+        assert sorted(runs) == list(range(20))
+    finally:
+        for queue in queues:
+            await queue.close()
+
+
+@pytest.mark.anyio
+async def test_provider_outages_are_retried_then_fail(db_path, fast_retries):
+    async def run(params, content):
+        raise CircuitOpenError("test", 0)
+
+    queue = make_queue(run)
+    await queue.start(JobStore(db_path))
+    try:
+        job = await queue.submit("test.job", {})
+        status = await wait_finished(queue, job.job_id)
+        assert status.status == FAILED
+        assert status.attempts == 3
+        assert queue.metrics["retried"] == 2
+    finally:
+        await queue.close()
+
+
+@pytest.mark.anyio
+async def test_wrapped_open_circuits_wait_for_the_circuit(db_path, fast_retries):
+    runs = []
+
+    async def run(params, content):
+        runs.append(time.monotonic())
+        if len(runs) == 1:
+            try:
+                raise CircuitOpenError("test", 0.3)
+            except CircuitOpenError as e:
+                raise RuntimeError("analysis failed") from e
+        return {"ok": True}
+
+    queue = make_queue(run)
+    await queue.start(JobStore(db_path))
+    try:
+        job = await queue.submit("test.job", {})
+        assert (await wait_finished(queue, job.job_id)).status == SUCCEEDED
+        assert runs[1] - runs[0] >= 0.3
+    finally:
+        await queue.close()
+
+
+@pytest.mark.anyio
+async def test_other_errors_fail_without_retrying(db_path, fast_retries):
+    async def run(params, content):
+        raise ValueError("unreadable answer")
+
+    queue = make_queue(run)
+    await queue.start(JobStore(db_path))
+    try:
+        job = await queue.submit("test.job", {})
+        status = await wait_finished(queue, job.job_id)
+        assert status.status == FAILED
+        assert status.attempts == 1
+        assert status.error == "unreadable answer"
+    finally:
+        await queue.close()
+
+
+@pytest.mark.anyio
+async def test_queue_keeps_store_calls_off_the_event_loop(db_path):
+    async def run(params, content):
+        return {"ok": True}
+
+    store = LoopCheckingJobStore(db_path)
+    queue = make_queue(run)
+    await queue.start(store)
+    try:
+        job = await queue.submit("test.job", {})
+        assert (await wait_finished(queue, job.job_id)).status == SUCCEEDED
+        other = await queue.submit("test.job", {})
+        await queue.cancel(other.job_id)
+        assert store.on_loop == []
+    finally:
+        await queue.close()
+
+
+# The module job handlers, run for real against an open circuit
+
+
+@pytest.fixture
+def open_circuits(monkeypatch, fast_retries):
+    monkeypatch.setenv("JOB_MAX_ATTEMPTS", "2")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setenv("HANDWRITING_QUALITY_GATE", "0")
+    monkeypatch.setenv("HANDWRITING_PRESCREEN", "0")
+    for provider in (GEMINI, GROQ):
+        breaker = get_registry().breaker(provider)
+
+        def before_call(provider=provider):
+            # Open, and due to close again before the queue's next attempt
+            raise CircuitOpenError(provider, 0.01)
+
+        monkeypatch.setattr(breaker, "before_call", before_call)
+
+
+@pytest.fixture
+def session_store():
+    store = MemorySessionStore()
+    set_store(store)
+    yield store
+    set_store(MemorySessionStore())
+
+
+def poll_job(client, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/api/jobs/{job_id}").json()
+        if status["status"] in (SUCCEEDED, FAILED):
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.mark.parametrize(
+    "kind", ["handwriting.analyze", "dysgraphia.analyze", "dyslexia.analyze"]
+)
+def test_image_jobs_fail_when_the_provider_is_down(client, open_circuits, kind):
+    response = client.post(
+        f"/api/jobs/{kind}",
+        files={"file": ("sample.png", b"not really an image", "image/png")},
+    )
+    assert response.status_code == 202
+
+    status = poll_job(client, response.json()["job_id"])
+    assert status["status"] == FAILED
+    assert status["attempts"] == 2
+    assert "circuit open" in status["error"]
+
+
+def test_adhd_job_fails_when_the_provider_is_down(client, open_circuits):
+    response = client.post(
+        "/api/jobs/adhd.finalize-assessment",
+        json={
+            "sart": {
+                "reactionTimes": [350.0, 420.0, 390.0],
+                "commissionErrors": 1,
+                "correctHits": 20,
+                "totalSevens": 3,
+            },
+            "workingMemory": {
+                "sequence": ["A", "B"],
+                "correctResponses": 5,
+                "incorrectResponses": 1,
+                "totalTargets": 6,
+                "accuracy": 83.0,
+            },
+            "tapping": {
+                "tapTimestamps": [0.0, 500.0, 1010.0],
+                "interTapIntervals": [500.0, 510.0],
+                "totalTaps": 3,
+            },
+        },
+    )
+    status = poll_job(client, response.json()["job_id"])
+    assert status["status"] == FAILED
+    assert status["attempts"] == 2
+    assert status["result"] is None
+
+
+def test_reading_job_fails_when_the_provider_is_down(client, open_circuits):
+    response = client.post(
+        "/api/jobs/dyslexia.analyze_reading",
+        json={
+            "wpm": 90,
+            "accuracy": 88.0,
+            "missed_words": ["through"],
+            "total_words": 40,
+            "duration_seconds": 30.0,
+            "language": "en",
+            "target_text_snippet": "The cat went through the door.",
+        },
+    )
+    status = poll_job(client, response.json()["job_id"])
+    assert status["status"] == FAILED
+    assert status["attempts"] == 2
+
+
+def test_dyscalculia_job_fails_when_the_provider_is_down(
+    client, open_circuits, session_store
+):
+    response = client.post(
+        "/api/dyscalculia/sessions/s1/attempts",
+        json={
+            "task_type": "quantity",
+            "correct": True,
+            "selected_answer": 3,
+            "correct_answer": 3,
+            "latency": 900.0,
+            "attempts": 1,
+        },
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/api/jobs/dyscalculia.ai-analysis", json={"session_id": "s1"}
+    )
+    status = poll_job(client, response.json()["job_id"])
+    assert status["status"] == FAILED
+    assert status["attempts"] == 2
+    assert "All AI API calls failed" in status["error"]
+
+
+# Worker processes sharing the table
+
+
+@pytest.mark.anyio
+async def test_watchers_see_jobs_finished_by_another_worker(db_path, monkeypatch):
+    monkeypatch.setenv("JOB_WATCH_POLL", "0.02")
+
+    async def run(params, content):
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    running = make_queue(run)
+    await running.start(JobStore(db_path))
+    # Serves the events stream only; never runs the job or hears about it
+    watching = make_queue(run)
+    watching.store = JobStore(db_path)
+    try:
+        job = await running.submit("test.job", {})
+        statuses = [status.status async for status in watching.watch(job.job_id)]
+        assert statuses[-1] == SUCCEEDED
+        assert statuses[0] in (QUEUED, RUNNING)
+    finally:
+        await running.close()
+        watching.store.close()
+
+
+@pytest.mark.anyio
+async def test_live_workers_pick_up_jobs_queued_by_a_stopped_one(db_path, monkeypatch):
+    monkeypatch.setenv("JOB_LEASE", "0.05")
+
+    async def run(params, content):
+        return params["name"]
+
+    queue = make_queue(run)
+    await queue.start(JobStore(db_path))
+    try:
+        # Submitted to a process that stopped before running it
+        store = JobStore(db_path)
+        store.insert("orphan", "test.job", 0, {"name": "orphan"})
+        store.insert("deferred", "test.job", 0, {"name": "deferred"})
+        store.update("deferred", not_before=time.time() + 60)
+        store.close()
+
+        status = await wait_finished(queue, "orphan")
+        assert status.result == "orphan"
+        assert status.attempts == 1
+        # Left until its retry is due
+        await asyncio.sleep(0.15)
+        assert (await queue.status("deferred")).status == QUEUED
+    finally:
+        await queue.close()